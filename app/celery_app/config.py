@@ -1,4 +1,62 @@
+import math
+
 from celery import Celery
+from kombu import Queue
+
+from core.configs import (
+    INTERACTIVE_MAX_COMBINATIONS,
+    IO_TASK_TIME_LIMIT,
+    RENDER_TASK_TIME_LIMIT,
+    UPLOAD_TASK_TIME_LIMIT,
+)
+
+# Network-bound stages run many at a time, ffmpeg about one task per core budget
+QUEUE_IO = "io"
+QUEUE_RENDER = "render"
+QUEUE_UPLOAD = "upload"
+
+TASK_QUEUES = {
+    "process_movie": QUEUE_IO,  # download, normalize, TTS, then fans out
+    "render_chunk": QUEUE_RENDER,
+    "finalize_job": QUEUE_UPLOAD,
+    "discard_job": QUEUE_UPLOAD,  # chord errback; normally run inline where the failure is handled
+    "worker_health": QUEUE_IO,
+}
+QUEUE_TIME_LIMITS = {
+    QUEUE_IO: IO_TASK_TIME_LIMIT,
+    QUEUE_RENDER: RENDER_TASK_TIME_LIMIT,
+    QUEUE_UPLOAD: UPLOAD_TASK_TIME_LIMIT,
+}
+SOFT_LIMIT_MARGIN = 60  # seconds between the soft limit (cleanup) and the hard kill
+
+# Redis priorities: 0 is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 6
+
+
+def job_priority(data: dict) -> int:
+    """The job's own priority, else small (interactive) jobs ahead of large batches"""
+    if data.get("priority") is not None:
+        return data["priority"]
+    blocks = [block for block in (data.get("video_blocks") or {}).values() if isinstance(block, list)]
+    outputs = math.prod(len(block) for block in blocks) if blocks else 0
+    if data.get("max_combinations"):
+        outputs = min(outputs, data["max_combinations"])
+    return PRIORITY_INTERACTIVE if outputs <= INTERACTIVE_MAX_COMBINATIONS else PRIORITY_BATCH
+
+
+def job_options(data: dict) -> dict:
+    """apply_async options for process_movie"""
+    options = {"priority": job_priority(data)}
+    if not data.get("fan_out", True):
+        # The whole job, ffmpeg included, runs in this one task
+        options.update(
+            queue=QUEUE_RENDER,
+            time_limit=RENDER_TASK_TIME_LIMIT,
+            soft_time_limit=max(1, RENDER_TASK_TIME_LIMIT - SOFT_LIMIT_MARGIN),
+        )
+    return options
+
 
 celery_app = Celery(
     "celery",
@@ -13,6 +71,24 @@ celery_app.conf.update(
     result_expires=3600,
     timezone="UTC",
     broker_connection_retry_on_startup=True,
+    task_queues=[Queue(QUEUE_IO), Queue(QUEUE_RENDER), Queue(QUEUE_UPLOAD)],
+    task_default_queue=QUEUE_IO,
+    task_routes={name: {"queue": queue} for name, queue in TASK_QUEUES.items()},
+    task_annotations={
+        name: {
+            "time_limit": QUEUE_TIME_LIMITS[queue],
+            "soft_time_limit": max(1, QUEUE_TIME_LIMITS[queue] - SOFT_LIMIT_MARGIN),
+        }
+        for name, queue in TASK_QUEUES.items()
+    },
+    # Render chunks and the upload callback keep the priority of the job that spawned them
+    task_inherit_parent_priority=True,
+    task_default_priority=PRIORITY_BATCH,
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
 )
 
-celery_app.autodiscover_tasks(["app.celery_media_tasks"])
\ No newline at end of file
+celery_app.autodiscover_tasks(["app.celery_media_tasks"])
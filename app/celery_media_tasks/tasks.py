@@ -1,18 +1,166 @@
-import asyncio
+import os
+import signal
+import time
 
-from celery import shared_task
+from celery import chord, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from loguru import logger
 
 from app.schemas.urls_validator import ConfigModel
+from app.services.ffmpeg_runner import FFmpegRunner
+from app.services.ffmpeg_toolchain import get_toolchain
 from app.services.media_processing import MediaProcessingService
+from app.services.storage_backends import create_shared_store, sweep_shared_stores
+from app.services.worker_resources import (
+    close_worker_resources,
+    get_worker_resources,
+    init_worker_resources,
+)
+from core.configs import RENDER_CHUNK_SIZE
 
 
-@shared_task(name="process_movie")
-def process_movie(data: dict) -> None:
+@worker_init.connect
+def resolve_ffmpeg(**_):
+    """
+    Runs once in the parent before the pool starts: a first-time ffmpeg download is not
+    bound by worker_proc_alive_timeout here, and forked pool processes inherit the result
+    """
+    try:
+        get_toolchain()
+    except Exception as e:
+        logger.warning(f"ffmpeg deferred to the first task: {e}")
+
+
+@worker_process_init.connect
+def install_ffmpeg_cleanup(**_):
+    """Revoke with terminate sends SIGTERM to the pool process: take running ffmpeg children down with it"""
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        FFmpegRunner.kill_all()
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+@worker_process_init.connect
+def open_worker_resources(**_):
+    """Event loop, HTTP pool and API clients live as long as the pool process, not one task"""
+    init_worker_resources()
+
+
+@worker_process_shutdown.connect
+def release_worker_resources(**_):
+    close_worker_resources()
+
+
+@shared_task(name="worker_health")
+def worker_health() -> dict:
+    return get_worker_resources().health()
+
+
+def run_on_worker(stage: str, config: dict, workspace: str | None = None, *args):
+    """Runs MediaProcessingService.<stage>(*args) on the worker loop"""
+    resources = get_worker_resources()
+
+    async def run():
+        # Built on the worker loop, so the pooled session belongs to the loop that uses it
+        service = MediaProcessingService(config=config, resources=resources, workspace=workspace)
+        return await getattr(service, stage)(*args)
+
+    try:
+        return resources.run(run())
+    except SoftTimeLimitExceeded:
+        # run() cancels pending renders on the way out; make sure nothing survives
+        FFmpegRunner.kill_all()
+        raise
+
+
+def remove_expired_stores() -> None:
+    """Stores kept after failed uploads, or left by jobs that died, go once SHARED_STORE_TTL_HOURS have passed"""
+    try:
+        get_worker_resources().run(sweep_shared_stores())
+    except Exception as e:
+        logger.warning(f"Could not sweep expired shared stores: {e!r}")
+
+
+@shared_task(name="process_movie", bind=True)
+def process_movie(self, data: dict):
+    """
+    Prepares the job, then replaces itself with a chord: render_chunk tasks over slices of
+    the combinations, spread over all workers, and finalize_job once they are all done.
+    With fan_out=false the whole job runs in this task instead.
+    """
     print("process_media_task started")
 
     processed_config = ConfigModel.collect_links(data)
-    service = MediaProcessingService(config=processed_config)
+    if not processed_config.get("fan_out", True):
+        run_on_worker("process_all", processed_config)
+        print("process_media_task finished")
+        return None
+
+    job_id = self.request.id
+    workspace = f"{processed_config['task_name']}__{job_id}"
+    store = create_shared_store(job_id)
+    try:
+        manifest = run_on_worker("prepare_shared", processed_config, f"{workspace}_prepare", store)
+    except BaseException:
+        # No chord exists yet, so neither finalize_job nor discard_job would remove what was published
+        logger.error(f"Preparing job {job_id} failed; removing its shared store")
+        get_worker_resources().run(store.clear())
+        raise
+
+    indices = manifest.pop("indices")
+    chunk_size = processed_config.get("render_chunk_size") or RENDER_CHUNK_SIZE
+    chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+    print(f"process_media_task prepared: {len(indices)} combinations in {len(chunks)} render tasks")
+
+    finalize = finalize_job.s(processed_config, job_id, manifest)
+    # render_chunk reports its own failures; this covers the rest (hard time limit, lost worker)
+    finalize.link_error(discard_job.s(job_id))
+    if not chunks:
+        # Nothing to render: the callback alone, with no chunk results
+        return self.replace(finalize.clone(args=([],)))
+
+    # The render tasks only need the clip names and media list, not the prepare summary
+    render_manifest = {key: value for key, value in manifest.items() if key != "prepare"}
+    return self.replace(chord(
+        [render_chunk.s(processed_config, job_id, render_manifest, chunk, number) for number, chunk in enumerate(chunks)],
+        finalize,
+    ))
+
+
+@shared_task(name="render_chunk")
+def render_chunk(data: dict, job_id: str, manifest: dict, indices: list[int], number: int) -> dict:
+    # Own workspace per chunk: two chunks of one job may run on the same machine
+    workspace = f"{data['task_name']}__{job_id}_{number}"
+    started = time.perf_counter()
+    try:
+        return run_on_worker("render_shared", data, workspace, create_shared_store(job_id), manifest, indices)
+    except Exception as e:
+        # A raised error would fail the whole chord and finalize_job would never clean up;
+        # render_shared has already removed this chunk's workspace
+        logger.exception(f"Render task {number} of job {job_id} failed")
+        return MediaProcessingService.failed_render_summary(indices, repr(e), time.perf_counter() - started)
+
+
+@shared_task(name="finalize_job")
+def finalize_job(chunk_results: list[dict], data: dict, job_id: str, manifest: dict) -> dict:
+    workspace = f"{data['task_name']}__{job_id}_finalize"
+    result = run_on_worker("finalize_shared", data, workspace, create_shared_store(job_id), manifest, chunk_results)
+    print(f"process_media_task finished: {result['rendered']}/{result['combinations']} combinations rendered")
+    remove_expired_stores()
+    return result
+
 
-    asyncio.run(service.process_all())
-    print("process_media_task finished")
-    # return
+@shared_task(name="discard_job")
+def discard_job(request, exc, traceback, job_id: str) -> None:
+    """Errback of the chord: removes the shared store of a job whose finalize_job will not run"""
+    logger.error(f"Job {job_id} failed ({exc!r}); removing its shared store")
+    get_worker_resources().run(create_shared_store(job_id).clear())
+    remove_expired_stores()
@@ -0,0 +1,38 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class RenderProfile(BaseModel):
+    name: str
+    width: int
+    height: int
+    fps: int
+    codec: str = "libx264"
+    preset: str = "medium"  # x264 speed/size trade-off
+    tune: Optional[str] = None
+    crf: Optional[int] = None  # constant quality; ignored when bitrate is set
+    bitrate: Optional[str] = None  # e.g. "800k"
+    threads: Optional[int] = None  # -threads per encode; None = share of the render pool budget
+
+    def encoder_args(self) -> list[str]:
+        """ffmpeg video encoder options for this profile"""
+        args = ["-c:v", self.codec, "-preset", self.preset]
+        if self.tune:
+            args.extend(["-tune", self.tune])
+        if self.bitrate:
+            args.extend(["-b:v", self.bitrate])
+        elif self.crf is not None:
+            args.extend(["-crf", str(self.crf)])
+        return args
+
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    # Previews: a fraction of the CPU cost, visibly lower quality
+    "draft": RenderProfile(name="draft", width=270, height=480, fps=10, preset="ultrafast", tune="fastdecode", crf=30),
+    # Same output as the former hardcoded settings (libx264 defaults)
+    "standard": RenderProfile(name="standard", width=270, height=480, fps=10, preset="medium", crf=23),
+    "final": RenderProfile(name="final", width=720, height=1280, fps=30, preset="slow", crf=20),
+}
+
+DEFAULT_RENDER_PROFILE = "standard"
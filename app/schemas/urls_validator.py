@@ -1,10 +1,20 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import List, Dict, Any, Literal, Optional
+
+from .render_profiles import DEFAULT_RENDER_PROFILE, RENDER_PROFILES
 
 
 class VoiceItem(BaseModel):
     text: str
-    voice: str
+    voice: Optional[str] = None
+    # ElevenLabs voice id; skips the name lookup when given
+    voice_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_voice(self) -> "VoiceItem":
+        if not self.voice and not self.voice_id:
+            raise ValueError("Either 'voice' or 'voice_id' is required")
+        return self
 
 class ConfigModel(BaseModel):
     task_name: str
@@ -12,8 +22,33 @@ class ConfigModel(BaseModel):
     audios: List[str] = []
     voices: List[VoiceItem] = []
 
+    # Combination selection: cap, seeded random sample and paging
+    max_combinations: Optional[int] = Field(default=None, ge=1)
+    sample: bool = False
+    seed: Optional[int] = None
+    offset: int = Field(default=0, ge=0)
+
+    # "fused" renders video, audio mix and mux in one ffmpeg pass; "two_pass" overlays afterwards
+    render_mode: Literal["fused", "two_pass"] = "fused"
+    # Encoder tier, see render_profiles.RENDER_PROFILES
+    render_profile: str = DEFAULT_RENDER_PROFILE
+    # Normalize each clip as soon as it is downloaded instead of after all downloads
+    pipeline: bool = True
+    # Render in chunks of `render_chunk_size` combinations on any free Celery worker
+    fan_out: bool = True
+    render_chunk_size: Optional[int] = Field(default=None, ge=1)  # None = RENDER_CHUNK_SIZE
+    # Celery priority, 0 (first) to 9; None = by job size, small jobs ahead of batches
+    priority: Optional[int] = Field(default=None, ge=0, le=9)
+
     model_config = ConfigDict(extra="allow")
 
+    @field_validator("render_profile")
+    @classmethod
+    def check_render_profile(cls, value: str) -> str:
+        if value not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile '{value}', expected one of {sorted(RENDER_PROFILES)}")
+        return value
+
     @classmethod
     def collect_links(cls, data: Dict[str, Any]) -> Dict[str, Any]:
         videos, audios, voices = [], [], []
@@ -35,7 +70,7 @@ class ConfigModel(BaseModel):
         for block_voices in voice_blocks.values():
             if isinstance(block_voices, list):
                 for item in block_voices:
-                    if isinstance(item, dict) and "text" in item and "voice" in item:
+                    if isinstance(item, dict) and "text" in item and (item.get("voice") or item.get("voice_id")):
                         voices.append(item)
 
         data["videos"] = videos
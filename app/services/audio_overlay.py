@@ -1,29 +1,39 @@
+import asyncio
 import os
-import platform
 import subprocess
 import random
-import re
+import time
 from pathlib import Path
+from typing import Any, Callable
 
-import urllib.request
-import zipfile
-import tarfile
 
 from loguru import logger
 
+from core.configs import OVERLAY_CONCURRENCY
+
+from .ffmpeg_toolchain import get_toolchain
+from .media_probe import MediaMetadataIndex
+from .render_pool import RenderPoolService
+
 
 class AudioOverlayService:
     BASE_TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_files"
-    BIN_DIR = Path(__file__).resolve().parent.parent.parent / "bin" / "ffmpeg"
 
-    FFMPEG_PATH = Path(__file__).resolve().parent.parent.parent / "bin" / "ffmpeg"
     BG_VOLUME = 0.2
     AUDIO_CODEC = "aac"
     AUDIO_SAMPLE_RATE = 44100
     AUDIO_CHANNELS = 2
     TEMP_AUDIO_DIR_NAME = "tmp_audio"
+    BEDS_DIR_NAME = "beds"
 
-    def __init__(self, task_name: str):
+    def __init__(
+        self,
+        task_name: str,
+        render_pool: RenderPoolService | None = None,
+        media_index: MediaMetadataIndex | None = None,
+        prepared: dict[str, Any] | None = None,
+    ):
+        """`prepared` is another worker's export_prepared(): its recoded audio and beds, already in the task folder"""
         self.task_name = task_name
         self.base_dir = self.BASE_TEMP_DIR / task_name
 
@@ -36,62 +46,37 @@ class AudioOverlayService:
         self.temp_audio_dir = self.base_dir / self.TEMP_AUDIO_DIR_NAME
         self.temp_audio_dir.mkdir(exist_ok=True)
 
-        self.bg_audios = list(self.bg_audio_dir.glob("**/*.*"))
-        self.voice_audios = list(self.voice_dir.glob("**/*.*"))
+        self.render_pool = render_pool or RenderPoolService()
+        self.prepared: dict[Path, Path] = {}  # source asset -> recoded file
+        self.corrupted: set[Path] = set()
+        self.beds_dir = self.temp_audio_dir / self.BEDS_DIR_NAME
+        self.overlay_tmp_dir = self.temp_audio_dir / "overlay"
+        self.beds: dict[tuple[Path, Path, float], asyncio.Task] = {}
+        self.ready_beds: dict[tuple[Path, Path, float], Path] = {}
+        self.bed_duration: float | None = None  # fixed for the whole job when the beds were mixed up front
+
+        if prepared:
+            self._load_prepared(prepared)
+        else:
+            self.bg_audios = list(self.bg_audio_dir.glob("**/*.*"))
+            self.voice_audios = list(self.voice_dir.glob("**/*.*"))
         self.videos = list(self.input_videos_dir.glob("*.mp4"))
 
         if not self.bg_audios:
             raise ValueError("No background audio")
         if not self.voice_audios:
             raise ValueError("No voice audio")
-        if not self.videos:
-            raise ValueError("No videos to process")
 
-        self.FFMPEG_PATH = self._ensure_ffmpeg()
-
-    def _ensure_ffmpeg(self) -> str:
-        self.BIN_DIR.mkdir(parents=True, exist_ok=True)
-
-        system = platform.system().lower()
-        ffmpeg_exe = "ffmpeg.exe" if system == "windows" else "ffmpeg"
-        ffmpeg_path = self.BIN_DIR / ffmpeg_exe
-
-        if ffmpeg_path.exists():
-            return str(ffmpeg_path)
-
-        logger.info(f"Downloading ffmpeg for {system}...")
-
-        if system == "windows":
-            url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
-            zip_path = self.BIN_DIR / "ffmpeg.zip"
-            urllib.request.urlretrieve(url, zip_path)
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                for f in zip_ref.namelist():
-                    if f.endswith("bin/ffmpeg.exe"):
-                        zip_ref.extract(f, self.BIN_DIR)
-                        os.rename(self.BIN_DIR / f, ffmpeg_path)
-            zip_path.unlink()
-        elif system == "linux":
-            url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
-            tar_path = self.BIN_DIR / "ffmpeg.tar.xz"
-            urllib.request.urlretrieve(url, tar_path)
-            with tarfile.open(tar_path) as tar_ref:
-                for f in tar_ref.getmembers():
-                    if f.name.endswith("/ffmpeg"):
-                        tar_ref.extract(f, self.BIN_DIR)
-                        os.rename(self.BIN_DIR / f.name, ffmpeg_path)
-                        os.chmod(ffmpeg_path, 0o755)
-            tar_path.unlink()
-        else:
-            raise RuntimeError(f"Unsupported OS: {system}")
-
-        logger.info(f"ffmpeg ready: {ffmpeg_path}")
-        return str(ffmpeg_path)
+        toolchain = get_toolchain()
+        self.FFMPEG_PATH = toolchain.ffmpeg
+        self.FFPROBE_PATH = toolchain.ffprobe
+        self.media_index = media_index or MediaMetadataIndex(self.FFPROBE_PATH)
 
-    def _recode_audio(self, audio_path: Path) -> Path | None:
-        output_path = self.temp_audio_dir / audio_path.name
+    async def _recode_audio(self, audio_path: Path) -> Path | None:
+        # Name by the path inside the task folder, so equal file names in different blocks don't clash
+        output_path = self.temp_audio_dir / "_".join(audio_path.relative_to(self.base_dir).parts)
         try:
-            subprocess.run([
+            await self.render_pool.run([
                 str(self.FFMPEG_PATH),
                 "-y",
                 "-i", str(audio_path),
@@ -99,62 +84,281 @@ class AudioOverlayService:
                 "-ac", str(self.AUDIO_CHANNELS),
                 "-c:a", "mp3",
                 str(output_path)
-            ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            ])
             return output_path
-        except subprocess.CalledProcessError:
-            logger.warning(f"Skipping corrupted audio file: {audio_path.name}")
+        except subprocess.SubprocessError as e:  # ffmpeg error or FFmpegTimeoutError
+            output_path.unlink(missing_ok=True)
+            logger.warning(f"Skipping corrupted audio file: {audio_path.name} ({type(e).__name__})")
             return None
 
-    def _get_duration(self, path: Path) -> float:
-        process = subprocess.run([str(self.FFMPEG_PATH), "-i", str(path)],
-                                 stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-        match = re.search(r"Duration: (\d+):(\d+):(\d+).(\d+)", process.stderr)
-        if not match:
-            return 0
-        h, m, s, ms = map(int, match.groups())
-        return h * 3600 + m * 60 + s + ms / 100
+    async def prepare_audio(self) -> None:
+        """Recodes every distinct audio asset once, in parallel; corrupted ones are remembered and skipped"""
+        pending = [
+            a for a in {*self.bg_audios, *self.voice_audios}
+            if a not in self.prepared and a not in self.corrupted
+        ]
+        results = await asyncio.gather(*(self._recode_audio(a) for a in pending))
 
-    def overlay_audio(self):
-        for video_path in self.videos:
-            bg_audio = random.choice(self.bg_audios)
-            voice_audio = random.choice(self.voice_audios)
+        for audio_path, fixed_path in zip(pending, results):
+            if fixed_path:
+                self.prepared[audio_path] = fixed_path
+            else:
+                self.corrupted.add(audio_path)
 
-            bg_audio_fixed = self._recode_audio(bg_audio)
-            voice_audio_fixed = self._recode_audio(voice_audio)
+        logger.info(f"Audio prepared: {len(self.prepared)} ready, {len(self.corrupted)} corrupted")
 
-            if not bg_audio_fixed or not voice_audio_fixed:
-                logger.warning(f"⚠️ Skipping video {video_path.name} due to corrupted audio")
-                continue
+    async def prepare_beds(self, bed_duration: float) -> None:
+        """Mixes the bed of every usable (background, voice) pair at `bed_duration`, for export_prepared"""
+        self.bed_duration = round(bed_duration, 2)
+        bg_audios = [self.prepared[a] for a in self.bg_audios if a in self.prepared]
+        voice_audios = [self.prepared[a] for a in self.voice_audios if a in self.prepared]
+        await asyncio.gather(*(
+            self.get_audio_bed(bg, voice, self.bed_duration) for bg in bg_audios for voice in voice_audios
+        ))
+
+    def _mixed_beds(self) -> dict[tuple[Path, Path, float], Path]:
+        return {key: task.result() for key, task in self.beds.items() if task.done() and task.result()}
+
+    def export_prepared(self) -> dict[str, Any]:
+        """Recoded audio (None if corrupted) and mixed beds, as paths relative to the task folder"""
+        def rel(path: Path) -> str:
+            return path.relative_to(self.base_dir).as_posix()
 
-            video_duration = self._get_duration(video_path)
-            bg_duration = self._get_duration(bg_audio_fixed)
+        return {
+            "bg": {rel(a): rel(self.prepared[a]) if a in self.prepared else None for a in self.bg_audios},
+            "voice": {rel(a): rel(self.prepared[a]) if a in self.prepared else None for a in self.voice_audios},
+            "bed_duration": self.bed_duration,
+            "beds": [[rel(bg), rel(voice), duration, rel(bed)] for (bg, voice, duration), bed in self._mixed_beds().items()],
+        }
 
-            # How many times to repeat background to cover video
-            loop_count = int(video_duration // bg_duration) + 1
+    def prepared_files(self) -> list[Path]:
+        """Every file export_prepared() refers to"""
+        return [*self.prepared.values(), *self._mixed_beds().values()]
 
-            output_path = self.done_dir / video_path.name
+    def _load_prepared(self, prepared: dict[str, Any]) -> None:
+        self.bg_audios, self.voice_audios = [], []
+        for kind, sources in (("bg", self.bg_audios), ("voice", self.voice_audios)):
+            for source, recoded in prepared[kind].items():
+                sources.append(self.base_dir / source)
+                if recoded:
+                    self.prepared[self.base_dir / source] = self.base_dir / recoded
+                else:
+                    self.corrupted.add(self.base_dir / source)
+        self.bed_duration = prepared.get("bed_duration")
+        for bg, voice, duration, bed in prepared.get("beds", []):
+            self.ready_beds[(self.base_dir / bg, self.base_dir / voice, duration)] = self.base_dir / bed
 
+    def pick_audio_pair(self) -> tuple[Path, Path] | None:
+        """Random prepared (background, voice) pair; None if either kind has no usable file"""
+        bg_audios = [self.prepared[a] for a in self.bg_audios if a in self.prepared]
+        voice_audios = [self.prepared[a] for a in self.voice_audios if a in self.prepared]
+
+        if not bg_audios or not voice_audios:
+            return None
+        return random.choice(bg_audios), random.choice(voice_audios)
+
+    def _mix_filter(self, bg_input: int, voice_input: int) -> str:
+        """Background at BG_VOLUME mixed under the voice, as long as the background"""
+        return (
+            f"[{bg_input}:a]volume={self.BG_VOLUME}[a1];"
+            f"[a1][{voice_input}:a]amix=inputs=2:duration=first[aout]"
+        )
+
+    def build_mix_args(
+        self,
+        bg_audio: Path,
+        voice_audio: Path,
+        stream_loop: int = -1,
+        duration: float | None = None,
+    ) -> tuple[list[str], list[str]]:
+        """
+        ffmpeg input and output arguments mixing background and voice over input 0's video.
+        Returns (audio inputs to place after the video input, output options).
+        """
+        input_args = [
             # Repeat background using -stream_loop
+            "-stream_loop", str(stream_loop),
+            "-i", str(bg_audio),
+            "-i", str(voice_audio),
+        ]
+        output_args = [
+            "-filter_complex", self._mix_filter(bg_input=1, voice_input=2),
+            "-map", "0:v",
+            "-map", "[aout]",
+            "-c:v", "copy",
+            "-c:a", self.AUDIO_CODEC,
+            "-ar", str(self.AUDIO_SAMPLE_RATE),
+            "-ac", str(self.AUDIO_CHANNELS),
+        ]
+        if duration:
+            output_args.extend(["-t", f"{duration:.3f}"])
+        output_args.append("-shortest")
+        return input_args, output_args
+
+    async def _render_bed(self, bg_audio: Path, voice_audio: Path, duration: float) -> Path | None:
+        self.beds_dir.mkdir(parents=True, exist_ok=True)
+        bed_path = self.beds_dir / f"{bg_audio.stem}__{voice_audio.stem}__{duration:.2f}.m4a"
+        cmd = [
+            str(self.FFMPEG_PATH),
+            "-y",
+            "-stream_loop", "-1",
+            "-i", str(bg_audio),
+            "-i", str(voice_audio),
+            "-filter_complex", self._mix_filter(bg_input=0, voice_input=1),
+            "-map", "[aout]",
+            "-c:a", self.AUDIO_CODEC,
+            "-ar", str(self.AUDIO_SAMPLE_RATE),
+            "-ac", str(self.AUDIO_CHANNELS),
+            "-t", f"{duration:.3f}",
+            str(bed_path)
+        ]
+        try:
+            await self.render_pool.run(cmd)
+        except subprocess.SubprocessError as e:  # ffmpeg error or FFmpegTimeoutError
+            bed_path.unlink(missing_ok=True)
+            logger.warning(f"Could not mix {bg_audio.name} with {voice_audio.name} ({type(e).__name__})")
+            return None
+        return bed_path
+
+    async def get_audio_bed(self, bg_audio: Path, voice_audio: Path, duration: float) -> Path | None:
+        """
+        AAC mix of background (looped) and voice, `duration` seconds long, rendered once
+        per (background, voice, duration) and shared by every video that uses it.
+        """
+        key = (bg_audio, voice_audio, round(duration, 2))
+        if key in self.ready_beds:
+            return self.ready_beds[key]
+        if key not in self.beds:
+            self.beds[key] = asyncio.create_task(self._render_bed(bg_audio, voice_audio, key[2]))
+        return await self.beds[key]
+
+    @staticmethod
+    def build_mux_args(bed: Path, duration: float | None = None) -> tuple[list[str], list[str]]:
+        """ffmpeg arguments muxing a pre-mixed bed onto input 0's video, both stream-copied"""
+        output_args = ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy"]
+        if duration:
+            output_args.extend(["-t", f"{duration:.3f}"])
+        output_args.append("-shortest")
+        return ["-i", str(bed)], output_args
+
+    async def _overlay_one(self, video_path: Path, bed_duration: float) -> dict[str, Any]:
+        """Overlays one video; never raises, the outcome is reported in the returned status"""
+        started = time.perf_counter()
+        output_path = self.done_dir / video_path.name
+        # Each video renders to its own temp file, published to done/ only when complete
+        tmp_path = self.overlay_tmp_dir / f"{video_path.stem}.part{video_path.suffix}"
+        status = {"video": video_path.name, "status": "done", "error": None}
+
+        try:
+            audio_pair = self.pick_audio_pair()
+            if not audio_pair:
+                logger.warning(f"⚠️ Skipping video {video_path.name} due to corrupted audio")
+                status["status"] = "skipped"
+                status["error"] = "no usable audio"
+                return status
+            bg_audio_fixed, voice_audio_fixed = audio_pair
+
+            video_duration = await self.media_index.duration(video_path)
+
+            bed = await self.get_audio_bed(bg_audio_fixed, voice_audio_fixed, bed_duration) if bed_duration else None
+            if bed:
+                input_args, output_args = self.build_mux_args(bed, video_duration or None)
+            else:
+                bg_duration = await self.media_index.duration(bg_audio_fixed)
+                # How many times to repeat background to cover video (endless when a duration is unknown)
+                loop_count = int(video_duration // bg_duration) + 1 if video_duration and bg_duration else -1
+                input_args, output_args = self.build_mix_args(
+                    bg_audio_fixed, voice_audio_fixed, loop_count, duration=video_duration or None
+                )
+
             cmd = [
                 str(self.FFMPEG_PATH),
                 "-y",
                 "-i", str(video_path),
-                "-stream_loop", str(loop_count),
-                "-i", str(bg_audio_fixed),
-                "-i", str(voice_audio_fixed),
-                "-filter_complex", (
-                    f"[1:a]volume={self.BG_VOLUME}[a1];"
-                    f"[a1][2:a]amix=inputs=2:duration=first[aout]"
-                ),
-                "-map", "0:v",
-                "-map", "[aout]",
-                "-c:v", "copy",
-                "-c:a", "aac",
-                "-ar", str(self.AUDIO_SAMPLE_RATE),
-                "-ac", str(self.AUDIO_CHANNELS),
-                "-shortest",
-                str(output_path)
+                *input_args,
+                *output_args,
+                str(tmp_path)
             ]
 
-            subprocess.run(cmd, check=True)
+            await self.render_pool.run(cmd)
+            os.replace(tmp_path, output_path)
             logger.info(f"Video processed: {output_path.name}")
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            status["status"] = "failed"
+            status["error"] = getattr(e, "stderr", None) or str(e)
+            logger.error(f"Overlay failed for {video_path.name}: {e}")
+        finally:
+            status["seconds"] = round(time.perf_counter() - started, 3)
+
+        return status
+
+    async def overlay_audio(
+        self,
+        concurrency: int | None = OVERLAY_CONCURRENCY,
+        queue: asyncio.Queue | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Overlays audio on all combined videos, `concurrency` at a time (default: the
+        render pool's concurrency). One failing video does not stop the others; each
+        finished one is put on `queue`, if given.
+        Returns one status per video: name, "done"/"skipped"/"failed", error, seconds.
+        """
+        if not self.videos:
+            raise ValueError("No videos to process")
+
+        await self.prepare_audio()
+        await self.media_index.probe_many([*self.videos, *self.prepared.values()])
+        self.overlay_tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        # One bed per audio pair, long enough for the longest video; shorter ones cut it while muxing
+        bed_duration = self.bed_duration or max([await self.media_index.duration(v) for v in self.videos])
+
+        semaphore = asyncio.Semaphore(concurrency or self.render_pool.concurrency)
+
+        async def bounded(video_path: Path) -> dict[str, Any]:
+            async with semaphore:
+                status = await self._overlay_one(video_path, bed_duration)
+                if queue and status["status"] == "done":
+                    await queue.put(self.done_dir / video_path.name)
+                return status
+
+        statuses = await asyncio.gather(*(bounded(v) for v in self.videos))
+        failed = sum(1 for st in statuses if st["status"] != "done")
+        logger.info(f"Audio overlay: {len(statuses) - failed} done, {failed} skipped or failed")
+        return list(statuses)
+
+    async def overlay_from_queue(
+        self,
+        raw_queue: asyncio.Queue,
+        queue: asyncio.Queue | None = None,
+        bed_duration: Callable[[], float] | None = None,
+        concurrency: int | None = OVERLAY_CONCURRENCY,
+    ) -> list[dict[str, Any]]:
+        """
+        Overlays combined videos as they arrive on `raw_queue`, until a None sentinel, and
+        deletes each raw video once its overlay is done, so they never pile up on disk.
+        `bed_duration()` is read when the first video arrives (default: the job-wide
+        bed_duration; without either, every video is mixed on its own). Statuses as in overlay_audio.
+        """
+        await self.prepare_audio()
+        await self.media_index.probe_many(self.prepared.values())
+        self.overlay_tmp_dir.mkdir(parents=True, exist_ok=True)
+        statuses: list[dict[str, Any]] = []
+
+        async def worker():
+            while (video_path := await raw_queue.get()) is not None:
+                duration = self.bed_duration or (bed_duration() if bed_duration else 0.0)
+                status = await self._overlay_one(video_path, duration)
+                statuses.append(status)
+                if status["status"] == "done":
+                    video_path.unlink(missing_ok=True)
+                    if queue:
+                        await queue.put(self.done_dir / video_path.name)
+            # Hand the sentinel on to the next worker
+            await raw_queue.put(None)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency or self.render_pool.concurrency)))
+        failed = sum(1 for st in statuses if st["status"] != "done")
+        logger.info(f"Audio overlay: {len(statuses) - failed} done, {failed} skipped or failed")
+        return statuses
@@ -1,10 +1,14 @@
-from itertools import product
+import hashlib
+import math
+import random
+from itertools import islice, product
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator, Sequence
 
 
 class CombinationService:
     BASE_TEMP_DIR = Path(__file__).resolve().parent.parent / "temp_files"
+    FEISTEL_ROUNDS = 4
 
     def __init__(self, task_name: str):
         self.task_name = task_name
@@ -12,12 +16,103 @@ class CombinationService:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
     @staticmethod
-    def generate_combinations(video_blocks: dict) -> list[tuple[Any, ...]]:
+    def count_combinations(blocks: Sequence[Sequence[Any]]) -> int:
+        """Size of the Cartesian product, without building it"""
+        return math.prod(len(block) for block in blocks)
+
+    @staticmethod
+    def combination_at(blocks: Sequence[Sequence[Any]], index: int) -> tuple[Any, ...]:
+        """
+        Decodes a product index (mixed radix, last block varies fastest)
+        into the same tuple itertools.product would yield at that position.
+        """
+        picked = []
+        for block in reversed(blocks):
+            index, digit = divmod(index, len(block))
+            picked.append(block[digit])
+        return tuple(reversed(picked))
+
+    @classmethod
+    def permutation(cls, total: int, seed: int | None = None) -> Callable[[int], int]:
+        """
+        Seeded bijection of range(total): position -> product index. A balanced Feistel
+        network over the next even power of two, cycle-walked back into range, so any
+        slice of positions is a page of the same shuffled order whatever its size.
+        """
+        half_bits = max(1, ((total - 1).bit_length() + 1) // 2)
+        mask = (1 << half_bits) - 1
+        key = seed if seed is not None else random.getrandbits(64)
+
+        def round_value(value: int, round_no: int) -> int:
+            digest = hashlib.blake2b(f"{key}:{round_no}:{value}".encode(), digest_size=8).digest()
+            return int.from_bytes(digest, "big") & mask
+
+        def encrypt(value: int) -> int:
+            left, right = value >> half_bits, value & mask
+            for round_no in range(cls.FEISTEL_ROUNDS):
+                left, right = right, left ^ round_value(right, round_no)
+            return (left << half_bits) | right
+
+        def permute(position: int) -> int:
+            value = encrypt(position)
+            while value >= total:
+                value = encrypt(value)
+            return value
+
+        return permute
+
+    @classmethod
+    def iter_indices(
+        cls,
+        total: int,
+        max_combinations: int | None = None,
+        sample: bool = False,
+        seed: int | None = None,
+        offset: int = 0,
+    ) -> Iterator[int]:
+        """
+        Product indices to render. Sequential mode pages through the product in order;
+        sample mode pages through one seeded permutation of all indices, so pages with
+        the same seed never overlap (memory ~ limit).
+        """
+        offset = max(0, offset)
+        limit = total - offset if max_combinations is None else min(max_combinations, total - offset)
+        if limit <= 0:
+            return iter(())
+
+        if not sample:
+            return iter(range(offset, offset + limit))
+
+        permute = cls.permutation(total, seed)
+        picked = [permute(position) for position in range(offset, offset + limit)]
+        # Ascending order keeps combinations that share clips next to each other
+        return iter(sorted(picked))
+
+    @classmethod
+    def iter_combinations(
+        cls,
+        blocks: Sequence[Sequence[Any]],
+        max_combinations: int | None = None,
+        sample: bool = False,
+        seed: int | None = None,
+        offset: int = 0,
+    ) -> Iterator[tuple[Any, ...]]:
+        """Lazily yields combinations, never materializing the full product"""
+        if not sample and offset == 0:
+            return islice(product(*blocks), max_combinations)
+
+        total = cls.count_combinations(blocks)
+        indices = cls.iter_indices(total, max_combinations, sample, seed, offset)
+        return (cls.combination_at(blocks, idx) for idx in indices)
+
+    @classmethod
+    def generate_combinations(cls, video_blocks: dict, **selection: Any) -> Iterator[tuple[Any, ...]]:
         """
-        Generates all possible combinations of videos from blocks.
+        Generates combinations of videos from blocks (all of them by default).
+        `selection` accepts max_combinations, sample, seed and offset.
         """
         blocks = [v for k, v in sorted(video_blocks.items())]
-        return list(product(*blocks))
+        return cls.iter_combinations(blocks, **selection)
 
     def get_output_path(self, idx: int) -> Path:
         """
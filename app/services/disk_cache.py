@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from loguru import logger
+
+from .file_lock import FileLock
+
+
+class DiskCacheService:
+    """
+    Worker-local, byte-budgeted LRU cache of files, safe to share between processes.
+    Entries are published atomically (temp file + rename) and recency is the file mtime,
+    refreshed on every hit. Files are handed out as hardlinks, so an entry evicted by
+    another process stays readable for whoever already linked it.
+    """
+    LOCK_NAME = ".lock"
+    TMP_SUFFIX = ".tmp"
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: object) -> str:
+        return hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+
+    @staticmethod
+    def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+        """sha256 of a file's content"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path_for(self, key: str, suffix: str = "") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    @staticmethod
+    def _link_or_copy(src: Path, dest: Path) -> None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+
+    def fetch(self, key: str, dest: Path, suffix: str = "") -> bool:
+        """Links a cached entry to `dest`; False (a miss) if there is none"""
+        cached = self.path_for(key, suffix)
+        try:
+            self._link_or_copy(cached, dest)
+            os.utime(cached)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def publish(self, key: str, src: Path, suffix: str = "") -> Path:
+        """Stores a copy of `src` under `key`, atomically, then enforces the byte budget"""
+        cached = self.path_for(key, suffix)
+        tmp_path = cached.with_name(f"{cached.name}.{uuid.uuid4().hex}{self.TMP_SUFFIX}")
+        self._link_or_copy(src, tmp_path)
+        os.replace(tmp_path, cached)
+        self.evict()
+        return cached
+
+    def evict(self) -> int:
+        """Removes least recently used entries until the cache fits its budget"""
+        with FileLock(self.root / self.LOCK_NAME):
+            entries = []
+            for path in self.root.glob("*/*"):
+                if path.name.endswith(self.TMP_SUFFIX):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in sorted(entries):
+                if total - freed <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                freed += size
+
+        if freed:
+            logger.info(f"Cache {self.root.name}: evicted {freed} bytes")
+        return freed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,80 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+from core.configs import CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES
+from .disk_cache import DiskCacheService
+
+
+class DownloadCacheService:
+    """
+    Persistent URL cache shared by all tasks of a worker. Content lives once in a
+    content-addressed blob store (sha256 of the bytes, byte-budgeted LRU); a small
+    per-URL index entry remembers the blob plus the ETag / Last-Modified needed to
+    revalidate it with a conditional GET.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR / "downloads", max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        self.blobs = DiskCacheService(root / "blobs", max_bytes)
+        self.index_dir = root / "index"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _index_path(self, url: str) -> Path:
+        return self.index_dir / f"{DiskCacheService.make_key(url)}.json"
+
+    def lookup(self, url: str) -> dict | None:
+        """Index entry for `url`, only while its blob is still in the store"""
+        try:
+            entry = json.loads(self._index_path(url).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry if self.blobs.path_for(entry["blob"]).exists() else None
+
+    @staticmethod
+    def conditional_headers(entry: dict | None) -> dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def link(self, entry: dict, dest: Path) -> bool:
+        """Hardlinks (or copies) the cached content to `dest`; False if the blob was evicted meanwhile"""
+        if not self.blobs.fetch(entry["blob"], dest):
+            return False
+        self.hits += 1
+        self.bytes_saved += entry.get("size", 0)
+        return True
+
+    def store(self, url: str, file_path: Path, etag: str | None, last_modified: str | None) -> dict:
+        """Publishes a freshly downloaded file and (re)points the URL entry at it"""
+        self.misses += 1
+        digest = DiskCacheService.file_digest(file_path)
+        self.blobs.publish(digest, file_path)
+
+        entry = {
+            "url": url,
+            "blob": digest,
+            "size": file_path.stat().st_size,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        index_path = self._index_path(url)
+        tmp_path = index_path.with_name(f"{index_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
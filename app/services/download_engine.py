@@ -0,0 +1,260 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import aiofiles
+import aiohttp
+from loguru import logger
+
+from core.configs import (
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CONNECTIONS_PER_HOST,
+    DOWNLOAD_MAX_RETRIES,
+    DOWNLOAD_RANGED_MIN_BYTES,
+    DOWNLOAD_SEGMENT_SIZE,
+    DOWNLOAD_SEGMENTS_PER_FILE,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+)
+from .retry import with_retries
+
+
+@dataclass
+class DownloadResult:
+    path: Path | None  # None when the server answered 304 Not Modified
+    etag: str | None = None
+    last_modified: str | None = None
+    size: int = 0
+    not_modified: bool = False
+
+
+class DownloadError(RuntimeError):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class DownloadEngine:
+    """
+    HTTP download engine: large files that support byte ranges are fetched in
+    parallel segments, every transfer resumes from its `.part` file after a
+    failure, transient errors are retried with exponential backoff, and the
+    result is checked against Content-Length and, when the server sends one,
+    its MD5 (x-goog-hash / Content-MD5).
+    """
+    BACKOFF_BASE = 0.5  # seconds, doubled per attempt, with jitter
+    RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        segment_size: int = DOWNLOAD_SEGMENT_SIZE,
+        ranged_min_bytes: int = DOWNLOAD_RANGED_MIN_BYTES,
+        segments_per_file: int = DOWNLOAD_SEGMENTS_PER_FILE,
+        max_retries: int = DOWNLOAD_MAX_RETRIES,
+    ):
+        self.chunk_size = chunk_size
+        self.segment_size = segment_size
+        self.ranged_min_bytes = ranged_min_bytes
+        self.segments_per_file = segments_per_file
+        self.max_retries = max_retries
+
+    @staticmethod
+    def connector(limit_per_host: int = DOWNLOAD_CONNECTIONS_PER_HOST) -> aiohttp.TCPConnector:
+        """Pooled connector: keep-alive, cached DNS and a cap on connections per host"""
+        return aiohttp.TCPConnector(
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, DownloadError):
+            return error.retryable
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.RETRYABLE_STATUSES
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def _with_retries(self, label: str, attempt_fn: Callable[[], Awaitable]):
+        return await with_retries(label, attempt_fn, self.max_retries, self._is_retryable, self.BACKOFF_BASE)
+
+    @staticmethod
+    def _expected_md5(headers) -> str | None:
+        """Base64 MD5 announced by the server, if any"""
+        for part in headers.get("x-goog-hash", "").split(","):
+            name, _, value = part.strip().partition("=")
+            if name == "md5" and value:
+                return value
+        return headers.get("Content-MD5")
+
+    def _file_md5(self, path: Path) -> str:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+        return base64.b64encode(digest.digest()).decode()
+
+    async def _head(self, session: aiohttp.ClientSession, url: str, headers: dict) -> aiohttp.ClientResponse:
+        async with session.head(url, headers=headers, allow_redirects=True) as response:
+            if response.status >= 500 or response.status in (408, 429):
+                response.raise_for_status()
+            return response
+
+    async def fetch(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        dest: Path,
+        headers: dict[str, str] | None = None,
+    ) -> DownloadResult:
+        """Downloads `url` to `dest`; `headers` may carry conditional validators"""
+        head = await self._with_retries(f"HEAD {url}", lambda: self._head(session, url, headers or {}))
+        if head.status == 304:
+            return DownloadResult(path=None, not_modified=True)
+
+        info = head.headers if head.ok else {}
+        etag, last_modified = info.get("ETag"), info.get("Last-Modified")
+        size = int(info["Content-Length"]) if info.get("Content-Length", "").isdigit() else None
+        ranged = size is not None and size >= self.ranged_min_bytes and info.get("Accept-Ranges") == "bytes"
+
+        part_path = dest.with_name(f"{dest.name}.part")
+        if ranged:
+            await self._fetch_segmented(session, url, part_path, size, etag or last_modified)
+        else:
+            response_headers = await self._with_retries(
+                f"GET {url}", lambda: self._fetch_stream(session, url, part_path, etag or last_modified)
+            )
+            etag = etag or response_headers.get("ETag")
+            last_modified = last_modified or response_headers.get("Last-Modified")
+            length = response_headers.get("X-Total-Length")
+            size = size if size is not None else (int(length) if length else None)
+            info = info or response_headers
+
+        actual_size = part_path.stat().st_size
+        if size is not None and actual_size != size:
+            part_path.unlink(missing_ok=True)
+            raise DownloadError(f"Size mismatch for {url}: {actual_size} != {size}", retryable=False)
+
+        expected_md5 = self._expected_md5(info)
+        if expected_md5 and await asyncio.to_thread(self._file_md5, part_path) != expected_md5:
+            part_path.unlink(missing_ok=True)
+            raise DownloadError(f"MD5 mismatch for {url}", retryable=False)
+
+        dest.unlink(missing_ok=True)
+        os.replace(part_path, dest)
+        return DownloadResult(path=dest, etag=etag, last_modified=last_modified, size=actual_size)
+
+    async def _fetch_stream(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        part_path: Path,
+        validator: str | None,
+    ) -> dict[str, str]:
+        """Single-connection transfer, continuing an existing .part when the server allows it"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {}
+        if offset and validator:
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            resumed = response.status == 206
+            async with aiofiles.open(part_path, "ab" if resumed else "wb") as f:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await f.write(chunk)
+
+            result = dict(response.headers)
+            total = response.headers.get("Content-Range", "").rpartition("/")[2] if resumed else \
+                response.headers.get("Content-Length")
+            if total and total.isdigit():
+                result["X-Total-Length"] = total
+            if resumed:
+                logger.info(f"Resumed {part_path.name} from byte {offset}")
+            return result
+
+    async def _fetch_segmented(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        part_path: Path,
+        size: int,
+        validator: str | None,
+    ) -> None:
+        """Parallel ranged transfer; finished segments are recorded so a retry only fetches the rest"""
+        state_path = part_path.with_name(f"{part_path.name}.json")
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+
+        if state.get("validator") != validator or state.get("size") != size or not part_path.exists():
+            state = {"validator": validator, "size": size, "done": []}
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+
+        done = set(state["done"])
+        segments = [
+            (start, min(start + self.segment_size, size) - 1)
+            for start in range(0, size, self.segment_size)
+            if start not in done
+        ]
+        semaphore = asyncio.Semaphore(self.segments_per_file)
+
+        async def fetch_segment(start: int, end: int) -> None:
+            async with semaphore:
+                await self._with_retries(
+                    f"GET {url} [{start}-{end}]",
+                    lambda: self._fetch_range(session, url, part_path, start, end, validator),
+                )
+                done.add(start)
+                state["done"] = sorted(done)
+                tmp_path = state_path.with_name(f"{state_path.name}.tmp")
+                tmp_path.write_text(json.dumps(state), encoding="utf-8")
+                os.replace(tmp_path, state_path)
+
+        if done:
+            logger.info(f"Resuming {part_path.name}: {len(done)} segments already on disk")
+        tasks = [asyncio.create_task(fetch_segment(start, end)) for start, end in segments]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other segments before a retry starts writing into the same .part
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        state_path.unlink(missing_ok=True)
+
+    async def _fetch_range(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        part_path: Path,
+        start: int,
+        end: int,
+        validator: str | None,
+    ) -> None:
+        headers = {"Range": f"bytes={start}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise DownloadError(f"{url} changed or ignored the range request", retryable=False)
+
+            written = 0
+            async with aiofiles.open(part_path, "r+b") as f:
+                await f.seek(start)
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await f.write(chunk)
+                    written += len(chunk)
+
+        if written != end - start + 1:
+            raise DownloadError(f"Short segment {start}-{end} of {url}: {written} bytes")
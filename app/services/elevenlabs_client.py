@@ -0,0 +1,188 @@
+import asyncio
+import os
+import random
+from pathlib import Path
+
+import aiofiles
+import aiohttp
+from loguru import logger
+
+from core.configs import (
+    ELEVEN_LABS_API_KEY,
+    ELEVENLABS_BASE_URL,
+    TTS_CONCURRENCY,
+    TTS_MAX_CONCURRENCY,
+    TTS_MAX_RETRIES,
+)
+
+
+class TTSError(RuntimeError):
+    def __init__(self, message: str, retryable: bool = False, retry_after: float | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TTSQuotaError(TTSError):
+    pass
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: every success widens it by about one slot per window of
+    requests, every throttle halves it. The provider's maximum-concurrent-requests
+    header, when present, caps it.
+    """
+
+    def __init__(self, initial: int = TTS_CONCURRENCY, maximum: int = TTS_MAX_CONCURRENCY):
+        self.limit = float(max(1, initial))
+        self.maximum = max(1, maximum)
+        self.in_flight = 0
+        self.throttled = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, headers) -> None:
+        provider_max = headers.get("maximum-concurrent-requests", "")
+        if provider_max.isdigit():
+            self.maximum = max(1, int(provider_max))
+        self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def on_throttle(self) -> None:
+        self.throttled += 1
+        self.limit = max(1.0, self.limit / 2)
+        logger.warning(f"TTS throttled, concurrency limit now {int(self.limit)}")
+
+
+class ElevenLabsAsyncClient:
+    """
+    Text-to-speech over a (pooled) aiohttp session: audio is streamed straight to disk,
+    429/5xx and connection errors are retried with jittered exponential backoff
+    (honouring Retry-After), and concurrency follows the AdaptiveLimiter.
+    """
+    BACKOFF_BASE = 1.0  # seconds, doubled per attempt
+    RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        api_key: str | None = ELEVEN_LABS_API_KEY,
+        base_url: str = ELEVENLABS_BASE_URL,
+        limiter: AdaptiveLimiter | None = None,
+        max_retries: int = TTS_MAX_RETRIES,
+    ):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_retries = max_retries
+        self.retries = 0
+        self.quota_exhausted = False
+
+    def reset_quota(self) -> None:
+        """
+        Called when a job starts: the client outlives jobs on a worker, and a quota hit
+        of an earlier job (the account may have been topped up since) must not block this one
+        """
+        self.quota_exhausted = False
+
+    @staticmethod
+    def _retry_after(headers) -> float | None:
+        try:
+            return float(headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+
+    async def _raise_for_status(self, response: aiohttp.ClientResponse) -> None:
+        if response.ok:
+            return
+        try:
+            detail = (await response.json()).get("detail") or {}
+        except (aiohttp.ContentTypeError, ValueError):
+            detail = {}
+        status = detail.get("status", "") if isinstance(detail, dict) else ""
+        message = f"ElevenLabs {response.status} {status or response.reason}".strip()
+
+        if status == "quota_exceeded":
+            raise TTSQuotaError(message)
+        raise TTSError(
+            message,
+            retryable=response.status in self.RETRYABLE_STATUSES,
+            retry_after=self._retry_after(response.headers),
+        )
+
+    async def _stream_once(self, url: str, payload: dict, params: dict, file_path: Path) -> None:
+        part_path = file_path.with_name(f"{file_path.name}.part")
+        async with self.limiter:
+            # Requests queued on the limiter while another one hit the quota
+            if self.quota_exhausted:
+                raise TTSQuotaError("ElevenLabs quota exhausted earlier in this job")
+            async with self.session.post(
+                url, json=payload, params=params, headers={"xi-api-key": self.api_key or ""}
+            ) as response:
+                if response.status == 429:
+                    self.limiter.on_throttle()
+                await self._raise_for_status(response)
+
+                async with aiofiles.open(part_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                        await f.write(chunk)
+                self.limiter.on_success(response.headers)
+
+        if part_path.stat().st_size == 0:
+            part_path.unlink(missing_ok=True)
+            raise TTSError(f"Audio not generated: {file_path}", retryable=True)
+        os.replace(part_path, file_path)
+
+    async def synthesize(
+        self,
+        text: str,
+        voice_id: str,
+        file_path: Path,
+        model_id: str,
+        output_format: str,
+        voice_settings: dict | None = None,
+    ) -> Path:
+        """Writes the audio for `text` to `file_path`"""
+        if self.quota_exhausted:
+            raise TTSQuotaError("ElevenLabs quota exhausted earlier in this job")
+
+        url = f"{self.base_url}/v1/text-to-speech/{voice_id}/stream"
+        payload = {"text": text, "model_id": model_id}
+        if voice_settings:
+            payload["voice_settings"] = voice_settings
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._stream_once(url, payload, {"output_format": output_format}, file_path)
+                return file_path
+            except TTSQuotaError:
+                self.quota_exhausted = True
+                raise
+            except (TTSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = e.retryable if isinstance(e, TTSError) else True
+                if attempt == self.max_retries or not retryable:
+                    raise
+                retry_after = e.retry_after if isinstance(e, TTSError) else None
+                delay = retry_after or self.BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+                self.retries += 1
+                logger.warning(f"TTS {voice_id}: {e}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": int(self.limiter.limit),
+            "throttled": self.limiter.throttled,
+            "retries": self.retries,
+        }
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import signal
+import subprocess
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+from core.configs import FFMPEG_TIMEOUT
+
+
+@dataclass
+class FFmpegProgress:
+    frame: int = 0
+    fps: float = 0.0
+    speed: float = 0.0  # x realtime
+    out_time: float = 0.0  # seconds written so far
+    finished: bool = False
+
+
+class FFmpegTimeoutError(subprocess.TimeoutExpired):
+    pass
+
+
+class FFmpegRunner:
+    """
+    Runs ffmpeg as an asyncio subprocess: parses `-progress pipe:1` into FFmpegProgress
+    updates, enforces a wall-clock timeout, kills the child on cancellation and keeps
+    only a bounded tail of stderr for error reports.
+    """
+    STDERR_TAIL_LINES = 40
+    PROGRESS_LOG_INTERVAL = 10.0  # seconds between progress log lines per command
+
+    # pids of running ffmpeg children in this process, for kill_all()
+    _active_pids: set[int] = set()
+
+    def __init__(self, timeout: float | None = FFMPEG_TIMEOUT):
+        self.timeout = timeout
+
+    @classmethod
+    def kill_all(cls) -> None:
+        """Kills every running ffmpeg child; safe to call from a signal handler"""
+        kill_signal = getattr(signal, "SIGKILL", signal.SIGTERM)
+        for pid in list(cls._active_pids):
+            try:
+                os.kill(pid, kill_signal)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _parse_progress(fields: dict[str, str]) -> FFmpegProgress:
+        def number(key: str, cast=float):
+            try:
+                return cast(fields.get(key, "0").rstrip("x") or 0)
+            except ValueError:
+                return cast(0)
+
+        return FFmpegProgress(
+            frame=number("frame", int),
+            fps=number("fps"),
+            speed=number("speed"),
+            out_time=number("out_time_us", int) / 1_000_000,
+            finished=fields.get("progress") == "end",
+        )
+
+    def _log_progress(self, label: str) -> Callable[[FFmpegProgress], None]:
+        last_logged = 0.0
+
+        def log(progress: FFmpegProgress) -> None:
+            nonlocal last_logged
+            now = time.monotonic()
+            if now - last_logged >= self.PROGRESS_LOG_INTERVAL and not progress.finished:
+                last_logged = now
+                logger.debug(
+                    f"{label}: frame={progress.frame} fps={progress.fps:.1f} "
+                    f"speed={progress.speed:.2f}x time={progress.out_time:.1f}s"
+                )
+
+        return log
+
+    async def _read_progress(self, stream: asyncio.StreamReader, on_progress: Callable[[FFmpegProgress], None]):
+        fields: dict[str, str] = {}
+        async for raw_line in stream:
+            key, _, value = raw_line.decode(errors="replace").strip().partition("=")
+            fields[key] = value
+            if key == "progress":
+                on_progress(self._parse_progress(fields))
+                fields = {}
+
+    @staticmethod
+    async def _read_tail(stream: asyncio.StreamReader, tail: deque) -> None:
+        async for raw_line in stream:
+            tail.append(raw_line.decode(errors="replace").rstrip())
+
+    async def run(
+        self,
+        cmd: list[str],
+        timeout: float | None = None,
+        on_progress: Callable[[FFmpegProgress], None] | None = None,
+    ) -> None:
+        """
+        Runs one ffmpeg command to completion. Raises FFmpegTimeoutError after `timeout`
+        seconds (default: the runner's) and CalledProcessError with the stderr tail on failure.
+        """
+        timeout = timeout or self.timeout
+        on_progress = on_progress or self._log_progress(Path(cmd[-1]).name)
+        cmd = [cmd[0], "-nostats", "-progress", "pipe:1", *cmd[1:]]
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        self._active_pids.add(process.pid)
+        tail: deque[str] = deque(maxlen=self.STDERR_TAIL_LINES)
+
+        async def communicate() -> int:
+            await asyncio.gather(
+                self._read_progress(process.stdout, on_progress),
+                self._read_tail(process.stderr, tail),
+            )
+            return await process.wait()
+
+        try:
+            returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            raise FFmpegTimeoutError(cmd, timeout, stderr="\n".join(tail))
+        except BaseException:
+            # Cancelled (task revoked, time limit, sibling failure): never leave ffmpeg behind
+            await self._kill(process)
+            raise
+        finally:
+            self._active_pids.discard(process.pid)
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr="\n".join(tail))
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
@@ -0,0 +1,136 @@
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tarfile
+import threading
+import urllib.request
+import uuid
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from core.configs import FFMPEG_PATH, FFPROBE_PATH
+from .file_lock import FileLock
+
+BIN_DIR = Path(__file__).resolve().parent.parent.parent / "bin" / "ffmpeg"
+
+DOWNLOAD_URLS = {
+    "windows": "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip",
+    "linux": "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz",
+}
+
+
+@dataclass(frozen=True)
+class FFmpegToolchain:
+    ffmpeg: str
+    ffprobe: str
+    version: str
+    encoders: frozenset[str]
+    filters: frozenset[str]
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+    def has_filter(self, name: str) -> bool:
+        return name in self.filters
+
+
+_toolchain: FFmpegToolchain | None = None
+_toolchain_lock = threading.Lock()
+
+
+def _exe(name: str) -> str:
+    return f"{name}.exe" if platform.system().lower() == "windows" else name
+
+
+def _download(system: str) -> None:
+    """Fetches the static build and installs ffmpeg/ffprobe into BIN_DIR with atomic renames"""
+    url = DOWNLOAD_URLS.get(system)
+    if not url:
+        raise RuntimeError(f"Unsupported OS: {system}")
+
+    logger.info(f"Downloading ffmpeg for {system}...")
+    token = uuid.uuid4().hex
+    archive_path = BIN_DIR / f"download_{token}{'.zip' if url.endswith('.zip') else '.tar.xz'}"
+    extract_dir = BIN_DIR / f"extract_{token}"
+    try:
+        urllib.request.urlretrieve(url, archive_path)
+        if url.endswith(".zip"):
+            with zipfile.ZipFile(archive_path) as zip_ref:
+                members = [f for f in zip_ref.namelist() if f.endswith(("bin/ffmpeg.exe", "bin/ffprobe.exe"))]
+                zip_ref.extractall(extract_dir, members)
+        else:
+            with tarfile.open(archive_path) as tar_ref:
+                members = [f for f in tar_ref.getmembers() if f.name.endswith(("/ffmpeg", "/ffprobe"))]
+                tar_ref.extractall(extract_dir, members)
+                members = [f.name for f in members]
+
+        for member in members:
+            binary_path = extract_dir / member
+            os.chmod(binary_path, 0o755)
+            os.replace(binary_path, BIN_DIR / Path(member).name)
+    finally:
+        archive_path.unlink(missing_ok=True)
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+def _resolve_binaries() -> tuple[str, str]:
+    """FFMPEG_PATH/FFPROBE_PATH env, then the system PATH, then a local (downloaded) build"""
+    if FFMPEG_PATH:
+        ffmpeg = Path(FFMPEG_PATH)
+        ffprobe = Path(FFPROBE_PATH) if FFPROBE_PATH else ffmpeg.with_name(ffmpeg.name.replace("ffmpeg", "ffprobe"))
+        return str(ffmpeg), str(ffprobe)
+
+    system_ffmpeg, system_ffprobe = shutil.which("ffmpeg"), shutil.which("ffprobe")
+    if system_ffmpeg and system_ffprobe:
+        return system_ffmpeg, system_ffprobe
+
+    ffmpeg_path, ffprobe_path = BIN_DIR / _exe("ffmpeg"), BIN_DIR / _exe("ffprobe")
+    if not (ffmpeg_path.exists() and ffprobe_path.exists()):
+        BIN_DIR.mkdir(parents=True, exist_ok=True)
+        # Worker processes starting together wait here; only the first one downloads
+        with FileLock(BIN_DIR / ".download.lock"):
+            if not (ffmpeg_path.exists() and ffprobe_path.exists()):
+                _download(platform.system().lower())
+        logger.info(f"ffmpeg ready: {ffmpeg_path}")
+    return str(ffmpeg_path), str(ffprobe_path)
+
+
+def _probe_names(ffmpeg: str, listing: str) -> frozenset[str]:
+    """Names listed by `ffmpeg -encoders` / `-filters` (after the ' ---' separator, if any)"""
+    output = subprocess.run([ffmpeg, "-hide_banner", f"-{listing}"],
+                            capture_output=True, text=True).stdout
+    names = set()
+    for line in output.split("---", 1)[-1].splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[1] != "=":
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def get_toolchain() -> FFmpegToolchain:
+    """Resolves ffmpeg/ffprobe and probes their capabilities once per process"""
+    global _toolchain
+    if _toolchain:
+        return _toolchain
+
+    with _toolchain_lock:
+        if _toolchain:
+            return _toolchain
+
+        ffmpeg, ffprobe = _resolve_binaries()
+        version_output = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True).stdout
+        match = re.search(r"ffmpeg version (\S+)", version_output)
+        _toolchain = FFmpegToolchain(
+            ffmpeg=ffmpeg,
+            ffprobe=ffprobe,
+            version=match.group(1) if match else "unknown",
+            encoders=_probe_names(ffmpeg, "encoders"),
+            filters=_probe_names(ffmpeg, "filters"),
+        )
+        logger.info(f"Using ffmpeg {_toolchain.version} at {ffmpeg}")
+        return _toolchain
@@ -1,53 +1,96 @@
 import asyncio
+import glob
 import aiohttp
-import aiofiles
+from contextlib import nullcontext
 from pathlib import Path
 from urllib.parse import urlparse
 import os
 
 from loguru import logger
 
+from core.configs import DOWNLOAD_MAX_CONCURRENT
+from .download_cache import DownloadCacheService
+from .download_engine import DownloadEngine
+
 
 class AsyncDownloaderService:
     BASE_TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_files"
-    MAX_CONCURRENT: int = 3
+    MAX_CONCURRENT: int = DOWNLOAD_MAX_CONCURRENT
 
-    def __init__(self, task_name: str):
+    def __init__(
+        self,
+        task_name: str,
+        cache: DownloadCacheService | None = None,
+        engine: DownloadEngine | None = None,
+        session: aiohttp.ClientSession | None = None,
+    ):
         self.task_name = task_name
         self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+        self.cache = cache or DownloadCacheService()
+        self.engine = engine or DownloadEngine()
+        # Shared worker session, left open after each call; otherwise one session per call
+        self.session = session
 
     async def _download_one(self, session: aiohttp.ClientSession, url: str, save_dir: Path) -> Path | None:
-        """Downloads one file"""
-        async with self.semaphore:
-            filename = os.path.basename(urlparse(url).path) or "file"
-            file_path = save_dir / filename
-            save_dir.mkdir(parents=True, exist_ok=True)
-
-            try:
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    async with aiofiles.open(file_path, "wb") as f:
-                        async for chunk in response.content.iter_chunked(1024 * 64):
-                            await f.write(chunk)
-                logger.info(f"✅ Downloaded: {file_path}")
-                return file_path
-            except Exception as e:
-                logger.error(f"❌ Error downloading {url}: {e}")
-                return None
-
-    async def download_blocks(self, files_dict: dict, files_type: str) -> dict[str, list[Path]]:
+        """Downloads one file, or links it from the worker cache when the server confirms it is unchanged"""
+        filename = os.path.basename(urlparse(url).path) or "file"
+        file_path = save_dir / filename
+        save_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            entry = await asyncio.to_thread(self.cache.lookup, url)
+            # The path may be a hardlink into the cache from an earlier task; never write through it
+            file_path.unlink(missing_ok=True)
+            result = await self.engine.fetch(session, url, file_path, self.cache.conditional_headers(entry))
+
+            if result.not_modified:
+                if entry and await asyncio.to_thread(self.cache.link, entry, file_path):
+                    logger.info(f"♻️ Cached: {file_path}")
+                    return file_path
+                # Blob evicted between lookup and link: fall back to a full download
+                result = await self.engine.fetch(session, url, file_path)
+
+            await asyncio.to_thread(self.cache.store, url, file_path, result.etag, result.last_modified)
+            logger.info(f"✅ Downloaded: {file_path}")
+            return file_path
+        except Exception as e:
+            logger.error(f"❌ Error downloading {url}: {e}")
+            # Retries are exhausted; leftovers would be picked up as media by the block scanners
+            for leftover in save_dir.glob(f"{glob.escape(filename)}.part*"):
+                leftover.unlink(missing_ok=True)
+            return None
+
+    async def download_blocks(
+        self,
+        files_dict: dict,
+        files_type: str,
+        queue: asyncio.Queue | None = None,
+    ) -> dict[str, list[Path]]:
         """
         Downloads all files from dictionary (block1, block2...) and saves to subfolders.
+        With `queue`, every finished file is also put on it as (block_name, index, path)
+        right away; while the queue is full no further downloads start.
         """
         base_dir = self.BASE_TEMP_DIR / self.task_name / files_type
         base_dir.mkdir(parents=True, exist_ok=True)
 
-        async with aiohttp.ClientSession() as session:
+        session_context = nullcontext(self.session) if self.session else \
+            aiohttp.ClientSession(connector=self.engine.connector())
+        async with session_context as session:
             all_results = {}
 
             async def process_block(block_name, urls):
                 block_dir = base_dir / block_name
-                tasks = [self._download_one(session, url, block_dir) for url in urls]
+
+                async def download(index: int, url: str) -> Path | None:
+                    async with self.semaphore:
+                        file_path = await self._download_one(session, url, block_dir)
+                        if file_path and queue is not None:
+                            # Keeps the slot until the consumer has room
+                            await queue.put((block_name, index, file_path))
+                        return file_path
+
+                tasks = [download(index, url) for index, url in enumerate(urls)]
                 results = await asyncio.gather(*tasks)
                 all_results[block_name] = [r for r in results if r]
 
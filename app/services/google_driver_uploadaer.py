@@ -1,5 +1,4 @@
 from pathlib import Path
-from typing import List
 
 from loguru import logger
 from pydrive.auth import GoogleAuth
@@ -7,40 +6,67 @@ from pydrive.drive import GoogleDrive
 
 
 class GoogleDriveService:
-    def __init__(self, project_name: str):
-        self.project_name = project_name
-
-        # Project root
-        self.BASE_DIR = Path(__file__).resolve().parent.parent.parent
-        self.BASE_TEMP_DIR = self.BASE_DIR / "temp_files"
+    BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
-        # Google auth files
-        self.credentials_file = self.BASE_DIR / "core" / "mycredentials.json"
-        self.client_secrets_file = self.BASE_DIR / "core" / "client_secret_-.apps.googleusercontent.com.json"
-
-        # Create token directory if it doesn't exist
-        self.credentials_file.parent.mkdir(parents=True, exist_ok=True)
+    # Google auth files
+    CREDENTIALS_FILE = BASE_DIR / "core" / "mycredentials.json"
+    CLIENT_SECRETS_FILE = BASE_DIR / "core" / "client_secret_-.apps.googleusercontent.com.json"
 
-        # Authentication
-        self.gauth = GoogleAuth()
-        self.gauth.DEFAULT_SETTINGS['client_config_file'] = str(self.client_secrets_file)
-        self.gauth.LoadCredentialsFile(str(self.credentials_file))
+    MAIN_FOLDER_NAME = "video_generator"
 
-        if self.gauth.credentials is None:
-            self.gauth.LocalWebserverAuth()
-            self.gauth.SaveCredentialsFile(str(self.credentials_file))
-        elif self.gauth.access_token_expired:
-            self.gauth.Refresh()
-            self.gauth.SaveCredentialsFile(str(self.credentials_file))
-        else:
-            self.gauth.Authorize()
+    def __init__(
+        self,
+        project_name: str,
+        gauth: GoogleAuth | None = None,
+        folder_ids: dict[tuple[str, str | None], str] | None = None,
+    ):
+        self.project_name = project_name
 
+        self.gauth = gauth or self.authorize()
+        self.ensure_authorized()
         self.drive = GoogleDrive(self.gauth)
 
-        self.main_folder_id = self._get_or_create_folder("video_generator")
+        # (folder name, parent id) -> folder id; a worker passes one dict to all its tasks
+        self.folder_ids = folder_ids if folder_ids is not None else {}
+        self.main_folder_id = self._get_or_create_folder(self.MAIN_FOLDER_NAME)
         self.project_folder_id = self._get_or_create_folder(self.project_name, parent_id=self.main_folder_id)
 
+    @classmethod
+    def authorize(cls, interactive: bool = True) -> GoogleAuth:
+        """
+        Loads the saved credentials, running the OAuth flow only when there are none.
+        Non-interactive callers (workers) get an error instead of a browser flow that never finishes.
+        """
+        # Create token directory if it doesn't exist
+        cls.CREDENTIALS_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+        gauth = GoogleAuth()
+        gauth.DEFAULT_SETTINGS['client_config_file'] = str(cls.CLIENT_SECRETS_FILE)
+        gauth.LoadCredentialsFile(str(cls.CREDENTIALS_FILE))
+
+        if gauth.credentials is None:
+            if not interactive:
+                raise RuntimeError(
+                    f"No saved Drive credentials in {cls.CREDENTIALS_FILE}; "
+                    "run GoogleDriveService.authorize() once outside the worker"
+                )
+            gauth.LocalWebserverAuth()
+            gauth.SaveCredentialsFile(str(cls.CREDENTIALS_FILE))
+        return gauth
+
+    def ensure_authorized(self) -> None:
+        """Refreshes an expired token; cheap when the token is still valid"""
+        if self.gauth.access_token_expired:
+            self.gauth.Refresh()
+            self.gauth.SaveCredentialsFile(str(self.CREDENTIALS_FILE))
+        elif self.gauth.service is None:
+            self.gauth.Authorize()
+
     def _get_or_create_folder(self, folder_name: str, parent_id: str = None) -> str:
+        cached_id = self.folder_ids.get((folder_name, parent_id))
+        if cached_id:
+            return cached_id
+
         query = f"title='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
         if parent_id:
             query += f" and '{parent_id}' in parents"
@@ -49,6 +75,7 @@ class GoogleDriveService:
 
         if file_list:
             logger.info(f"📁 Folder found on Drive: {folder_name}")
+            self.folder_ids[(folder_name, parent_id)] = file_list[0]['id']
             return file_list[0]['id']
 
         folder_metadata = {'title': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
@@ -58,24 +85,11 @@ class GoogleDriveService:
         folder = self.drive.CreateFile(folder_metadata)
         folder.Upload()
         logger.info(f"Folder created on Drive: {folder_name}")
+        self.folder_ids[(folder_name, parent_id)] = folder['id']
         return folder['id']
 
-    def upload_files(self) -> List[str]:
-        """Finds 'done' folder for current project and uploads all files"""
-        local_folder_path = self.BASE_TEMP_DIR / self.project_name / "done"
-        if not local_folder_path.exists() or not local_folder_path.is_dir():
-            raise FileNotFoundError(f"Folder not found: {local_folder_path}")
-
-        uploaded_files = []
-        for file_path in local_folder_path.glob("*"):
-            if file_path.is_file():
-                gfile = self.drive.CreateFile({
-                    'title': file_path.name,
-                    'parents': [{'id': self.project_folder_id}]
-                })
-                gfile.SetContentFile(str(file_path))
-                gfile.Upload()
-                uploaded_files.append(file_path.name)
-                logger.info(f"Uploaded: {file_path.name}")
-
-        return uploaded_files
+    def refresh_folders(self) -> None:
+        """Forgets cached folder ids (e.g. a folder was deleted on Drive) and resolves them again"""
+        self.folder_ids.clear()
+        self.main_folder_id = self._get_or_create_folder(self.MAIN_FOLDER_NAME)
+        self.project_folder_id = self._get_or_create_folder(self.project_name, parent_id=self.main_folder_id)
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from loguru import logger
+
+
+@dataclass
+class MediaInfo:
+    path: Path
+    duration: float = 0.0  # seconds, 0 when unknown
+    format_name: str | None = None
+    streams: list[dict] = field(default_factory=list)
+
+    @property
+    def video(self) -> dict | None:
+        return next((s for s in self.streams if s.get("codec_type") == "video"), None)
+
+    @property
+    def audio(self) -> dict | None:
+        return next((s for s in self.streams if s.get("codec_type") == "audio"), None)
+
+    @property
+    def codec(self) -> str | None:
+        stream = self.video or self.audio
+        return stream.get("codec_name") if stream else None
+
+    @property
+    def resolution(self) -> tuple[int, int] | None:
+        video = self.video
+        return (video["width"], video["height"]) if video and "width" in video else None
+
+    @property
+    def fps(self) -> str | None:
+        video = self.video
+        return video.get("r_frame_rate") if video else None
+
+    @property
+    def sample_rate(self) -> int | None:
+        audio = self.audio
+        return int(audio["sample_rate"]) if audio and audio.get("sample_rate") else None
+
+
+class MediaMetadataIndex:
+    """
+    Process-wide index of media metadata. Every file is probed once with ffprobe
+    JSON output; entries are keyed by path, mtime and size, so a rewritten file
+    is probed again while unchanged ones are served from memory.
+    """
+    MAX_CONCURRENT = 8
+    MAX_ENTRIES = 10_000  # oldest entries are dropped first
+
+    _entries: dict[tuple[str, int, int], MediaInfo | None] = {}
+
+    def __init__(self, ffprobe_path: str):
+        self.ffprobe_path = ffprobe_path
+        self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+        self._inflight: dict[tuple[str, int, int], asyncio.Task] = {}
+
+    @staticmethod
+    def _key(path: Path) -> tuple[str, int, int] | None:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return str(path.resolve()), stat.st_mtime_ns, stat.st_size
+
+    async def _run_ffprobe(self, path: Path) -> MediaInfo | None:
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                self.ffprobe_path, "-v", "error",
+                "-show_format", "-show_streams",
+                "-of", "json",
+                str(path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await process.communicate()
+
+        if process.returncode != 0:
+            logger.warning(f"ffprobe could not read {path.name}")
+            return None
+        try:
+            data = json.loads(stdout)
+        except json.JSONDecodeError:
+            return None
+
+        fmt = data.get("format") or {}
+        try:
+            duration = float(fmt.get("duration") or 0.0)
+        except ValueError:
+            duration = 0.0
+        return MediaInfo(path=path, duration=duration, format_name=fmt.get("format_name"),
+                         streams=data.get("streams") or [])
+
+    async def probe(self, path: Path) -> MediaInfo | None:
+        """Metadata of one file; None if the file is missing or unreadable"""
+        key = self._key(path)
+        if key is None:
+            return None
+        if key in self._entries:
+            return self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._run_ffprobe(path))
+        try:
+            info = await task
+        finally:
+            self._inflight.pop(key, None)
+
+        self._entries[key] = info
+        while len(self._entries) > self.MAX_ENTRIES:
+            del self._entries[next(iter(self._entries))]
+        return info
+
+    async def probe_many(self, paths: Iterable[Path]) -> dict[Path, MediaInfo | None]:
+        """Probes files in parallel (each at most once)"""
+        paths = list(paths)
+        results = await asyncio.gather(*(self.probe(p) for p in paths))
+        return dict(zip(paths, results))
+
+    async def duration(self, path: Path) -> float:
+        info = await self.probe(path)
+        return info.duration if info else 0.0
@@ -1,29 +1,74 @@
 import asyncio
 import shutil
+import time
 from pathlib import Path
 from typing import Dict, Any, List
 
 from loguru import logger
 
+from core.configs import PIPELINE_QUEUE_SIZE, STORAGE_BACKEND, UPLOAD_QUEUE_SIZE
+from app.schemas.render_profiles import DEFAULT_RENDER_PROFILE, RENDER_PROFILES
 from app.schemas.urls_validator import ConfigModel
+from .download_cache import DownloadCacheService
 from .file_downloader import AsyncDownloaderService
 from .audio_overlay import AudioOverlayService
-from .google_driver_uploadaer import GoogleDriveService
+from .combination import CombinationService
+from .render_pool import RenderPoolService
+from .storage_backends import StorageBackend, UploadResult, create_storage_backend
 from .text_to_speach import TextToSpeechService
 from .video_combiner import VideoCombinerService
+from .worker_resources import WorkerResources
 
 
 class MediaProcessingService:
-    BASE_TEMP_DIR = Path(__file__).resolve().parent.parent / "temp_files"
+    BASE_TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_files"
 
-    def __init__(self, config: Dict[str, Any]):
+    # Layout of a fanned-out job's shared store
+    SHARED_CLIPS_DIR = "clips"  # normalized clips, clips/<block>/<name>
+    SHARED_MEDIA_DIR = "media"  # background audio and voices, as laid out in the task folder
+    SHARED_OUTPUTS_DIR = "outputs"  # finished videos a render task could not upload
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        resources: WorkerResources | None = None,
+        workspace: str | None = None,
+    ):
+        """
+        With `resources` (created on its loop) the worker's pooled clients are reused instead of built per task.
+        `workspace` names the local temp folder (default: the task name); results are still stored under the task name.
+        """
         self.config = ConfigModel.collect_links(config)
         self.task_name = self.config.get("task_name", "default_project")
+        self.workspace = workspace or self.task_name
 
-        self.tts_service = TextToSpeechService(task_name=self.task_name)
-        self.video_downloader = AsyncDownloaderService(task_name=self.task_name)
-        self.audio_downloader = AsyncDownloaderService(task_name=self.task_name)
-        self.gdrive_service = GoogleDriveService(project_name=self.task_name)
+        session = resources.http_session() if resources else None
+        self.tts_service = TextToSpeechService(
+            task_name=self.workspace,
+            client=resources.tts_client() if resources else None,
+            voice_catalog=resources.voice_catalog() if resources else None,
+            api=resources.tts_api() if resources else None,
+        )
+        self.download_cache = DownloadCacheService()
+        self.video_downloader = AsyncDownloaderService(
+            task_name=self.workspace, cache=self.download_cache, session=session
+        )
+        self.audio_downloader = AsyncDownloaderService(
+            task_name=self.workspace, cache=self.download_cache, session=session
+        )
+        # Drive reuses the worker's authorization and folder-id cache
+        drive = resources.drive(self.task_name) if resources and STORAGE_BACKEND == "drive" else None
+        self.storage = create_storage_backend(self.task_name, drive=drive)
+        self.uploads: List[UploadResult] = []
+        # One ffmpeg pool per task, so render and audio stages share the same core budget
+        self.render_pool = RenderPoolService()
+        self.render_profile = RENDER_PROFILES[self.config.get("render_profile") or DEFAULT_RENDER_PROFILE]
+        self.render_plan: Dict[str, Any] = {}
+        self.render_failures: List[Dict[str, Any]] = []
+        self.normalization: Dict[str, int] = {}
+        # Fan-out render tasks: the audio prepare_shared recoded and mixed (AudioOverlayService.export_prepared)
+        self.prepared_audio: Dict[str, Any] | None = None
+        self.timings: Dict[str, Any] = {}
 
     async def _download_videos(self) -> Dict[str, List[Path]]:
         videos = self.config.get("video_blocks", {})
@@ -49,62 +94,471 @@ class MediaProcessingService:
         logger.info(f"Generating voices for {len(voices)} blocks...")
         return await self.tts_service.generate_blocks(voices)
 
-    def _combine_videos(self) -> List[Path]:
+    async def _stream_videos(self, combiner: VideoCombinerService) -> tuple[Dict[str, List[Path]], Dict[str, List[Path]]]:
+        """Downloads videos and normalizes each one as soon as it lands; returns (downloaded, normalized)"""
+        videos = self.config.get("video_blocks", {})
+        if not videos:
+            print("No videos to download.")
+            return {}, {}
+        logger.info(f"Downloading and normalizing {sum(len(v) for v in videos.values())} video files...")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        async def produce() -> Dict[str, List[Path]]:
+            downloaded = await self.video_downloader.download_blocks(videos, files_type="video", queue=queue)
+            await queue.put(None)
+            return downloaded
+
+        producer = asyncio.create_task(produce())
+        consumer = asyncio.create_task(combiner.normalize_from_queue(queue))
+        try:
+            # Either side failing must not leave the other blocked on the queue
+            done, _ = await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            return producer.result(), consumer.result()
+        finally:
+            producer.cancel()
+            consumer.cancel()
+
+    async def _prepare_audio(self, fused: bool) -> tuple[Dict[str, List[Path]], Dict[str, List[str]], AudioOverlayService | None]:
+        """Background downloads and TTS, then (fused mode) the recoded audio ready for mixing"""
+        audios, voices = await asyncio.gather(self._download_audios(), self._generate_voices())
+        if not fused:
+            return audios, voices, None
+
+        audio_overlay = AudioOverlayService(task_name=self.workspace, render_pool=self.render_pool)
+        await audio_overlay.prepare_audio()
+        return audios, voices, audio_overlay
+
+    async def _combine_videos(
+        self,
+        combiner: VideoCombinerService,
+        audio_overlay: AudioOverlayService | None = None,
+        blocks: Dict[str, List[Path]] | None = None,
+        queue: asyncio.Queue | None = None,
+        indices: List[int] | None = None,
+    ) -> List[Path]:
         logger.info("Combining videos...")
 
         try:
-            combiner = VideoCombinerService(task_name=self.task_name)
-            combined_videos = combiner.generate_combinations()
+            combined_videos = await combiner.generate_combinations(
+                max_combinations=self.config.get("max_combinations"),
+                sample=self.config.get("sample", False),
+                seed=self.config.get("seed"),
+                offset=self.config.get("offset", 0),
+                audio=audio_overlay,
+                blocks=blocks,
+                queue=queue,
+                indices=indices,
+            )
+            self.render_plan = combiner.plan_summary
+            self.render_failures = combiner.render_failures
+            self.normalization = combiner.normalization_summary()
             return combined_videos
         except Exception as e:
             logger.error(f"Error combining videos: {e}")
             return []
 
-    def _overlay_audio(self):
-        logger.info("Applying audio overlay to combined videos...")
+    async def _overlay_audio(
+        self,
+        combiner: VideoCombinerService,
+        blocks: Dict[str, List[Path]] | None,
+        queue: asyncio.Queue,
+        indices: List[int] | None = None,
+    ) -> tuple[List[Path], List[Dict[str, Any]]]:
+        """
+        Two-pass mode: overlays audio on every combined video as soon as it is rendered and
+        deletes the raw file once overlaid; returns (combined, overlay statuses)
+        """
+        logger.info("Applying audio overlay to combined videos as they are rendered...")
+        audio_overlay_service = AudioOverlayService(
+            task_name=self.workspace, render_pool=self.render_pool, prepared=self.prepared_audio
+        )
+        # Bounded: when the overlay falls behind, rendering waits instead of filling the disk
+        raw_queue: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+
+        async def combine() -> List[Path]:
+            combined = await self._combine_videos(combiner, blocks=blocks, queue=raw_queue, indices=indices)
+            await raw_queue.put(None)
+            return combined
+
+        producer = asyncio.create_task(combine())
+        consumer = asyncio.create_task(audio_overlay_service.overlay_from_queue(
+            raw_queue, queue, bed_duration=lambda: combiner.max_output_duration
+        ))
+        try:
+            # Either side failing must not leave the other blocked on the queue
+            done, _ = await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            return producer.result(), consumer.result()
+        finally:
+            producer.cancel()
+            consumer.cancel()
+
+    async def _render_and_upload(
+        self,
+        combiner: VideoCombinerService,
+        audio_overlay: AudioOverlayService | None,
+        blocks: Dict[str, List[Path]] | None,
+        indices: List[int] | None = None,
+    ) -> tuple[List[Path], List[Dict[str, Any]], List[str]]:
+        """
+        Renders (and in two-pass mode overlays) while an upload stage sends every finished
+        video and deletes it once stored; returns (combined, overlay statuses, uploaded names)
+        """
+        # Bounded: when uploads fall behind, rendering waits instead of filling the disk
+        queue: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+        rendered_at: Dict[str, float] = {}
+
+        async def produce() -> tuple[List[Path], List[Dict[str, Any]]]:
+            overlay_statuses = []
+            # Fused outputs are final as rendered; two-pass ones only after the overlay
+            if audio_overlay:
+                combined = await self._combine_videos(combiner, audio_overlay, blocks, queue=queue, indices=indices)
+            else:
+                combined, overlay_statuses = await self._overlay_audio(combiner, blocks, queue, indices)
+            if not combined:
+                logger.warning("No combined videos available for audio overlay or upload.")
+            rendered_at["t"] = time.perf_counter()
+            await queue.put(None)
+            return combined, overlay_statuses
+
+        logger.info(f"Uploading finished videos to {self.storage.name} storage as they are rendered...")
+        producer = asyncio.create_task(produce())
+        consumer = asyncio.create_task(self.storage.upload_from_queue(queue, delete_uploaded=True))
+        try:
+            # Either side failing must not leave the other blocked on the queue
+            done, _ = await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            combined_videos, overlay_statuses = producer.result()
+            self.uploads = consumer.result()
+        finally:
+            producer.cancel()
+            consumer.cancel()
+
+        self.timings["upload_after_render_seconds"] = round(time.perf_counter() - rendered_at["t"], 2)
+        uploaded = [r.remote for r in self.uploads if r.status != "failed"]
+        logger.info(f"Uploaded {len(uploaded)}/{len(self.uploads)} files to {self.storage.name} storage.")
+        return combined_videos, overlay_statuses, uploaded
+
+    def _upload_summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"backend": self.storage.name}
+        for result in self.uploads:
+            summary[result.status] = summary.get(result.status, 0) + 1
+        summary["bytes"] = sum(r.size for r in self.uploads if r.status == "uploaded")
+        summary["failures"] = [{"file": r.remote, "error": r.error} for r in self.uploads if r.status == "failed"]
+        return summary
+
+    @staticmethod
+    def _merge_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Adds up the counters (and joins the lists) of per-chunk summaries"""
+        merged: Dict[str, Any] = {}
+        for summary in summaries:
+            for key, value in summary.items():
+                if isinstance(value, (int, float, list)) and not isinstance(value, bool):
+                    merged[key] = merged.get(key, [] if isinstance(value, list) else 0) + value
+                else:
+                    merged.setdefault(key, value)
+        return {k: round(v, 2) if isinstance(v, float) else v for k, v in merged.items()}
+
+    async def _publish(self, store: StorageBackend, files: Dict[str, Path]) -> None:
+        """Uploads {remote name: local file} to a job's shared store; all of them must arrive"""
+        results = await asyncio.gather(*(store.upload(path, remote) for remote, path in files.items()))
+        failed = [r.remote for r in results if r.status == "failed"]
+        if failed:
+            raise RuntimeError(f"{len(failed)} files could not be published to the shared store: {failed[:5]}")
+
+    async def prepare_shared(self, store: StorageBackend) -> Dict[str, Any]:
+        """
+        Fan-out stage 1: downloads and normalizes the clips, fetches audio and voices, recodes
+        them and mixes the audio bed of every pair once for the whole job, and publishes it all
+        to `store`. Returns the manifest render tasks work from: clip names per block, media
+        files, the prepared audio, and the combination indices selected by the config.
+        """
+        started = time.perf_counter()
+        try:
+            combiner = VideoCombinerService(
+                task_name=self.workspace, render_pool=self.render_pool, profile=self.render_profile
+            )
+            audio_task = asyncio.create_task(self._prepare_audio(fused=True))
+            try:
+                videos, blocks = await self._stream_videos(combiner)
+                audios, voices, audio_overlay = await audio_task
+            finally:
+                audio_task.cancel()
+            if not blocks:
+                raise ValueError("No videos to render")
+            self.normalization = combiner.normalization_summary()
+
+            # Beds as long as the longest combination, so every render task cuts the same ones
+            durations = {
+                clip: info.duration if info else 0.0
+                for clip, info in (await combiner.media_index.probe_many([clip for clips in blocks.values() for clip in clips])).items()
+            }
+            await audio_overlay.prepare_beds(
+                sum(max((durations[clip] for clip in clips), default=0.0) for clips in blocks.values())
+            )
+
+            files = {
+                f"{self.SHARED_CLIPS_DIR}/{block}/{clip.name}": clip
+                for block, clips in blocks.items() for clip in clips
+            }
+            task_dir = AudioOverlayService.BASE_TEMP_DIR / self.workspace
+            media = {
+                f"{self.SHARED_MEDIA_DIR}/{path.relative_to(task_dir).as_posix()}": path
+                for path in sorted(audio_overlay.prepared_files())
+            }
+            await self._publish(store, {**files, **media})
+
+            total = CombinationService.count_combinations(list(blocks.values()))
+            indices = list(CombinationService.iter_indices(
+                total,
+                max_combinations=self.config.get("max_combinations"),
+                sample=self.config.get("sample", False),
+                seed=self.config.get("seed"),
+                offset=self.config.get("offset", 0),
+            ))
+            logger.info(f"Published {len(files)} clips and {len(media)} prepared audio files; "
+                        f"{len(indices)}/{total} combinations to render")
+            return {
+                # Wall clock, so finalize_job on another machine can report the end-to-end time
+                "started_at": time.time() - (time.perf_counter() - started),
+                "blocks": {block: [clip.name for clip in clips] for block, clips in blocks.items()},
+                "media": sorted(media),
+                "audio": audio_overlay.export_prepared(),
+                "total": total,
+                "indices": indices,
+                "prepare": {
+                    "videos": sum(len(v) for v in videos.values()),
+                    "audios": sum(len(a) for a in audios.values()),
+                    "voices": sum(len(v) for v in voices.values()),
+                    "download_cache": self.download_cache.stats(),
+                    "tts": self.tts_service.summary(),
+                    "normalization": self.normalization,
+                    "seconds": round(time.perf_counter() - started, 2),
+                },
+            }
+        finally:
+            self._cleanup_temp_files()
+
+    async def render_shared(self, store: StorageBackend, manifest: Dict[str, Any], indices: List[int]) -> Dict[str, Any]:
+        """
+        Fan-out stage 2: renders the combinations at `indices` from the clips and media in
+        `store`, uploading every output as it finishes. Outputs whose upload failed are
+        left in the store for the finalizing task.
+        """
+        started = time.perf_counter()
+        try:
+            fused = self.config.get("render_mode", "fused") == "fused"
+            combiner = VideoCombinerService(
+                task_name=self.workspace, render_pool=self.render_pool, profile=self.render_profile
+            )
+            blocks = {
+                block: [combiner.normalized_dir / block / name for name in names]
+                for block, names in manifest["blocks"].items()
+            }
+            # Only the clips this chunk's combinations use
+            block_lists = list(blocks.values())
+            needed = {clip for idx in indices for clip in CombinationService.combination_at(block_lists, idx)}
+            task_dir = AudioOverlayService.BASE_TEMP_DIR / self.workspace
+            media_prefix = f"{self.SHARED_MEDIA_DIR}/"
+            await asyncio.gather(
+                *(store.download(f"{self.SHARED_CLIPS_DIR}/{clip.parent.name}/{clip.name}", clip) for clip in needed),
+                *(store.download(remote, task_dir / remote[len(media_prefix):]) for remote in manifest["media"]),
+            )
 
-        audio_overlay_service = AudioOverlayService(task_name=self.task_name)
-        audio_overlay_service.overlay_audio()
+            # Recoded and mixed once by prepare_shared; nothing is recoded again here
+            self.prepared_audio = manifest["audio"]
+            audio_overlay = AudioOverlayService(
+                task_name=self.workspace, render_pool=self.render_pool, prepared=self.prepared_audio
+            ) if fused else None
+            ready = time.perf_counter()
+            combined_videos, overlay_statuses, uploaded_files = await self._render_and_upload(
+                combiner, audio_overlay, blocks, indices=indices
+            )
+            self.timings = {
+                "ready_to_render_seconds": round(ready - started, 2),
+                "render_and_upload_seconds": round(time.perf_counter() - ready, 2),
+                **self.timings,
+            }
 
-    def _upload_to_drive(self) -> List[str]:
-        logger.info("Uploading combined videos to Google Drive...")
+            stashed = []
+            for result in self.uploads:
+                if result.status == "failed" and result.path.exists():
+                    await self._publish(store, {f"{self.SHARED_OUTPUTS_DIR}/{result.remote}": result.path})
+                    stashed.append(result.remote)
 
-        uploaded_files = self.gdrive_service.upload_files()
-        logger.info(f"Uploaded {len(uploaded_files)} files to Google Drive.")
-        return uploaded_files
+            return {
+                "combinations": len(indices),
+                "rendered": len(combined_videos),
+                "uploaded_files": uploaded_files,
+                "stashed": stashed,
+                "overlay": overlay_statuses,
+                "render_plan": self.render_plan,
+                "render_failures": self.render_failures,
+                "upload": self._upload_summary(),
+                "timings": self.timings,
+                "seconds": round(time.perf_counter() - started, 2),
+            }
+        finally:
+            self._cleanup_temp_files()
+
+    @staticmethod
+    def failed_render_summary(indices: List[int], error: str, seconds: float) -> Dict[str, Any]:
+        """render_shared's result for a render task that failed as a whole, so the chord still completes"""
+        return {
+            "combinations": len(indices),
+            "rendered": 0,
+            "uploaded_files": [],
+            "stashed": [],
+            "overlay": [],
+            "render_plan": {},
+            "render_failures": [
+                {"video": f"{len(indices)} combinations from #{indices[0]}", "status": "failed", "error": error}
+            ] if indices else [],
+            "upload": {},
+            "timings": {},
+            "seconds": round(seconds, 2),
+            "error": error,
+        }
+
+    async def finalize_shared(
+        self, store: StorageBackend, manifest: Dict[str, Any], chunk_results: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Fan-out stage 3 (chord callback): uploads the outputs render tasks could not,
+        removes the job's shared store and sums the chunk results up, with the same
+        summary keys as process_all
+        """
+        try:
+            stashed = [name for chunk in chunk_results for name in chunk["stashed"]]
+            done_dir = AudioOverlayService.BASE_TEMP_DIR / self.workspace / "done"
+            paths = await asyncio.gather(
+                *(store.download(f"{self.SHARED_OUTPUTS_DIR}/{name}", done_dir / name) for name in stashed)
+            )
+            self.uploads = await self.storage.upload_files(paths)
+            failed = [r.remote for r in self.uploads if r.status == "failed"]
+            if failed:
+                logger.warning(f"{len(failed)} videos are still not uploaded; keeping the shared store for SHARED_STORE_TTL_HOURS")
+            else:
+                await store.clear()
+
+            uploaded_files = [name for chunk in chunk_results for name in chunk["uploaded_files"]]
+            uploaded_files += [r.remote for r in self.uploads if r.status != "failed"]
+            prepare = manifest.get("prepare", {})
+            overlay = [st for chunk in chunk_results for st in chunk["overlay"]]
+            chunk_timings = [chunk["timings"] for chunk in chunk_results if chunk["timings"]]
+            end_to_end = time.time() - manifest["started_at"]
+            ready_to_render = prepare.get("seconds", 0.0)
+            self.timings = {
+                "mode": "fan_out",
+                "ready_to_render_seconds": ready_to_render,
+                # from the end of preparation until the last render task reported, queueing included
+                "render_and_upload_seconds": round(end_to_end - ready_to_render, 2),
+                "upload_after_render_seconds": max(
+                    (t.get("upload_after_render_seconds", 0.0) for t in chunk_timings), default=0.0
+                ),
+                "render_task_seconds": [chunk["seconds"] for chunk in chunk_results],
+                "end_to_end_seconds": round(end_to_end, 2),
+            }
+            logger.info(f"Timings: {self.timings}")
+
+            return {
+                "task_name": self.task_name,
+                "videos": prepare.get("videos", 0),
+                "audios": prepare.get("audios", 0),
+                "voices": prepare.get("voices", 0),
+                "combinations": sum(chunk["combinations"] for chunk in chunk_results),
+                "rendered": sum(chunk["rendered"] for chunk in chunk_results),
+                "render_tasks": len(chunk_results),
+                "failed_render_tasks": [chunk["error"] for chunk in chunk_results if chunk.get("error")],
+                "download_cache": prepare.get("download_cache", {}),
+                "tts": prepare.get("tts", {}),
+                "render_profile": self.render_profile.name,
+                "render_plan": self._merge_summaries([chunk["render_plan"] for chunk in chunk_results]),
+                "render_failures": [st for chunk in chunk_results for st in chunk["render_failures"]],
+                "normalization": prepare.get("normalization", {}),
+                "timings": self.timings,
+                "overlay": overlay,
+                "overlay_failures": [st for st in overlay if st["status"] != "done"],
+                "uploaded_files": uploaded_files,
+                "upload": self._merge_summaries([chunk["upload"] for chunk in chunk_results]),
+                "upload_retries": self._upload_summary(),
+                "failed_uploads": failed,
+            }
+        finally:
+            self._cleanup_temp_files()
 
     def _cleanup_temp_files(self):
-        temp_project_dir = self.BASE_TEMP_DIR / self.task_name
+        temp_project_dir = self.BASE_TEMP_DIR / self.workspace
         if temp_project_dir.exists() and temp_project_dir.is_dir():
             shutil.rmtree(temp_project_dir)
-            logger.warning(f"Temporary files for project '{self.task_name}' have been removed.")
+            logger.warning(f"Temporary files '{self.workspace}' of project '{self.task_name}' have been removed.")
 
     async def process_all(self) -> Dict[str, Any]:
         logger.info("Starting media processing...")
+        started = time.perf_counter()
 
         try:
-            videos_task = asyncio.create_task(self._download_videos())
-            audios_task = asyncio.create_task(self._download_audios())
-            voices_task = asyncio.create_task(self._generate_voices())
+            # Fused mode mixes audio while rendering and writes straight to done/
+            fused = self.config.get("render_mode", "fused") == "fused"
+            pipelined = self.config.get("pipeline", True)
+            combiner = VideoCombinerService(
+                task_name=self.workspace, render_pool=self.render_pool, profile=self.render_profile
+            )
 
-            videos, audios, voices = await asyncio.gather(videos_task, audios_task, voices_task)
+            if pipelined:
+                # Clips are normalized while the rest still download; audio is prepared alongside
+                audio_task = asyncio.create_task(self._prepare_audio(fused))
+                try:
+                    videos, blocks = await self._stream_videos(combiner)
+                    audios, voices, audio_overlay = await audio_task
+                finally:
+                    audio_task.cancel()
+            else:
+                # Barrier: every download and TTS call finishes before any ffmpeg work starts
+                videos, (audios, voices, _) = await asyncio.gather(
+                    self._download_videos(), self._prepare_audio(fused=False)
+                )
+                audio_overlay = AudioOverlayService(task_name=self.workspace, render_pool=self.render_pool) if fused else None
+                blocks = None
             logger.success("All media downloaded/generated successfully.")
+            ready = time.perf_counter()
 
-            combined_videos = self._combine_videos()
+            combined_videos, overlay_statuses, uploaded_files = await self._render_and_upload(
+                combiner, audio_overlay, blocks
+            )
+            finished = time.perf_counter()
 
-            uploaded_files = []
-            if combined_videos:
-                self._overlay_audio()
-                uploaded_files = self._upload_to_drive()
-            else:
-                logger.warning("No combined videos available for audio overlay or upload.")
+            self.timings = {
+                "mode": "pipelined" if pipelined else "barrier",
+                # pipelined: downloads plus the normalization that did not overlap them
+                "ready_to_render_seconds": round(ready - started, 2),
+                # rendering with uploads running alongside, plus the uploads still pending after it
+                "render_and_upload_seconds": round(finished - ready, 2),
+                **self.timings,
+                "end_to_end_seconds": round(finished - started, 2),
+            }
+            logger.info(f"Timings: {self.timings}")
 
             return {
                 "videos": videos,
                 "audios": audios,
                 "voices": voices,
                 "combined_videos": combined_videos,
-                "uploaded_files": uploaded_files
+                "download_cache": self.download_cache.stats(),
+                "tts": self.tts_service.summary(),
+                "render_profile": self.render_profile.name,
+                "render_plan": self.render_plan,
+                "render_failures": self.render_failures,
+                "normalization": self.normalization,
+                "timings": self.timings,
+                "overlay": overlay_statuses,
+                "uploaded_files": uploaded_files,
+                "upload": self._upload_summary(),
             }
 
         finally:
@@ -0,0 +1,125 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+@dataclass
+class RenderStep:
+    clips: tuple[Path, ...]  # source clips covered by this step, in order
+    inputs: tuple[Path, ...]  # files fed to the concat demuxer
+    out_path: Path
+    parent: Path | None = None  # intermediate this step reads, if any
+
+
+@dataclass
+class RenderPlan:
+    prefix_steps: list[RenderStep] = field(default_factory=list)  # parents always come first
+    # Depth-first trie order; a lazy iterator without shared prefixes
+    output_steps: Iterable[RenderStep] = field(default_factory=list)
+    outputs: int = 0
+    output_bytes: int = 0  # stream-copied into the outputs
+    prefix_bytes: int = 0  # extra copy pass into shared prefix files
+
+    def summary(self) -> dict:
+        """Counts; for a lazy plan they cover the output steps consumed so far"""
+        return {
+            "outputs": self.outputs,
+            "shared_prefixes": len(self.prefix_steps),
+            "output_bytes": self.output_bytes,
+            "prefix_bytes": self.prefix_bytes,
+            "copied_bytes": self.output_bytes + self.prefix_bytes,
+        }
+
+
+class _TrieNode:
+    __slots__ = ("children", "leaves")
+
+    def __init__(self):
+        self.children: dict[Path, _TrieNode] = {}
+        self.leaves = 0
+
+
+class RenderPlannerService:
+    """
+    Plans combination rendering over a prefix trie, in an order where outputs sharing
+    clips render next to each other. With `share_prefixes` every prefix shared by two
+    or more outputs is concatenated once and reused by its descendants. That only pays
+    off when joining re-encodes: with a stream-copy concat it copies those bytes twice.
+    """
+
+    def __init__(self, prefix_dir: Path, sizes: dict[Path, int], share_prefixes: bool = False):
+        self.prefix_dir = prefix_dir
+        self.sizes = sizes
+        self.share_prefixes = share_prefixes
+
+    def _bytes(self, clips: Iterable[Path]) -> int:
+        return sum(self.sizes.get(clip, 0) for clip in clips)
+
+    @staticmethod
+    def _name(clips: Iterable[Path]) -> str:
+        return "_".join(clip.stem for clip in clips)
+
+    def plan(self, combinations: Iterable[tuple[Path, ...]], output_dir: Path) -> RenderPlan:
+        """
+        Without shared prefixes the steps are produced lazily from `combinations`, so an
+        uncapped job never holds the whole product in memory. `combinations` must then
+        come in product order (as CombinationService yields them), which already is trie order.
+        """
+        plan = RenderPlan()
+        if not self.share_prefixes:
+            plan.output_steps = self._direct_steps(combinations, output_dir, plan)
+            return plan
+
+        root = _TrieNode()
+        for combination in combinations:
+            node = root
+            node.leaves += 1
+            for clip in combination:
+                node = node.children.setdefault(clip, _TrieNode())
+                node.leaves += 1
+
+        self._walk(root, (), None, output_dir, plan)
+        return plan
+
+    def _direct_steps(
+        self, combinations: Iterable[tuple[Path, ...]], output_dir: Path, plan: RenderPlan
+    ) -> Iterator[RenderStep]:
+        for combination in combinations:
+            clips = tuple(combination)
+            plan.outputs += 1
+            plan.output_bytes += self._bytes(clips)
+            yield RenderStep(clips, clips, output_dir / f"{self._name(clips)}.mp4")
+
+    def _walk(
+        self,
+        node: _TrieNode,
+        clips: tuple[Path, ...],
+        parent: tuple[Path, tuple[Path, ...]] | None,
+        output_dir: Path,
+        plan: RenderPlan,
+    ) -> None:
+        """Depth-first walk; `parent` is the closest materialized ancestor and the clips it covers"""
+        for clip, child in node.children.items():
+            child_clips = (*clips, clip)
+            if parent:
+                parent_path, parent_clips = parent
+                inputs = (parent_path, *child_clips[len(parent_clips):])
+            else:
+                parent_path, inputs = None, child_clips
+
+            if not child.children:
+                out_path = output_dir / f"{self._name(child_clips)}.mp4"
+                plan.output_steps.append(RenderStep(child_clips, inputs, out_path, parent_path))
+                plan.outputs += 1
+                plan.output_bytes += self._bytes(child_clips)
+                continue
+
+            child_parent = parent
+            # Single-clip prefixes are already files; one-leaf prefixes have nothing to share
+            if self.share_prefixes and len(child_clips) > 1 and child.leaves > 1:
+                out_path = self.prefix_dir / f"{self._name(child_clips)}.mp4"
+                plan.prefix_steps.append(RenderStep(child_clips, inputs, out_path, parent_path))
+                plan.prefix_bytes += self._bytes(child_clips)
+                child_parent = (out_path, child_clips)
+
+            self._walk(child, child_clips, child_parent, output_dir, plan)
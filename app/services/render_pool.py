@@ -0,0 +1,94 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable
+
+from loguru import logger
+
+from core.configs import FFMPEG_HOST_SLOTS, FFMPEG_SLOTS_DIR, RENDER_CONCURRENCY, RENDER_CPU_BUDGET, RENDER_THREADS
+from .ffmpeg_runner import FFmpegProgress, FFmpegRunner
+from .file_lock import FileLock
+
+
+class HostSlots:
+    """
+    At most `slots` ffmpeg jobs at once on the host, over every pool process and task:
+    each job holds one of `slots` lock files for as long as it runs
+    """
+    POLL_INTERVAL = 0.1  # seconds between attempts while every slot is taken
+
+    def __init__(self, slots: int, lock_dir: Path = FFMPEG_SLOTS_DIR):
+        self.locks = [lock_dir / f"slot-{i}.lock" for i in range(slots)]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        while True:
+            for path in self.locks:
+                lock = FileLock(path)
+                if lock.try_acquire():
+                    try:
+                        yield
+                    finally:
+                        lock.release()
+                    return
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+
+class RenderPoolService:
+    """Runs several ffmpeg processes at once without oversubscribing the CPU"""
+
+    def __init__(
+        self,
+        concurrency: int | None = RENDER_CONCURRENCY,
+        threads_per_job: int | None = RENDER_THREADS,
+        cpu_budget: int | None = RENDER_CPU_BUDGET,
+        runner: FFmpegRunner | None = None,
+        host_slots: int | None = FFMPEG_HOST_SLOTS,
+    ):
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+
+        if concurrency and threads_per_job:
+            self.concurrency = concurrency
+            self.threads_per_job = threads_per_job
+        elif concurrency:
+            self.concurrency = concurrency
+            self.threads_per_job = max(1, self.cpu_budget // concurrency)
+        elif threads_per_job:
+            self.threads_per_job = threads_per_job
+            self.concurrency = max(1, self.cpu_budget // threads_per_job)
+        else:
+            # Small encodes scale poorly past a couple of threads, so prefer more jobs
+            self.threads_per_job = min(2, self.cpu_budget)
+            self.concurrency = max(1, self.cpu_budget // self.threads_per_job)
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.runner = runner or FFmpegRunner()
+        # The budget above is per pool; this caps the sum over all pools of the worker
+        self.host_slots = HostSlots(host_slots) if host_slots else None
+        logger.debug(
+            f"Render pool: {self.concurrency} jobs x {self.threads_per_job} threads "
+            f"(budget {self.cpu_budget} cores, host slots {host_slots or 'unlimited'})"
+        )
+
+    def thread_args(self) -> list[str]:
+        """ffmpeg arguments limiting one job to its share of the core budget"""
+        return ["-threads", str(self.threads_per_job)]
+
+    async def run(
+        self,
+        cmd: list[str],
+        timeout: float | None = None,
+        on_progress: Callable[[FFmpegProgress], None] | None = None,
+    ) -> None:
+        """Runs one ffmpeg command once a pool slot is free"""
+        async with self.semaphore:
+            if not self.host_slots:
+                await self.runner.run(cmd, timeout=timeout, on_progress=on_progress)
+                return
+            async with self.host_slots.slot():
+                await self.runner.run(cmd, timeout=timeout, on_progress=on_progress)
+
+    async def run_all(self, commands: Iterable[list[str]]) -> None:
+        """Runs all commands, at most `concurrency` of them at the same time"""
+        await asyncio.gather(*(self.run(cmd) for cmd in commands))
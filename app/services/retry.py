@@ -0,0 +1,26 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+async def with_retries(
+    label: str,
+    attempt_fn: Callable[[], Awaitable[T]],
+    max_retries: int,
+    is_retryable: Callable[[Exception], bool],
+    backoff_base: float,
+) -> T:
+    """Awaits attempt_fn() until it succeeds, retrying retryable errors with jittered exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return await attempt_fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = backoff_base * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"{label}: {e!r}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,489 @@
+import asyncio
+import base64
+import hashlib
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from loguru import logger
+
+from core.configs import (
+    LOCAL_STORAGE_DIR,
+    S3_ACCESS_KEY_ID,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_PREFIX,
+    S3_REGION,
+    S3_SECRET_ACCESS_KEY,
+    SHARED_STORE_BACKEND,
+    SHARED_STORE_DIR,
+    SHARED_STORE_TTL_HOURS,
+    STORAGE_BACKEND,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_CONCURRENCY,
+    UPLOAD_MAX_RETRIES,
+)
+from .disk_cache import DiskCacheService
+from .google_driver_uploadaer import GoogleDriveService
+from .retry import with_retries
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # optional: only STORAGE_BACKEND=s3 needs it
+    boto3 = None
+
+
+@dataclass
+class UploadResult:
+    path: Path
+    remote: str
+    size: int
+    status: str  # "uploaded", "skipped" (already there, same checksum) or "failed"
+    error: str | None = None
+    seconds: float = 0.0
+
+
+class ChecksumError(RuntimeError):
+    pass
+
+
+def _md5_digest(path: Path, chunk_size: int = 1024 * 1024) -> bytes:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _b64(digest: bytes) -> str:
+    return base64.b64encode(digest).decode()
+
+
+class StorageBackend(ABC):
+    """
+    Destination for finished videos. Subclasses implement one blocking, resumable,
+    checksum-verified upload; the base class runs up to `concurrency` of them in
+    threads and retries failures with jittered exponential backoff.
+    """
+    name = ""
+    BACKOFF_BASE = 1.0  # seconds, doubled per attempt
+
+    def __init__(
+        self,
+        concurrency: int = UPLOAD_CONCURRENCY,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        max_retries: int = UPLOAD_MAX_RETRIES,
+    ):
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+
+    @abstractmethod
+    def _upload_sync(self, path: Path, remote_name: str) -> str:
+        """Uploads one file, resuming earlier partial progress; returns "uploaded" or "skipped" """
+
+    @abstractmethod
+    def _download_sync(self, remote_name: str, dest: Path) -> None:
+        """Copies a stored file to `dest`, replacing it only once complete"""
+
+    @abstractmethod
+    def _clear_sync(self) -> None:
+        """Deletes everything under this backend's folder or prefix"""
+
+    def _last_modified_sync(self) -> dict[str, float]:
+        """Newest modification time (epoch seconds) under each top-level folder of this backend"""
+        raise NotImplementedError(f"{self.name} storage cannot list its folders")
+
+    def _is_retryable(self, error: Exception) -> bool:
+        return not isinstance(error, (FileNotFoundError, PermissionError))
+
+    async def _with_retries(self, label: str, fn, *args):
+        """fn(*args) in a thread, retried with backoff; raises on the final failure"""
+        return await with_retries(
+            label, lambda: asyncio.to_thread(fn, *args), self.max_retries, self._is_retryable, self.BACKOFF_BASE
+        )
+
+    async def download(self, remote_name: str, dest: Path) -> Path:
+        """Copies a stored file to `dest`, retried like uploads; raises on the final failure"""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        async with self.semaphore:
+            await self._with_retries(f"Download {remote_name}", self._download_sync, remote_name, dest)
+        return dest
+
+    async def clear(self) -> None:
+        """Deletes everything stored under this backend's folder or prefix"""
+        await asyncio.to_thread(self._clear_sync)
+
+    async def upload(self, path: Path, remote_name: str | None = None) -> UploadResult:
+        remote_name = remote_name or path.name
+        size = path.stat().st_size
+        async with self.semaphore:
+            started = asyncio.get_running_loop().time()
+            try:
+                status = await self._with_retries(f"Upload {path.name}", self._upload_sync, path, remote_name)
+            except Exception as e:
+                logger.error(f"❌ Upload of {path.name} to {self.name} failed: {e}")
+                return UploadResult(path, remote_name, size, "failed", error=str(e))
+            seconds = round(asyncio.get_running_loop().time() - started, 2)
+        logger.info(f"{'Uploaded' if status == 'uploaded' else 'Already uploaded'}: {path.name} -> {self.name}")
+        return UploadResult(path, remote_name, size, status, seconds=seconds)
+
+    async def upload_files(self, paths: Iterable[Path]) -> list[UploadResult]:
+        """Uploads all files, `concurrency` at a time"""
+        return list(await asyncio.gather(*(self.upload(path) for path in paths)))
+
+    async def upload_from_queue(self, queue: asyncio.Queue, delete_uploaded: bool = False) -> list[UploadResult]:
+        """
+        Uploads paths from `queue` as they arrive, `concurrency` at a time, until a None
+        sentinel. With `delete_uploaded` a local file is removed once its upload is confirmed.
+        """
+        results: list[UploadResult] = []
+
+        async def worker():
+            while (path := await queue.get()) is not None:
+                try:
+                    result = await self.upload(path)
+                except OSError as e:
+                    result = UploadResult(path, path.name, 0, "failed", error=str(e))
+                results.append(result)
+                if delete_uploaded and result.status != "failed":
+                    path.unlink(missing_ok=True)
+            # Let the other workers see the sentinel too
+            await queue.put(None)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return results
+
+
+class LocalStorageBackend(StorageBackend):
+    """A directory (local disk or a mounted share); also the on-box stand-in for tests"""
+    name = "local"
+
+    def __init__(self, root: Path = LOCAL_STORAGE_DIR, prefix: str = "", **kwargs):
+        super().__init__(**kwargs)
+        self.root = root / prefix if prefix else root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _upload_sync(self, path: Path, remote_name: str) -> str:
+        dest = self.root / remote_name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        size = path.stat().st_size
+        digest = DiskCacheService.file_digest(path)
+        if dest.exists() and dest.stat().st_size == size and DiskCacheService.file_digest(dest) == digest:
+            return "skipped"
+
+        # Continue an interrupted copy; the checksum below catches a .part of a different file
+        part_path = dest.with_name(f"{dest.name}.part")
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if offset > size:
+            offset = 0
+        with open(path, "rb") as src, open(part_path, "ab" if offset else "wb") as out:
+            src.seek(offset)
+            while chunk := src.read(self.chunk_size):
+                out.write(chunk)
+
+        if DiskCacheService.file_digest(part_path) != digest:
+            part_path.unlink(missing_ok=True)
+            raise ChecksumError(f"Checksum mismatch for {remote_name}")
+        os.replace(part_path, dest)
+        return "uploaded"
+
+    def _download_sync(self, remote_name: str, dest: Path) -> None:
+        part_path = dest.with_name(f"{dest.name}.part")
+        shutil.copyfile(self.root / remote_name, part_path)
+        os.replace(part_path, dest)
+
+    def _clear_sync(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _last_modified_sync(self) -> dict[str, float]:
+        newest: dict[str, float] = {}
+        for path in self.root.rglob("*"):
+            try:
+                modified = path.stat().st_mtime
+            except FileNotFoundError:  # cleared meanwhile
+                continue
+            folder = path.relative_to(self.root).parts[0]
+            newest[folder] = max(newest.get(folder, 0.0), modified)
+        return newest
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3-compatible object storage (AWS S3, MinIO, GCS through its XML API with HMAC keys).
+    Large files use multipart uploads: an unfinished upload of the same key is found
+    again and only its missing parts are sent. Every request carries Content-MD5, so
+    the store verifies each part and single-request object itself.
+    """
+    name = "s3"
+    MIN_PART_SIZE = 5 * 1024 ** 2  # S3 minimum for all but the last part
+
+    def __init__(
+        self,
+        bucket: str | None = S3_BUCKET,
+        prefix: str = S3_PREFIX,
+        endpoint_url: str | None = S3_ENDPOINT_URL,
+        region: str | None = S3_REGION,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        if not bucket:
+            raise ValueError("S3_BUCKET is not set")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = max(self.chunk_size, self.MIN_PART_SIZE)
+        # boto3 clients are thread-safe; keep a connection per concurrent upload
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=S3_ACCESS_KEY_ID,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+            config=BotoConfig(max_pool_connections=max(10, self.concurrency * 2)),
+        )
+
+    def _key(self, remote_name: str) -> str:
+        return f"{self.prefix}/{remote_name}" if self.prefix else remote_name
+
+    def _head(self, key: str) -> dict | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _part_digests(self, path: Path, size: int) -> list[bytes]:
+        digests = []
+        with open(path, "rb") as f:
+            for offset in range(0, size, self.part_size):
+                f.seek(offset)
+                digests.append(hashlib.md5(f.read(self.part_size)).digest())
+        return digests
+
+    def _upload_sync(self, path: Path, remote_name: str) -> str:
+        key = self._key(remote_name)
+        size = path.stat().st_size
+        remote = self._head(key)
+
+        if size <= self.part_size:
+            digest = _md5_digest(path)
+            if remote and remote["ETag"].strip('"') == digest.hex():
+                return "skipped"
+            with open(path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f, ContentMD5=_b64(digest))
+            return "uploaded"
+
+        digests = self._part_digests(path, size)
+        # S3 multipart ETag: md5 of the concatenated part md5s, plus the part count
+        expected_etag = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+        if remote and remote["ETag"].strip('"') == expected_etag:
+            return "skipped"
+
+        self._upload_multipart(path, key, digests)
+        remote = self._head(key)
+        if not remote or remote["ContentLength"] != size:
+            raise ChecksumError(f"{key}: stored {remote and remote['ContentLength']} bytes, expected {size}")
+        return "uploaded"
+
+    def _pending_upload(self, key: str) -> tuple[str | None, dict[int, str]]:
+        """Newest unfinished multipart upload of `key` and its stored part ETags"""
+        uploads = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=key).get("Uploads", [])
+        uploads = [u for u in uploads if u["Key"] == key]
+        if not uploads:
+            return None, {}
+
+        upload_id = max(uploads, key=lambda u: u["Initiated"])["UploadId"]
+        parts = {}
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"].strip('"')
+        return upload_id, parts
+
+    def _upload_multipart(self, path: Path, key: str, digests: list[bytes]) -> None:
+        upload_id, stored = self._pending_upload(key)
+        if upload_id:
+            logger.info(f"Resuming multipart upload of {key}: {len(stored)} parts already stored")
+        else:
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+
+        completed = []
+        with open(path, "rb") as f:
+            for number, digest in enumerate(digests, start=1):
+                if stored.get(number) != digest.hex():
+                    f.seek((number - 1) * self.part_size)
+                    self.client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                        Body=f.read(self.part_size), ContentMD5=_b64(digest),
+                    )
+                completed.append({"PartNumber": number, "ETag": f'"{digest.hex()}"'})
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": completed}
+        )
+
+    def _download_sync(self, remote_name: str, dest: Path) -> None:
+        part_path = dest.with_name(f"{dest.name}.part")
+        self.client.download_file(self.bucket, self._key(remote_name), str(part_path))
+        os.replace(part_path, dest)
+
+    def _clear_sync(self) -> None:
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+        for upload in self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=prefix).get("Uploads", []):
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+
+    def _last_modified_sync(self) -> dict[str, float]:
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        newest: dict[str, float] = {}
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                folder = obj["Key"][len(prefix):].split("/", 1)[0]
+                newest[folder] = max(newest.get(folder, 0.0), obj["LastModified"].timestamp())
+        return newest
+
+
+class DriveStorageBackend(StorageBackend):
+    """
+    Google Drive through the Drive API's resumable protocol, in UPLOAD_CHUNK_SIZE chunks.
+    An interrupted chunk is resumed from the last byte Drive acknowledged, and the file's
+    md5Checksum reported by Drive is compared with the local one. Files are looked up by
+    title in the project folder for download; clear() moves them to Drive's bin.
+    """
+    name = "drive"
+
+    def __init__(self, drive: GoogleDriveService, **kwargs):
+        super().__init__(**kwargs)
+        self.drive = drive
+        # Drive requires chunks in multiples of 256 KiB
+        self.chunk_size = max(256 * 1024, self.chunk_size // (256 * 1024) * (256 * 1024))
+
+    def _find_existing(self, http, remote_name: str) -> list[dict]:
+        title = remote_name.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"title='{title}' and '{self.drive.project_folder_id}' in parents and trashed=false"
+        return self.drive.gauth.service.files().list(q=query).execute(http=http).get("items", [])
+
+    def _upload_sync(self, path: Path, remote_name: str) -> str:
+        md5 = _md5_digest(path).hex()
+        self.drive.ensure_authorized()
+        # httplib2 connections are not thread-safe: one authorized Http per upload thread
+        http = self.drive.gauth.Get_Http_Object()
+
+        if any(item.get("md5Checksum") == md5 for item in self._find_existing(http, remote_name)):
+            return "skipped"
+
+        try:
+            return self._upload_resumable(http, path, remote_name, md5)
+        except HttpError as e:
+            if e.resp.status == 404:
+                # The cached project folder may have been deleted on Drive; the retry resolves it again
+                self.drive.refresh_folders()
+            raise
+
+    def _upload_resumable(self, http, path: Path, remote_name: str, md5: str) -> str:
+        request = self.drive.gauth.service.files().insert(
+            body={"title": remote_name, "parents": [{"id": self.drive.project_folder_id}]},
+            media_body=MediaFileUpload(str(path), chunksize=self.chunk_size, resumable=True),
+        )
+        response = None
+        while response is None:
+            _, response = request.next_chunk(http=http, num_retries=self.max_retries)
+
+        if response.get("md5Checksum") != md5:
+            self.drive.gauth.service.files().delete(fileId=response["id"]).execute(http=http)
+            raise ChecksumError(f"Drive checksum mismatch for {remote_name}")
+        return "uploaded"
+
+    def _download_sync(self, remote_name: str, dest: Path) -> None:
+        self.drive.ensure_authorized()
+        http = self.drive.gauth.Get_Http_Object()
+        items = self._find_existing(http, remote_name)
+        if not items:
+            raise FileNotFoundError(f"{remote_name} is not in the Drive folder of {self.drive.project_name}")
+
+        item = items[0]
+        request = self.drive.gauth.service.files().get_media(fileId=item["id"])
+        request.http = http
+        part_path = dest.with_name(f"{dest.name}.part")
+        with open(part_path, "wb") as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=self.chunk_size)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk(num_retries=self.max_retries)
+
+        if item.get("md5Checksum") and _md5_digest(part_path).hex() != item["md5Checksum"]:
+            part_path.unlink(missing_ok=True)
+            raise ChecksumError(f"Drive checksum mismatch for {remote_name}")
+        os.replace(part_path, dest)
+
+    def _clear_sync(self) -> None:
+        """Trashes every file in the project folder (Drive keeps them in the bin for 30 days)"""
+        self.drive.ensure_authorized()
+        http = self.drive.gauth.Get_Http_Object()
+        files = self.drive.gauth.service.files()
+        query = f"'{self.drive.project_folder_id}' in parents and trashed=false"
+        # List everything first: trashing while paging would shift the pages of this query
+        ids, page_token = [], None
+        while True:
+            page = files.list(q=query, pageToken=page_token).execute(http=http)
+            ids += [item["id"] for item in page.get("items", [])]
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+        for file_id in ids:
+            files.trash(fileId=file_id).execute(http=http)
+
+
+def create_storage_backend(project_name: str, drive: GoogleDriveService | None = None,
+                           kind: str = STORAGE_BACKEND) -> StorageBackend:
+    """Backend selected by STORAGE_BACKEND, storing under a per-project folder or prefix"""
+    if kind == "drive":
+        return DriveStorageBackend(drive or GoogleDriveService(project_name=project_name))
+    if kind == "s3":
+        return S3StorageBackend(prefix=f"{S3_PREFIX.strip('/')}/{project_name}".strip("/"))
+    if kind == "local":
+        return LocalStorageBackend(prefix=project_name)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{kind}', expected drive, s3 or local")
+
+
+def create_shared_store(job_id: str, kind: str = SHARED_STORE_BACKEND) -> StorageBackend:
+    """
+    Scratch space of one fanned-out job, readable by every worker: SHARED_STORE_DIR
+    (a volume mounted on all nodes) or the S3 bucket under a jobs/ prefix
+    """
+    if kind == "s3":
+        return S3StorageBackend(prefix=f"{S3_PREFIX.strip('/')}/jobs/{job_id}".strip("/"))
+    if kind == "local":
+        return LocalStorageBackend(root=SHARED_STORE_DIR, prefix=job_id)
+    raise ValueError(f"Unknown SHARED_STORE_BACKEND '{kind}', expected local or s3")
+
+
+async def sweep_shared_stores(ttl_hours: int = SHARED_STORE_TTL_HOURS, kind: str = SHARED_STORE_BACKEND) -> list[str]:
+    """
+    Removes the shared stores untouched for `ttl_hours`: ones kept because uploads failed,
+    and ones of jobs that died before they could clean up. Returns the job ids removed.
+    """
+    cutoff = time.time() - ttl_hours * 3600
+    last_modified = await asyncio.to_thread(create_shared_store("", kind)._last_modified_sync)
+    expired = sorted(job_id for job_id, modified in last_modified.items() if modified < cutoff)
+    await asyncio.gather(*(create_shared_store(job_id, kind).clear() for job_id in expired))
+    if expired:
+        logger.warning(f"Removed {len(expired)} shared stores older than {ttl_hours}h: {expired}")
+    return expired
@@ -2,13 +2,23 @@ import os
 from dotenv import load_dotenv
 
 import asyncio
+import json
+from contextlib import asynccontextmanager
 from pathlib import Path
+import shutil
 import uuid
 from datetime import datetime
 
+import aiohttp
 from elevenlabs import ElevenLabs
 from loguru import logger
 
+from core.configs import CACHE_DIR, ELEVENLABS_BASE_URL, TTS_CACHE_MAX_BYTES
+from .disk_cache import DiskCacheService
+from .download_engine import DownloadEngine
+from .elevenlabs_client import ElevenLabsAsyncClient
+from .voice_catalog import VoiceCatalogService
+
 
 load_dotenv()
 
@@ -17,51 +27,82 @@ ELEVEN_LABS_API_KEY = os.getenv("ELEVEN_LABS_API_KEY")
 class TextToSpeechService:
     BASE_TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_files"
 
-    MAX_CONCURRENT = 3
     MODEL_ID = "eleven_multilingual_v2"
     AUDIO_FORMAT = "mp3_44100_128"
-
-    def __init__(self, task_name: str, api_key: str = ELEVEN_LABS_API_KEY):
+    VOICE_SETTINGS: dict | None = None  # None = the voice's own settings on ElevenLabs
+
+    def __init__(
+        self,
+        task_name: str,
+        api_key: str = ELEVEN_LABS_API_KEY,
+        client: ElevenLabs | None = None,
+        voice_catalog: VoiceCatalogService | None = None,
+        tts_cache: DiskCacheService | None = None,
+        api: ElevenLabsAsyncClient | None = None,
+    ):
         self.task_name = task_name
         self.task_dir = self.BASE_TEMP_DIR / task_name / "voice"
         self.task_dir.mkdir(parents=True, exist_ok=True)
 
-        self.client = ElevenLabs(api_key=api_key)
-        self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+        self.api_key = api_key
+        self.client = client or ElevenLabs(api_key=api_key, base_url=ELEVENLABS_BASE_URL)
+        self.voice_catalog = voice_catalog or VoiceCatalogService(self.client)
+        # Async synthesis client; without one a session is opened per generate_blocks call
+        self.api = api
+        self.api_stats: dict = {}
+        self.failures: list[dict] = []
+
+        self.tts_cache = tts_cache or DiskCacheService(CACHE_DIR / "tts", TTS_CACHE_MAX_BYTES)
+        # One synthesized file per distinct cache key; block files are hardlinks to it
+        self.synth_dir = self.BASE_TEMP_DIR / task_name / "tts"
+        self.synthesized: dict[str, asyncio.Task] = {}
+        self.characters_saved = 0
+        self.deduplicated = 0
 
     def get_all_voices(self) -> list[dict]:
-        """Get all voices"""
-        response = self.client.voices.get_all(show_legacy=True)
-        voices = response.voices
-
-        return [
-            {"voice_id": v.voice_id, "name": v.name, "preview_url": getattr(v, "preview_url", None)}
-            for v in voices
-        ]
+        """Get all voices (cached catalog)"""
+        return self.voice_catalog.voices()
 
     def get_voice_id_by_name(self, name: str) -> str | None:
-        for v in self.get_all_voices():
-            if v["name"].lower() == name.lower():
-                return v["voice_id"]
-        return None
-
-    def generate_and_save_voice_sync(self, text: str, voice_name: str, save_dir: Path) -> str:
-        """Synchronous audio generation (without aiofiles)"""
-        voice_id = self.get_voice_id_by_name(voice_name)
+        return self.voice_catalog.voice_id(name)
+
+    def generate_and_save_voice_sync(
+        self,
+        text: str,
+        voice_name: str | None,
+        save_dir: Path,
+        voice_id: str | None = None,
+    ) -> str:
+        """Synchronous audio generation (without aiofiles); a given `voice_id` skips the name lookup"""
+        voice_id = voice_id or self.get_voice_id_by_name(voice_name)
         if not voice_id:
             raise ValueError(f"Voice '{voice_name}' not found")
 
         save_dir.mkdir(parents=True, exist_ok=True)
+        file_path = save_dir / self._voice_filename(voice_name or voice_id)
+        self._synthesize_sync(text, voice_id, file_path)
+
+        logger.info(f"Voice saved: {file_path}")
+        return str(file_path)
+
+    @staticmethod
+    def _voice_filename(voice_label: str) -> str:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         unique_id = uuid.uuid4().hex[:4]
-        filename = f"tts_{voice_name.lower()}_{timestamp}_{unique_id}.mp3"
-        file_path = save_dir / filename
+        return f"tts_{voice_label.lower()}_{timestamp}_{unique_id}.mp3"
+
+    def _cache_key(self, text: str, voice_id: str) -> str:
+        """Everything that changes the produced audio"""
+        settings = json.dumps(self.VOICE_SETTINGS, sort_keys=True)
+        return DiskCacheService.make_key(text, voice_id, self.MODEL_ID, self.AUDIO_FORMAT, settings)
 
+    def _synthesize_sync(self, text: str, voice_id: str, file_path: Path) -> None:
         audio_gen = self.client.text_to_speech.convert(
             text=text,
             voice_id=voice_id,
             model_id=self.MODEL_ID,
             output_format=self.AUDIO_FORMAT,
+            **({"voice_settings": self.VOICE_SETTINGS} if self.VOICE_SETTINGS else {}),
         )
 
         with open(file_path, "wb") as f:
@@ -71,13 +112,77 @@ class TextToSpeechService:
         if file_path.stat().st_size == 0:
             raise RuntimeError(f"Audio not generated: {file_path}")
 
+    async def _synthesize_cached(self, key: str, text: str, voice_id: str) -> Path:
+        """The audio for `key`: from the worker cache, else synthesized once and published"""
+        self.synth_dir.mkdir(parents=True, exist_ok=True)
+        synth_path = self.synth_dir / f"{key}.mp3"
+
+        if await asyncio.to_thread(self.tts_cache.fetch, key, synth_path, ".mp3"):
+            self.characters_saved += len(text)
+            return synth_path
+
+        async with self._api() as api:
+            await api.synthesize(
+                text, voice_id, synth_path,
+                model_id=self.MODEL_ID, output_format=self.AUDIO_FORMAT, voice_settings=self.VOICE_SETTINGS,
+            )
+        await asyncio.to_thread(self.tts_cache.publish, key, synth_path, ".mp3")
+        return synth_path
+
+    async def generate_and_save_voice(
+        self,
+        text: str,
+        voice_name: str | None,
+        save_dir: Path,
+        voice_id: str | None = None,
+    ) -> str:
+        """
+        Saves the voice-over for `text` into `save_dir`. Cached audio is reused, and
+        identical items of one request share a single synthesis.
+        """
+        voice_id = voice_id or await asyncio.to_thread(self.get_voice_id_by_name, voice_name)
+        if not voice_id:
+            raise ValueError(f"Voice '{voice_name}' not found")
+
+        key = self._cache_key(text, voice_id)
+        if key in self.synthesized:
+            self.deduplicated += 1
+            self.characters_saved += len(text)
+        else:
+            self.synthesized[key] = asyncio.create_task(self._synthesize_cached(key, text, voice_id))
+        synth_path = await self.synthesized[key]
+
+        save_dir.mkdir(parents=True, exist_ok=True)
+        file_path = save_dir / self._voice_filename(voice_name or voice_id)
+        try:
+            file_path.hardlink_to(synth_path)
+        except OSError:
+            shutil.copy2(synth_path, file_path)
+
         logger.info(f"Voice saved: {file_path}")
         return str(file_path)
 
-    async def generate_and_save_voice(self, text: str, voice_name: str, save_dir: Path) -> str:
-        """Asynchronous wrapper over sync method"""
-        async with self.semaphore:
-            return await asyncio.to_thread(self.generate_and_save_voice_sync, text, voice_name, save_dir)
+    @asynccontextmanager
+    async def _api(self):
+        if self.api:
+            yield self.api
+            return
+        async with aiohttp.ClientSession(connector=DownloadEngine.connector()) as session:
+            self.api = ElevenLabsAsyncClient(session, api_key=self.api_key)
+            try:
+                yield self.api
+            finally:
+                self.api_stats = self.api.stats()
+                self.api = None
+
+    def summary(self) -> dict:
+        return {
+            "cache": self.tts_cache.stats(),
+            "deduplicated": self.deduplicated,
+            "characters_saved": self.characters_saved,
+            "api": self.api.stats() if self.api else self.api_stats,
+            "failures": self.failures,
+        }
 
     async def generate_blocks(self, voice_blocks: dict) -> dict[str, list[str]]:
         """Asynchronous processing of multiple TTS blocks"""
@@ -86,11 +191,18 @@ class TextToSpeechService:
         async def process_voice(block_name, item):
             try:
                 save_dir = self.task_dir / block_name
-                path = await self.generate_and_save_voice(item["text"], item["voice"], save_dir)
+                path = await self.generate_and_save_voice(
+                    item["text"], item.get("voice"), save_dir, voice_id=item.get("voice_id")
+                )
                 results.setdefault(block_name, []).append(path)
             except Exception as e:
-                logger.error(f"Error ({block_name}/{item['voice']}): {e}")
+                voice = item.get('voice') or item.get('voice_id')
+                logger.error(f"Error ({block_name}/{voice}): {e}")
+                self.failures.append({"block": block_name, "voice": voice, "error": str(e)})
 
         tasks = [process_voice(block, item) for block, items in voice_blocks.items() for item in items]
-        await asyncio.gather(*tasks)
+        # One session (and rate limiter) for all items
+        async with self._api() as api:
+            api.reset_quota()
+            await asyncio.gather(*tasks)
         return results
@@ -1,86 +1,97 @@
-import os
-import platform
-import itertools
+import asyncio
 from pathlib import Path
-import subprocess
-import urllib.request
-import zipfile
-import tarfile
+import shutil
+import uuid
 
 from loguru import logger
 
+from core.configs import CACHE_DIR, NORMALIZED_CACHE_MAX_BYTES
+from app.schemas.render_profiles import DEFAULT_RENDER_PROFILE, RENDER_PROFILES, RenderProfile
+from .audio_overlay import AudioOverlayService
+from .combination import CombinationService
+from .disk_cache import DiskCacheService
+from .ffmpeg_toolchain import get_toolchain
+from .media_probe import MediaInfo, MediaMetadataIndex
+from .render_planner import RenderPlannerService, RenderStep
+from .render_pool import RenderPoolService
+
 
 class VideoCombinerService:
     BASE_TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_files"
-    BIN_DIR = Path(__file__).resolve().parent.parent.parent / "bin" / "ffmpeg"
 
-    # Video settings
-    DEFAULT_CODEC = "libx264"
-    DEFAULT_FPS = 10 # FPS for all videos
-    DEFAULT_WIDTH = 270  # width after resize
-    DEFAULT_HEIGHT = 480 # height after resize
+    # Video settings (codec, size, fps and quality come from the render profile)
     DEFAULT_SAR = 1 # pixel aspect ratio
+    DEFAULT_PIX_FMT = "yuv420p" # pixel format of normalized clips
+    DEFAULT_GOP_SECONDS = 2 # keyframe interval of normalized clips
+    DEFAULT_TIMESCALE = 90000 # mp4 track timescale, identical for every clip
     DEFAULT_OVERWRITE = True # automatically overwrite existing files
+    # Concat is a stream copy, so shared prefix files would only add a copy pass and disk I/O
+    SHARE_PREFIXES = False
+
+    # ffprobe codec_name produced by each encoder
+    CODEC_NAMES = {"libx264": "h264", "libx265": "hevc"}
+    # Parameter-set fields that must match too: concat with -c copy keeps the first clip's SPS/PPS
+    PARAMETER_SET_FIELDS = ("profile", "level", "has_b_frames")
+
+    # encoder settings key -> video stream of a reference encode, per worker process
+    _target_streams: dict[str, dict] = {}
 
-    def __init__(self, task_name: str):
+    def __init__(
+        self,
+        task_name: str,
+        render_pool: RenderPoolService | None = None,
+        profile: RenderProfile | None = None,
+        clip_cache: DiskCacheService | None = None,
+        media_index: MediaMetadataIndex | None = None,
+    ):
         self.task_name = task_name
         self.task_dir = self.BASE_TEMP_DIR / task_name / "video"
-        if not self.task_dir.exists():
-            raise FileNotFoundError(f"Video folder not found: {self.task_dir}")
+
+        self.normalized_dir = self.BASE_TEMP_DIR / task_name / "normalized"
+        self.normalized_dir.mkdir(parents=True, exist_ok=True)
+
+        self.prefix_dir = self.BASE_TEMP_DIR / task_name / "prefixes"
 
         self.output_dir = self.BASE_TEMP_DIR / task_name / "combined_movies_raw"
-        self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        self.codec = self.DEFAULT_CODEC
-        self.fps = self.DEFAULT_FPS
-        self.width = self.DEFAULT_WIDTH
-        self.height = self.DEFAULT_HEIGHT
+        self.profile = profile or RENDER_PROFILES[DEFAULT_RENDER_PROFILE]
+        self.codec = self.profile.codec
+        self.fps = self.profile.fps
+        self.width = self.profile.width
+        self.height = self.profile.height
         self.sar = self.DEFAULT_SAR
+        self.pix_fmt = self.DEFAULT_PIX_FMT
+        self.gop = self.fps * self.DEFAULT_GOP_SECONDS
+        self.timescale = self.DEFAULT_TIMESCALE
         self.overwrite = self.DEFAULT_OVERWRITE
+        self.render_pool = render_pool or RenderPoolService()
+        self.plan_summary: dict = {}
+        self.render_failures: list[dict] = []  # outputs skipped or failed, as {"video", "status", "error"}
+        self.max_output_duration = 0.0  # longest possible output, known once rendering starts
 
-        # Check and download ffmpeg locally
-        self.ffmpeg_path = self._ensure_ffmpeg()
-
-    def _ensure_ffmpeg(self) -> str:
-        self.BIN_DIR.mkdir(parents=True, exist_ok=True)
-        system = platform.system().lower()
-        ffmpeg_exe = "ffmpeg.exe" if system == "windows" else "ffmpeg"
-        ffmpeg_path = self.BIN_DIR / ffmpeg_exe
-
-        if ffmpeg_path.exists():
-            return str(ffmpeg_path)
-
-        logger.info(f"Downloading ffmpeg for {system}...")
-
-        if system == "windows":
-            url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
-            zip_path = self.BIN_DIR / "ffmpeg.zip"
-            urllib.request.urlretrieve(url, zip_path)
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                for f in zip_ref.namelist():
-                    if f.endswith("bin/ffmpeg.exe"):
-                        zip_ref.extract(f, self.BIN_DIR)
-                        os.rename(self.BIN_DIR / f, ffmpeg_path)
-            zip_path.unlink()
-        elif system == "linux":
-            url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
-            tar_path = self.BIN_DIR / "ffmpeg.tar.xz"
-            urllib.request.urlretrieve(url, tar_path)
-            with tarfile.open(tar_path) as tar_ref:
-                for f in tar_ref.getmembers():
-                    if f.name.endswith("/ffmpeg"):
-                        tar_ref.extract(f, self.BIN_DIR)
-                        os.rename(self.BIN_DIR / f.name, ffmpeg_path)
-                        os.chmod(ffmpeg_path, 0o755)
-            tar_path.unlink()
-        else:
-            raise RuntimeError(f"Unsupported OS: {system}")
+        self.clip_cache = clip_cache or DiskCacheService(CACHE_DIR / "normalized", NORMALIZED_CACHE_MAX_BYTES)
+        self.fast_path_clips = 0
+        self.transcoded_clips = 0
+        self._target_task: asyncio.Task | None = None
+
+        toolchain = get_toolchain()
+        if not toolchain.has_encoder(self.codec):
+            raise RuntimeError(f"ffmpeg {toolchain.version} has no '{self.codec}' encoder")
+        self.ffmpeg_path = toolchain.ffmpeg
+        self.ffprobe_path = toolchain.ffprobe
+        self.media_index = media_index or MediaMetadataIndex(self.ffprobe_path)
 
-        logger.info(f"ffmpeg ready: {ffmpeg_path}")
-        return str(ffmpeg_path)
+    def _thread_args(self) -> list[str]:
+        """Per-encode thread limit: the profile's own setting, else the pool's share"""
+        if self.profile.threads:
+            return ["-threads", str(self.profile.threads)]
+        return self.render_pool.thread_args()
 
     def _get_video_blocks(self) -> dict[str, list[Path]]:
         """Returns dictionary of blocks with video file paths"""
+        if not self.task_dir.exists():
+            raise FileNotFoundError(f"Video folder not found: {self.task_dir}")
+
         blocks = {}
         for block_path in sorted(self.task_dir.iterdir()):
             if block_path.is_dir():
@@ -91,45 +102,327 @@ class VideoCombinerService:
             raise ValueError(f"No videos in block folders: {self.task_dir}")
         return blocks
 
-    def generate_combinations(self) -> list[Path]:
-        blocks = self._get_video_blocks()
+    def _matches_target(self, info: MediaInfo | None, target: dict | None) -> bool:
+        """
+        True when a clip can join the normalized intermediates by stream copy. Profile,
+        level and reordering depth are compared with `target`, the stream our encoder
+        produces; without it nothing is copied. The track timescale is not compared:
+        the copy rewrites it with -video_track_timescale.
+        """
+        stream = info.video if info else None
+        if not stream or not target:
+            return False
+        return (
+            stream.get("codec_name") == self.CODEC_NAMES.get(self.codec, self.codec)
+            and stream.get("width") == self.width
+            and stream.get("height") == self.height
+            and stream.get("r_frame_rate") == f"{self.fps}/1"
+            and stream.get("sample_aspect_ratio", f"{self.sar}:1") == f"{self.sar}:1"
+            and stream.get("pix_fmt") == self.pix_fmt
+            and all(stream.get(name) == target.get(name) for name in self.PARAMETER_SET_FIELDS)
+        )
+
+    def _transcode_cmd(self, input_args: list[str], out_path: Path) -> list[str]:
+        cmd = [self.ffmpeg_path, *input_args,
+               "-map", "0:v:0",
+               "-vf", f"scale={self.width}:{self.height},fps={self.fps},setsar={self.sar}",
+               *self.profile.encoder_args(),
+               "-pix_fmt", self.pix_fmt,
+               "-g", str(self.gop),
+               "-video_track_timescale", str(self.timescale),
+               *self._thread_args(),
+               "-an"]
+        if self.overwrite:
+            cmd.append("-y")
+        cmd.append(str(out_path))
+        return cmd
+
+    async def _encode_reference(self) -> dict | None:
+        """Encodes one second of black frames with the normalization settings and probes the result"""
+        ref_path = self.normalized_dir / f".reference_{uuid.uuid4().hex}.mp4"
+        input_args = ["-f", "lavfi", "-i", f"color=black:s={self.width}x{self.height}:r={self.fps}", "-t", "1"]
+        try:
+            await self.render_pool.run(self._transcode_cmd(input_args, ref_path))
+            info = await self.media_index.probe(ref_path)
+            return info.video if info else None
+        except Exception as e:
+            logger.warning(f"Reference encode failed, every clip will be transcoded: {e}")
+            return None
+        finally:
+            ref_path.unlink(missing_ok=True)
+
+    async def _target_stream(self) -> dict | None:
+        """Video stream the encoder produces with the current settings, encoded once per worker"""
+        key = self._cache_key("reference")
+        if key not in self._target_streams:
+            if self._target_task is None:
+                self._target_task = asyncio.create_task(self._encode_reference())
+            stream = await self._target_task
+            if stream is None:
+                # Not remembered: the next task tries again
+                return None
+            self._target_streams[key] = stream
+        return self._target_streams[key]
+
+    def _cache_key(self, content_hash: str) -> str:
+        """Normalized clip identity: source content plus every setting that shapes the output"""
+        return DiskCacheService.make_key(
+            content_hash, self.width, self.height, self.fps, self.codec, self.profile.name,
+            *self.profile.encoder_args(), self.pix_fmt, self.gop, self.timescale,
+        )
+
+    async def _normalize_clip(self, video: Path, block_name: str) -> Path:
+        """
+        Brings one source clip into the canonical intermediate format, reusing the
+        worker cache across tasks. Otherwise clips that already match are remuxed
+        with stream copy and the rest are transcoded once, then published to the cache.
+        """
+        out_dir = self.normalized_dir / block_name
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / f"{video.stem}.mp4"
+
+        cache_key = self._cache_key(await asyncio.to_thread(DiskCacheService.file_digest, video))
+        if await asyncio.to_thread(self.clip_cache.fetch, cache_key, out_path, ".mp4"):
+            return out_path
+
+        await self._render_normalized(video, out_path)
+        await asyncio.to_thread(self.clip_cache.publish, cache_key, out_path, ".mp4")
+        return out_path
+
+    async def _render_normalized(self, video: Path, out_path: Path) -> None:
+        if self._matches_target(await self.media_index.probe(video), await self._target_stream()):
+            cmd = [self.ffmpeg_path, "-i", str(video),
+                   "-map", "0:v:0",
+                   "-c", "copy",
+                   "-video_track_timescale", str(self.timescale),
+                   "-an", "-y", str(out_path)]
+            await self.render_pool.run(cmd)
+            self.fast_path_clips += 1
+            return
+
+        await self.render_pool.run(self._transcode_cmd(["-i", str(video)], out_path))
+        self.transcoded_clips += 1
+
+    def _log_normalization(self) -> None:
+        logger.info(
+            f"Normalization: {self.clip_cache.hits} clips from cache, "
+            f"{self.fast_path_clips} stream-copied, {self.transcoded_clips} transcoded"
+        )
+
+    async def _normalize_blocks(self, blocks: dict[str, list[Path]]) -> dict[str, list[Path]]:
+        """Normalizes every source clip exactly once, whatever the number of combinations"""
+        async def normalize_block(block_name: str, videos: list[Path]) -> list[Path]:
+            normalized_videos = await asyncio.gather(
+                *(self._normalize_clip(video, block_name) for video in videos)
+            )
+            logger.info(f"Normalized {len(videos)} clips of {block_name}")
+            return list(normalized_videos)
+
+        results = await asyncio.gather(*(normalize_block(b, v) for b, v in blocks.items()))
+        self._log_normalization()
+        return dict(zip(blocks.keys(), results))
+
+    async def normalize_from_queue(self, queue: asyncio.Queue) -> dict[str, list[Path]]:
+        """
+        Normalizes clips as they arrive on `queue` as (block_name, index, path) items,
+        until a None sentinel. Returns the blocks in the same order _get_video_blocks would.
+        """
+        normalized: dict[str, dict[int, Path]] = {}
+
+        async def worker():
+            while (item := await queue.get()) is not None:
+                block_name, index, video = item
+                normalized.setdefault(block_name, {})[index] = await self._normalize_clip(video, block_name)
+            # Hand the sentinel on to the next worker
+            await queue.put(None)
+
+        await asyncio.gather(*(worker() for _ in range(self.render_pool.concurrency)))
+        self._log_normalization()
+        return {
+            block_name: [clip for _, clip in sorted(normalized[block_name].items())]
+            for block_name in sorted(normalized)
+        }
+
+    def normalization_summary(self) -> dict:
+        return {
+            "fast_path_clips": self.fast_path_clips,
+            "transcoded_clips": self.transcoded_clips,
+            "cache": self.clip_cache.stats(),
+        }
+
+    @staticmethod
+    def _write_concat_list(inputs: tuple[Path, ...], list_path: Path) -> Path:
+        """Writes an ffmpeg concat demuxer playlist"""
+        lines = []
+        for video in inputs:
+            escaped = str(video.resolve()).replace("'", "'\\''")
+            lines.append(f"file '{escaped}'")
+        list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return list_path
+
+    async def _concat(
+        self,
+        inputs: tuple[Path, ...],
+        out_path: Path,
+        audio_args: tuple[list[str], list[str]] | None = None,
+    ) -> Path:
+        """
+        Joins normalized clips (or shared prefixes) with the concat demuxer, without re-encoding.
+        With `audio_args` the audio track is muxed (or mixed) in the same ffmpeg pass.
+        """
+        list_path = self._write_concat_list(inputs, out_path.with_suffix(".txt"))
+
+        cmd = [self.ffmpeg_path,
+               "-f", "concat",
+               "-safe", "0",
+               "-i", str(list_path)]
+
+        if audio_args:
+            audio_inputs, audio_outputs = audio_args
+            cmd.extend([*audio_inputs, *audio_outputs])
+        else:
+            cmd.extend(["-c", "copy"])
+
+        cmd.extend(["-movflags", "+faststart"])
+
+        if self.overwrite:
+            cmd.append("-y")
+
+        cmd.append(str(out_path))
+
+        try:
+            await self.render_pool.run(cmd)
+        finally:
+            list_path.unlink(missing_ok=True)
+        return out_path
+
+    async def generate_combinations(
+        self,
+        max_combinations: int | None = None,
+        sample: bool = False,
+        seed: int | None = None,
+        offset: int = 0,
+        audio: AudioOverlayService | None = None,
+        blocks: dict[str, list[Path]] | None = None,
+        queue: asyncio.Queue | None = None,
+        indices: list[int] | None = None,
+    ) -> list[Path]:
+        """
+        Renders the selected combinations. Without `audio` they are written to
+        combined_movies_raw/ for a separate overlay pass; with it every output gets
+        its pre-mixed audio bed muxed in the same ffmpeg invocation and goes straight to done/.
+        `blocks` are already normalized clips (see normalize_from_queue); by default the
+        downloaded video folder is normalized first. Each finished output is also put on
+        `queue`, if given, while the rest still render. `indices` (product positions, as in
+        CombinationService.combination_at) replace the selection arguments; only the clips
+        they use need to exist locally.
+        """
+        output_dir = audio.done_dir if audio else self.output_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        if not blocks:
+            blocks = await self._normalize_blocks(self._get_video_blocks())
         block_names = list(blocks.keys())
         block_lists = [blocks[name] for name in block_names]
 
-        all_combinations = list(itertools.product(*block_lists))
-        logger.info(f"Total combinations: {len(all_combinations)}")
+        total = CombinationService.count_combinations(block_lists)
+        if indices is not None:
+            combinations = [CombinationService.combination_at(block_lists, idx) for idx in indices]
+            selected = len(combinations)
+            clips = list(dict.fromkeys(clip for combination in combinations for clip in combination))
+        else:
+            selected = len(range(total)[offset:][:max_combinations])
+            combinations = CombinationService.iter_combinations(
+                block_lists, max_combinations=max_combinations, sample=sample, seed=seed, offset=offset
+            )
+            clips = [clip for block in block_lists for clip in block]
+        logger.info(f"Total combinations: {total}, rendering {selected}")
 
-        output_paths = []
+        self.prefix_dir.mkdir(parents=True, exist_ok=True)
+        durations = {
+            clip: info.duration if info else 0.0
+            for clip, info in (await self.media_index.probe_many(clips)).items()
+        }
+        sizes = {clip: clip.stat().st_size for clip in clips}
+        # Bounded per block, so the (lazy) plan is not walked twice
+        self.max_output_duration = sum(
+            max((durations.get(clip, 0.0) for clip in block), default=0.0) for block in block_lists
+        )
+        plan = RenderPlannerService(self.prefix_dir, sizes, self.SHARE_PREFIXES).plan(combinations, output_dir)
+
+        prefixes: dict[Path, asyncio.Task] = {}
+
+        async def render_step(step: RenderStep, audio_args: tuple[list[str], list[str]] | None = None) -> Path:
+            if step.parent:
+                await prefixes[step.parent]
+            return await self._concat(step.inputs, step.out_path, audio_args)
 
-        for idx, combination in enumerate(all_combinations, start=1):
-            combo_name = "_".join([v.stem for v in combination])
-            out_path = self.output_dir / f"{combo_name}.mp4"
+        # Prefix tasks are created in trie order, so shared parts are ready before their descendants
+        for step in plan.prefix_steps:
+            prefixes[step.out_path] = asyncio.create_task(render_step(step))
+
+        steps = iter(plan.output_steps)
+        output_paths = []
 
-            input_args = []
-            filter_parts = []
+        def step_duration(step: RenderStep) -> float:
+            return sum(durations.get(clip, 0.0) for clip in step.clips)
 
-            for i, video in enumerate(combination):
-                input_args.extend(["-i", str(video)])
-                filter_parts.append(
-                    f"[{i}:v]scale={self.width}:{self.height},fps={self.fps},setsar={self.sar}[v{i}];"
-                )
+        if audio:
+            await audio.prepare_audio()
+            # Audio beds are mixed once per pair at the longest possible output length and cut per video
+            bed_duration = audio.bed_duration or self.max_output_duration
 
-            filter_complex = "".join(filter_parts) + "".join(
-                f"[v{i}]" for i in range(len(combination))
-            ) + f"concat=n={len(combination)}:v=1:a=0[outv]"
+        async def render_output(step: RenderStep) -> bool:
+            """Renders one output; never raises, a failure is recorded and the output skipped"""
+            try:
+                if not audio:
+                    await render_step(step)
+                    return True
 
-            cmd = [self.ffmpeg_path, *input_args,
-                   "-filter_complex", filter_complex,
-                   "-map", "[outv]",
-                   "-c:v", self.codec]
+                audio_pair = audio.pick_audio_pair()
+                if not audio_pair:
+                    logger.warning(f"⚠️ Skipping video {step.out_path.name} due to corrupted audio")
+                    self.render_failures.append(
+                        {"video": step.out_path.name, "status": "skipped", "error": "no usable audio"}
+                    )
+                    return False
 
-            if self.overwrite:
-                cmd.append("-y")
+                duration = step_duration(step)
+                bed = await audio.get_audio_bed(*audio_pair, bed_duration) if bed_duration else None
+                if bed:
+                    audio_args = audio.build_mux_args(bed, duration)
+                else:
+                    audio_args = audio.build_mix_args(*audio_pair, duration=duration or None)
+                await render_step(step, audio_args)
+                return True
+            except Exception as e:
+                step.out_path.unlink(missing_ok=True)
+                error = getattr(e, "stderr", None) or str(e)
+                self.render_failures.append({"video": step.out_path.name, "status": "failed", "error": error})
+                logger.error(f"Render failed for {step.out_path.name}: {e}")
+                return False
 
-            cmd.append(str(out_path))
+        async def worker():
+            for step in steps:
+                if not await render_output(step):
+                    continue
+                output_paths.append(step.out_path)
+                logger.info(f"Saved combination {len(output_paths)}/{selected} -> {step.out_path.name}")
+                if queue:
+                    await queue.put(step.out_path)
 
-            subprocess.run(cmd, check=True)
-            output_paths.append(out_path)
-            logger.info(f"Saved combination {idx}/{len(all_combinations)} -> {out_path.name}")
+        workers = [asyncio.create_task(worker()) for _ in range(self.render_pool.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # Nothing may still read a prefix file when the folder goes
+            for task in (*workers, *prefixes.values()):
+                task.cancel()
+            await asyncio.gather(*workers, *prefixes.values(), return_exceptions=True)
+            shutil.rmtree(self.prefix_dir, ignore_errors=True)
 
+        self.plan_summary = plan.summary()
+        logger.info(f"Render plan: {self.plan_summary}")
+        if self.render_failures:
+            logger.warning(f"{len(self.render_failures)} of {selected} combinations were not rendered")
         return output_paths
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+
+import redis
+from elevenlabs import ElevenLabs
+from loguru import logger
+
+from core.configs import VOICE_CATALOG_REDIS_URL, VOICE_CATALOG_TTL
+
+
+class VoiceCatalogService:
+    """
+    Voice name -> voice_id map, fetched once and reused for VOICE_CATALOG_TTL seconds.
+    With VOICE_CATALOG_REDIS_URL the catalog is shared by all workers; an unknown name
+    reloads it from ElevenLabs once, so voices added meanwhile are found.
+    """
+    REDIS_KEY = "tts:voice_catalog"
+    MIN_RELOAD_INTERVAL = 30  # seconds; a typo in a voice name must not refetch on every item
+
+    def __init__(
+        self,
+        client: ElevenLabs,
+        ttl: float = VOICE_CATALOG_TTL,
+        redis_url: str | None = VOICE_CATALOG_REDIS_URL,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self._voices: list[dict] = []
+        self._by_name: dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> list[dict]:
+        response = self.client.voices.get_all(show_legacy=True)
+        return [
+            {"voice_id": v.voice_id, "name": v.name, "preview_url": getattr(v, "preview_url", None)}
+            for v in response.voices
+        ]
+
+    def _load_shared(self) -> list[dict] | None:
+        if not self.redis:
+            return None
+        try:
+            cached = self.redis.get(self.REDIS_KEY)
+            return json.loads(cached) if cached else None
+        except (redis.RedisError, json.JSONDecodeError) as e:
+            logger.warning(f"Voice catalog: Redis unavailable, using the API ({e})")
+            return None
+
+    def _store_shared(self, voices: list[dict]) -> None:
+        if not self.redis:
+            return
+        try:
+            self.redis.set(self.REDIS_KEY, json.dumps(voices), ex=int(self.ttl))
+        except redis.RedisError as e:
+            logger.warning(f"Voice catalog: could not share the catalog via Redis ({e})")
+
+    def _set(self, voices: list[dict]) -> None:
+        self._voices = voices
+        self._by_name = {v["name"].lower(): v["voice_id"] for v in voices}
+        self._loaded_at = time.monotonic()
+
+    def _reload(self, from_api: bool = False) -> None:
+        """Shared copy first (unless `from_api`), else ElevenLabs; the API result is shared again"""
+        voices = None if from_api else self._load_shared()
+        if voices is None:
+            voices = self._fetch()
+            self._fetched_at = time.monotonic()
+            self._store_shared(voices)
+            logger.info(f"Voice catalog loaded: {len(voices)} voices")
+        self._set(voices)
+
+    def _expired(self) -> bool:
+        return not self._loaded_at or time.monotonic() - self._loaded_at > self.ttl
+
+    def voices(self) -> list[dict]:
+        with self._lock:
+            if self._expired():
+                self._reload()
+            return list(self._voices)
+
+    def voice_id(self, name: str) -> str | None:
+        """voice_id for a voice name (case-insensitive); None if ElevenLabs doesn't know it"""
+        key = name.lower()
+        with self._lock:
+            if self._expired():
+                self._reload()
+            if key not in self._by_name and time.monotonic() - self._fetched_at > self.MIN_RELOAD_INTERVAL:
+                # Miss: the cached catalog may predate the voice
+                self._reload(from_api=True)
+            return self._by_name.get(key)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Any, Coroutine
+
+import aiohttp
+from elevenlabs import ElevenLabs
+from loguru import logger
+from pydrive.auth import GoogleAuth
+
+from core.configs import ELEVEN_LABS_API_KEY, ELEVENLABS_BASE_URL, STORAGE_BACKEND
+from .download_engine import DownloadEngine
+from .elevenlabs_client import ElevenLabsAsyncClient
+from .ffmpeg_toolchain import get_toolchain
+from .google_driver_uploadaer import GoogleDriveService
+from .voice_catalog import VoiceCatalogService
+
+
+class WorkerResources:
+    """
+    Long-lived clients of one worker process, shared by all its tasks: a persistent
+    event loop, a pooled aiohttp session (keep-alive, DNS cache, per-host limits),
+    the ElevenLabs client and its voice catalog, the Drive credentials and its folder-ID cache.
+    Each one is created on first use; a closed session is reopened and an expired
+    Drive token refreshed lazily, when the next task asks for it.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._session: aiohttp.ClientSession | None = None
+        self._tts_client: ElevenLabs | None = None
+        self._tts_api: ElevenLabsAsyncClient | None = None
+        self._voice_catalog: VoiceCatalogService | None = None
+        self._drive_auth: GoogleAuth | None = None
+        self.drive_folder_ids: dict[tuple[str, str | None], str] = {}
+        self.tasks_served = 0
+
+    def warm_up(self) -> None:
+        """
+        Resolves what every task needs up front, so the first task doesn't pay for it.
+        Runs inside worker_process_init: only cheap, non-interactive steps belong here
+        (the toolchain is already resolved by the parent's worker_init).
+        """
+        started = time.perf_counter()
+        steps = [("ffmpeg", get_toolchain)]
+        if STORAGE_BACKEND == "drive":
+            steps.append(("Drive authorization", self.drive_auth))
+        # A failure here must not kill the pool process; tasks retry lazily and report it
+        for name, warm in steps:
+            try:
+                warm()
+            except Exception as e:
+                logger.warning(f"{name} deferred: {e}")
+        logger.info(f"Worker resources ready in {time.perf_counter() - started:.2f}s")
+
+    def run(self, coro: Coroutine) -> Any:
+        """asyncio.run on the persistent loop: pending tasks are cancelled if the coroutine is interrupted"""
+        task = self.loop.create_task(coro)
+        try:
+            return self.loop.run_until_complete(task)
+        except BaseException:
+            # e.g. SoftTimeLimitExceeded raised from the signal handler mid-loop
+            pending = [t for t in asyncio.all_tasks(self.loop) if not t.done()]
+            for t in pending:
+                t.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            raise
+        finally:
+            self.tasks_served += 1
+
+    def http_session(self) -> aiohttp.ClientSession:
+        """The shared session; must be called from a coroutine running on `loop`"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=DownloadEngine.connector())
+        return self._session
+
+    def tts_client(self) -> ElevenLabs:
+        if self._tts_client is None:
+            self._tts_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY, base_url=ELEVENLABS_BASE_URL)
+        return self._tts_client
+
+    def tts_api(self) -> ElevenLabsAsyncClient:
+        """Async TTS client on the shared session; its rate-limit state survives a session reopen"""
+        session = self.http_session()
+        if self._tts_api is None or self._tts_api.session is not session:
+            limiter = self._tts_api.limiter if self._tts_api else None
+            self._tts_api = ElevenLabsAsyncClient(session, limiter=limiter)
+        return self._tts_api
+
+    def voice_catalog(self) -> VoiceCatalogService:
+        if self._voice_catalog is None:
+            self._voice_catalog = VoiceCatalogService(self.tts_client())
+        return self._voice_catalog
+
+    def drive_auth(self) -> GoogleAuth:
+        """Loaded Drive credentials; GoogleDriveService refreshes them only once they expire"""
+        if self._drive_auth is None:
+            self._drive_auth = GoogleDriveService.authorize(interactive=False)
+        return self._drive_auth
+
+    def drive(self, project_name: str) -> GoogleDriveService:
+        return GoogleDriveService(project_name, gauth=self.drive_auth(), folder_ids=self.drive_folder_ids)
+
+    def health(self) -> dict:
+        return {
+            "tasks_served": self.tasks_served,
+            "loop": "closed" if self.loop.is_closed() else "running" if self.loop.is_running() else "idle",
+            "http_session": "open" if self._session and not self._session.closed else "none",
+            "tts_client": "ready" if self._tts_client else "none",
+            "drive": "none" if self._drive_auth is None else
+                     "expired" if self._drive_auth.access_token_expired else "authorized",
+            "drive_folders_cached": len(self.drive_folder_ids),
+        }
+
+    def close(self) -> None:
+        if self.loop.is_closed():
+            return
+        if self._session and not self._session.closed:
+            self.loop.run_until_complete(self._session.close())
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+
+_resources: WorkerResources | None = None
+
+
+def init_worker_resources() -> WorkerResources:
+    global _resources
+    _resources = WorkerResources()
+    _resources.warm_up()
+    return _resources
+
+
+def get_worker_resources() -> WorkerResources:
+    """The worker's registry, created on demand outside Celery (e.g. scripts)"""
+    global _resources
+    if _resources is None or _resources.loop.is_closed():
+        _resources = WorkerResources()
+    return _resources
+
+
+def close_worker_resources() -> None:
+    global _resources
+    if _resources is not None:
+        _resources.close()
+        _resources = None
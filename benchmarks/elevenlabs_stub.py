@@ -0,0 +1,134 @@
+"""
+Local stand-in for the ElevenLabs endpoints the service uses, to exercise the TTS
+client's rate limiting and retries without spending characters.
+
+  GET  /v1/voices                           - a small fixed voice catalog
+  POST /v1/text-to-speech/{voice_id}/stream - fake audio, streamed after --latency seconds
+
+Requests beyond --max-concurrent get 429 (concurrent_limit_exceeded) and a share of
+--error-rate get 503, like the real API under load.
+
+Usage:
+    python -m benchmarks.elevenlabs_stub --port 8099            # serve only
+    python -m benchmarks.elevenlabs_stub --items 40             # serve and drive TextToSpeechService
+
+Point a worker at it with ELEVENLABS_BASE_URL=http://127.0.0.1:8099.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from app.services.disk_cache import DiskCacheService
+from app.services.elevenlabs_client import ElevenLabsAsyncClient
+from app.services.text_to_speach import TextToSpeechService
+
+VOICES = [
+    {"voice_id": "stub-sarah", "name": "Sarah"},
+    {"voice_id": "stub-george", "name": "George"},
+    {"voice_id": "stub-will", "name": "Will"},
+]
+
+
+def make_app(max_concurrent: int, latency: float, error_rate: float) -> web.Application:
+    state = {"active": 0, "requests": 0, "throttled": 0, "errors": 0}
+
+    async def voices(_: web.Request) -> web.Response:
+        return web.json_response({"voices": VOICES})
+
+    async def text_to_speech(request: web.Request) -> web.StreamResponse:
+        state["requests"] += 1
+        limit_headers = {
+            "current-concurrent-requests": str(state["active"]),
+            "maximum-concurrent-requests": str(max_concurrent),
+        }
+        if state["active"] >= max_concurrent:
+            state["throttled"] += 1
+            return web.json_response(
+                {"detail": {"status": "concurrent_limit_exceeded", "message": "Too many concurrent requests"}},
+                status=429, headers={**limit_headers, "Retry-After": "1"},
+            )
+        if random.random() < error_rate:
+            state["errors"] += 1
+            return web.json_response({"detail": {"status": "service_unavailable"}}, status=503)
+
+        payload = await request.json()
+        state["active"] += 1
+        try:
+            await asyncio.sleep(latency)
+            response = web.StreamResponse(headers={**limit_headers, "Content-Type": "audio/mpeg"})
+            await response.prepare(request)
+            # Roughly one 128 kbps second of "audio" per 15 characters
+            for _ in range(max(1, len(payload.get("text", "")) // 15)):
+                await response.write(b"\xff\xfb" + bytes(16 * 1024 - 2))
+            await response.write_eof()
+            return response
+        finally:
+            state["active"] -= 1
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_get("/v1/voices", voices)
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", text_to_speech)
+    return app
+
+
+async def drive(app: web.Application, port: int, items: int) -> None:
+    """Runs TextToSpeechService against the stub and reports throughput and limiter behaviour"""
+    with tempfile.TemporaryDirectory(prefix="tts_stub_") as tmp:
+        class StubTTS(TextToSpeechService):
+            BASE_TEMP_DIR = Path(tmp)
+
+        base_url = f"http://127.0.0.1:{port}"
+        async with aiohttp.ClientSession() as session:
+            api = ElevenLabsAsyncClient(session, api_key="stub", base_url=base_url)
+            tts = StubTTS(
+                "stub", api_key="stub", api=api,
+                tts_cache=DiskCacheService(Path(tmp) / "cache", max_bytes=1024 ** 3),
+            )
+            voice_blocks = {"voice1": [
+                {"text": f"Line {i}: the quick brown fox jumps over the lazy dog.", "voice_id": VOICES[i % 3]["voice_id"]}
+                for i in range(items)
+            ]}
+            start = time.perf_counter()
+            results = await tts.generate_blocks(voice_blocks)
+            elapsed = time.perf_counter() - start
+
+        print(f"{sum(len(v) for v in results.values())}/{items} items in {elapsed:.2f} s")
+        print(f"client: {api.stats()}")
+        print(f"server: {app['state']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--max-concurrent", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before audio starts")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--items", type=int, default=0, help="drive TextToSpeechService with this many items")
+    args = parser.parse_args()
+
+    app = make_app(args.max_concurrent, args.latency, args.error_rate)
+    if not args.items:
+        web.run_app(app, host="127.0.0.1", port=args.port)
+        return
+
+    async def serve_and_drive():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.port).start()
+        try:
+            await drive(app, args.port, args.items)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(serve_and_drive())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+End-to-end latency of download -> normalize -> render: gather barrier vs streaming pipeline.
+
+Generates synthetic source clips, serves them from a local HTTP server throttled
+to --mbps, then runs the same job twice with empty caches:
+
+  * barrier   - download every clip, then normalize, then render
+  * pipelined - each clip is normalized as soon as it is downloaded
+
+Usage:
+    python -m benchmarks.pipeline_latency --blocks 3 --clips 4 --mbps 40
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.services.disk_cache import DiskCacheService
+from app.services.download_cache import DownloadCacheService
+from app.services.ffmpeg_toolchain import get_toolchain
+from app.services.file_downloader import AsyncDownloaderService
+from app.services.render_pool import RenderPoolService
+from app.services.video_combiner import VideoCombinerService
+from core.configs import PIPELINE_QUEUE_SIZE
+from .render_throughput import make_clips
+
+
+class ThrottledHandler(http.server.SimpleHTTPRequestHandler):
+    bytes_per_second = 5 * 1024 ** 2
+
+    def copyfile(self, source, outputfile):
+        chunk_size = 64 * 1024
+        while chunk := source.read(chunk_size):
+            outputfile.write(chunk)
+            time.sleep(chunk_size / self.bytes_per_second)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root: Path, mbps: float) -> http.server.ThreadingHTTPServer:
+    handler = type("Handler", (ThrottledHandler,), {"bytes_per_second": mbps * 1024 ** 2 / 8})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(tmp: Path, mode: str, video_blocks: dict[str, list[str]]) -> tuple[int, float]:
+    class BenchDownloader(AsyncDownloaderService):
+        BASE_TEMP_DIR = tmp
+
+    class BenchCombiner(VideoCombinerService):
+        BASE_TEMP_DIR = tmp
+
+    # Separate empty caches, so neither run reuses the other's downloads or clips
+    downloader = BenchDownloader(mode, cache=DownloadCacheService(tmp / f"cache_{mode}" / "downloads"))
+    combiner = BenchCombiner(
+        mode, RenderPoolService(), clip_cache=DiskCacheService(tmp / f"cache_{mode}" / "normalized", max_bytes=1024 ** 4)
+    )
+
+    start = time.perf_counter()
+    if mode == "barrier":
+        await downloader.download_blocks(video_blocks, files_type="video")
+        blocks = None
+    else:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+        async def produce():
+            await downloader.download_blocks(video_blocks, files_type="video", queue=queue)
+            await queue.put(None)
+
+        _, blocks = await asyncio.gather(produce(), combiner.normalize_from_queue(queue))
+
+    outputs = await combiner.generate_combinations(blocks=blocks)
+    return len(outputs), time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=3)
+    parser.add_argument("--clips", type=int, default=4, help="clips per block")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per synthetic clip")
+    parser.add_argument("--mbps", type=float, default=40.0, help="simulated download bandwidth")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as tmp:
+        tmp = Path(tmp)
+        source_dir = tmp / "source"
+        make_clips(source_dir, get_toolchain().ffmpeg, args.blocks, args.clips, args.duration)
+
+        server = serve(source_dir, args.mbps)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        video_blocks = {
+            block.name: [f"{base_url}/{block.name}/{clip.name}" for clip in sorted(block.iterdir())]
+            for block in sorted(source_dir.iterdir())
+        }
+
+        try:
+            results = {}
+            for mode in ("barrier", "pipelined"):
+                count, elapsed = asyncio.run(run(tmp, mode, video_blocks))
+                results[mode] = elapsed
+                print(f"{mode:<10} {count:>5} combos  {elapsed:8.2f} s end-to-end")
+            saved = results["barrier"] - results["pipelined"]
+            print(f"pipeline saves {saved:.2f} s ({saved / results['barrier'] * 100:.1f}%)")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Combination rendering throughput: serial loop vs the parallel render pool.
+
+Generates synthetic source clips with ffmpeg's lavfi test source, then renders
+every combination three ways and prints combinations per minute:
+
+  * serial   - one blocking subprocess.run per combination, re-encoding every clip
+  * pool x1  - VideoCombinerService with a single render slot
+  * pool     - VideoCombinerService with the configured concurrency / thread budget
+
+then, with the normalized clips cached, the concat stage alone with and without
+shared prefix files (stream copy, so prefixes only add a copy pass).
+
+Usage:
+    python -m benchmarks.render_throughput --blocks 3 --clips 3 --concurrency 8 --threads 2
+"""
+import argparse
+import asyncio
+import itertools
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.disk_cache import DiskCacheService
+from app.services.render_pool import RenderPoolService
+from app.services.video_combiner import VideoCombinerService
+
+
+def make_clips(video_dir: Path, ffmpeg: str, blocks: int, clips: int, duration: float) -> None:
+    for b in range(1, blocks + 1):
+        block_dir = video_dir / f"block{b}"
+        block_dir.mkdir(parents=True, exist_ok=True)
+        for c in range(1, clips + 1):
+            subprocess.run([
+                ffmpeg, "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duration}",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p",
+                str(block_dir / f"b{b}c{c}.mp4"),
+            ], check=True)
+
+
+def run_serial(combiner: VideoCombinerService, out_dir: Path) -> int:
+    """The pre-pool loop: every combination decodes, rescales and encodes all its clips"""
+    blocks = combiner._get_video_blocks()
+    combinations = list(itertools.product(*blocks.values()))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for idx, combination in enumerate(combinations):
+        input_args, filter_parts = [], []
+        for i, video in enumerate(combination):
+            input_args.extend(["-i", str(video)])
+            filter_parts.append(
+                f"[{i}:v]scale={combiner.width}:{combiner.height},fps={combiner.fps},setsar={combiner.sar}[v{i}];"
+            )
+        filter_complex = "".join(filter_parts) + "".join(
+            f"[v{i}]" for i in range(len(combination))
+        ) + f"concat=n={len(combination)}:v=1:a=0[outv]"
+
+        subprocess.run([
+            combiner.ffmpeg_path, "-loglevel", "error", *input_args,
+            "-filter_complex", filter_complex,
+            "-map", "[outv]", "-c:v", combiner.codec, "-y",
+            str(out_dir / f"serial_{idx}.mp4"),
+        ], check=True)
+    return len(combinations)
+
+
+def report(label: str, count: int, elapsed: float) -> None:
+    print(f"{label:<10} {count:>5} combos  {elapsed:8.2f} s  {count / elapsed * 60:8.1f} combos/min")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=3)
+    parser.add_argument("--clips", type=int, default=3, help="clips per block")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per synthetic clip")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--cpu-budget", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="render_bench_") as tmp:
+        class BenchCombiner(VideoCombinerService):
+            BASE_TEMP_DIR = Path(tmp)
+
+        task_name = "bench"
+        video_dir = Path(tmp) / task_name / "video"
+        video_dir.mkdir(parents=True)
+        # Separate empty clip caches, so no run reuses another one's normalized clips
+        def empty_cache(label: str) -> DiskCacheService:
+            return DiskCacheService(Path(tmp) / f"cache_{label}", max_bytes=1024 ** 4)
+
+        serial_combiner = BenchCombiner(
+            task_name, RenderPoolService(concurrency=1, threads_per_job=None), clip_cache=empty_cache("x1")
+        )
+        make_clips(video_dir, serial_combiner.ffmpeg_path, args.blocks, args.clips, args.duration)
+
+        start = time.perf_counter()
+        count = run_serial(serial_combiner, Path(tmp) / "serial")
+        report("serial", count, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        count = len(asyncio.run(serial_combiner.generate_combinations()))
+        report("pool x1", count, time.perf_counter() - start)
+
+        pool = RenderPoolService(args.concurrency, args.threads, args.cpu_budget)
+        combiner = BenchCombiner(task_name, pool, clip_cache=empty_cache("pool"))
+        start = time.perf_counter()
+        count = len(asyncio.run(combiner.generate_combinations()))
+        report(f"pool x{pool.concurrency}", count, time.perf_counter() - start)
+
+        class PrefixCombiner(BenchCombiner):
+            SHARE_PREFIXES = True
+
+        for label, combiner_class in (("concat", BenchCombiner), ("prefixes", PrefixCombiner)):
+            combiner = combiner_class(task_name, RenderPoolService(args.concurrency, args.threads, args.cpu_budget),
+                                      clip_cache=empty_cache("pool"))
+            start = time.perf_counter()
+            count = len(asyncio.run(combiner.generate_combinations()))
+            report(label, count, time.perf_counter() - start)
+            print(f"{'':<10} {combiner.plan_summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Upload throughput of the storage backends: one file at a time vs UPLOAD_CONCURRENCY.
+
+Writes --files random files of --size MiB and uploads them with each concurrency level.
+The local backend is throttled to --mbps per stream, like a single TCP connection
+to a remote store; `--backend s3` uploads to S3_BUCKET / S3_ENDPOINT_URL (e.g. MinIO
+from `docker compose --profile minio up`) under a benchmark/ prefix instead.
+
+Usage:
+    python -m benchmarks.upload_throughput --files 8 --size 64 --mbps 20
+    python -m benchmarks.upload_throughput --backend s3 --files 8 --size 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from app.services.storage_backends import LocalStorageBackend, S3StorageBackend, StorageBackend
+from core.configs import UPLOAD_CONCURRENCY
+
+
+class ThrottledLocalBackend(LocalStorageBackend):
+    bytes_per_second = 5 * 1024 ** 2
+
+    def _upload_sync(self, path: Path, remote_name: str) -> str:
+        started = time.perf_counter()
+        status = super()._upload_sync(path, remote_name)
+        if status == "uploaded":
+            remaining = path.stat().st_size / self.bytes_per_second - (time.perf_counter() - started)
+            time.sleep(max(0.0, remaining))
+        return status
+
+
+def make_files(directory: Path, count: int, size: int) -> list[Path]:
+    files = []
+    for i in range(count):
+        path = directory / f"upload_{i:03d}.bin"
+        with open(path, "wb") as f:
+            for _ in range(size // (1024 ** 2)):
+                f.write(os.urandom(1024 ** 2))
+        files.append(path)
+    return files
+
+
+def make_backend(kind: str, root: Path, prefix: str, concurrency: int) -> StorageBackend:
+    if kind == "s3":
+        return S3StorageBackend(prefix=f"benchmark/{prefix}", concurrency=concurrency)
+    return ThrottledLocalBackend(root=root, prefix=prefix, concurrency=concurrency)
+
+
+async def run(backend: StorageBackend, files: list[Path]) -> tuple[float, dict]:
+    start = time.perf_counter()
+    results = await backend.upload_files(files)
+    elapsed = time.perf_counter() - start
+    statuses = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    return elapsed, statuses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["local", "s3"], default="local")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size", type=int, default=32, help="MiB per file")
+    parser.add_argument("--mbps", type=float, default=20, help="per-stream limit of the local backend, MB/s")
+    parser.add_argument("--concurrency", type=int, default=UPLOAD_CONCURRENCY)
+    args = parser.parse_args()
+
+    ThrottledLocalBackend.bytes_per_second = args.mbps * 1024 ** 2
+    with tempfile.TemporaryDirectory(prefix="upload_bench_") as tmp:
+        src_dir = Path(tmp) / "src"
+        src_dir.mkdir()
+        files = make_files(src_dir, args.files, args.size)
+        total_mb = args.files * args.size
+        run_id = uuid.uuid4().hex[:8]
+        for concurrency in sorted({1, args.concurrency}):
+            backend = make_backend(args.backend, Path(tmp) / "store", f"{run_id}-c{concurrency}", concurrency)
+            elapsed, statuses = asyncio.run(run(backend, files))
+            print(f"concurrency {concurrency:>2}: {elapsed:6.2f} s  {total_mb / elapsed:7.1f} MB/s  {statuses}")
+
+        # Second pass over the same destination: everything is verified and skipped
+        backend = make_backend(args.backend, Path(tmp) / "store", f"{run_id}-c{concurrency}", concurrency)
+        elapsed, statuses = asyncio.run(run(backend, files))
+        print(f"re-upload     : {elapsed:6.2f} s  {statuses}")
+
+
+if __name__ == "__main__":
+    main()
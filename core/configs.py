@@ -1,9 +1,76 @@
 import os
+import tempfile
+from pathlib import Path
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ELEVEN_LABS_API_KEY = os.getenv("ELEVEN_LABS_API_KEY")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL") or "https://api.elevenlabs.io"  # or a local stub
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY") or 3)  # starting concurrency, adapted to rate limits
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY") or 10)
+TTS_MAX_RETRIES = int(os.getenv("TTS_MAX_RETRIES") or 5)
+VOICE_CATALOG_TTL = float(os.getenv("VOICE_CATALOG_TTL") or 3600)  # seconds the voice list is reused
+VOICE_CATALOG_REDIS_URL = os.getenv("VOICE_CATALOG_REDIS_URL")  # e.g. redis://redis:6379/1; unset = per worker only
+
+# ffmpeg binaries; unset = system PATH, else a build downloaded into bin/ffmpeg
+FFMPEG_PATH = os.getenv("FFMPEG_PATH")
+FFPROBE_PATH = os.getenv("FFPROBE_PATH")
+
+# Render pool, per worker (0 or unset = derive from the core budget)
+RENDER_CPU_BUDGET = int(os.getenv("RENDER_CPU_BUDGET") or 0) or None  # cores ffmpeg may use in total
+RENDER_CONCURRENCY = int(os.getenv("RENDER_CONCURRENCY") or 0) or None  # parallel ffmpeg jobs
+RENDER_THREADS = int(os.getenv("RENDER_THREADS") or 0) or None  # -threads per ffmpeg job
+# ffmpeg jobs at once across all pool processes of a host (or container); 0 or unset = no host-wide cap
+FFMPEG_HOST_SLOTS = int(os.getenv("FFMPEG_HOST_SLOTS") or 0) or None
+FFMPEG_SLOTS_DIR = Path(os.getenv("FFMPEG_SLOTS_DIR") or Path(tempfile.gettempdir()) / "ffmpeg_slots")
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT") or 1800)  # wall-clock limit per ffmpeg command, seconds
+OVERLAY_CONCURRENCY = int(os.getenv("OVERLAY_CONCURRENCY") or 0) or None  # videos overlaid at once
+
+# Worker-local caches (downloads, normalized clips), shared by all tasks of the worker
+CACHE_DIR = Path(os.getenv("CACHE_DIR") or Path(__file__).resolve().parent.parent / "cache")
+NORMALIZED_CACHE_MAX_BYTES = int(os.getenv("NORMALIZED_CACHE_MAX_BYTES") or 10 * 1024 ** 3)
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES") or 20 * 1024 ** 3)
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES") or 2 * 1024 ** 3)
+
+# Downloads
+DOWNLOAD_MAX_CONCURRENT = int(os.getenv("DOWNLOAD_MAX_CONCURRENT") or 3)  # files fetched at once per downloader
+DOWNLOAD_CONNECTIONS_PER_HOST = int(os.getenv("DOWNLOAD_CONNECTIONS_PER_HOST") or 8)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE") or 256 * 1024)  # bytes per read/write
+DOWNLOAD_RANGED_MIN_BYTES = int(os.getenv("DOWNLOAD_RANGED_MIN_BYTES") or 32 * 1024 ** 2)  # segment files from this size
+DOWNLOAD_SEGMENT_SIZE = int(os.getenv("DOWNLOAD_SEGMENT_SIZE") or 16 * 1024 ** 2)
+DOWNLOAD_SEGMENTS_PER_FILE = int(os.getenv("DOWNLOAD_SEGMENTS_PER_FILE") or 4)  # parallel ranges per file
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES") or 5)
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL") or 300)  # seconds a resolved host is reused
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT") or 60)  # idle pooled connection lifetime
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE") or 8)  # downloaded clips waiting for normalization
+
+# Output storage: drive, s3 (any S3-compatible store, e.g. MinIO) or local
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "drive").lower()
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY") or 4)  # files uploaded at once per task
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE") or 8 * 1024 ** 2)  # bytes per resumable chunk / part
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES") or 5)
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE") or 8)  # finished videos awaiting upload; full = rendering waits
+LOCAL_STORAGE_DIR = Path(os.getenv("LOCAL_STORAGE_DIR") or Path(__file__).resolve().parent.parent / "storage")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX") or ""
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000; unset = AWS
+S3_REGION = os.getenv("S3_REGION")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")  # unset = boto3's default credential chain
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+
+# Fan-out: one job rendered by many workers, exchanging media through a shared store (local or s3)
+SHARED_STORE_BACKEND = (os.getenv("SHARED_STORE_BACKEND") or "local").lower()
+SHARED_STORE_DIR = Path(os.getenv("SHARED_STORE_DIR") or Path(__file__).resolve().parent.parent / "shared")
+RENDER_CHUNK_SIZE = int(os.getenv("RENDER_CHUNK_SIZE") or 25)  # combinations per render task
+SHARED_STORE_TTL_HOURS = int(os.getenv("SHARED_STORE_TTL_HOURS") or 72)  # then a job's leftover store is swept
+
+# Celery queues: io (downloads, normalization, TTS), render (ffmpeg), upload; hard time limits per task, seconds
+IO_TASK_TIME_LIMIT = int(os.getenv("IO_TASK_TIME_LIMIT") or 3600)
+RENDER_TASK_TIME_LIMIT = int(os.getenv("RENDER_TASK_TIME_LIMIT") or 2 * 3600)
+UPLOAD_TASK_TIME_LIMIT = int(os.getenv("UPLOAD_TASK_TIME_LIMIT") or 3600)
+INTERACTIVE_MAX_COMBINATIONS = int(os.getenv("INTERACTIVE_MAX_COMBINATIONS") or 10)  # up to this many outputs = priority job
 
 
 test_request = {
@@ -1,6 +1,7 @@
 from celery.result import AsyncResult
 from fastapi import FastAPI, HTTPException
 from app.schemas.urls_validator import ConfigModel
+from app.celery_app.config import job_options
 from app.celery_media_tasks.tasks import process_movie
 
 
@@ -18,7 +19,7 @@ async def process_media(config: ConfigModel):
         payload = config.model_dump()
         print(f"payload: {payload}")
 
-        task = process_movie.apply_async(kwargs={"data": payload})
+        task = process_movie.apply_async(kwargs={"data": payload}, **job_options(payload))
 
         print(f"Task queued: {task.id}")
         return {"task_id": task.id, "status": "queued"}
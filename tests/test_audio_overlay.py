@@ -0,0 +1,68 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.services import audio_overlay
+from app.services.audio_overlay import AudioOverlayService
+from app.services.ffmpeg_toolchain import FFmpegToolchain
+
+
+class FakePool:
+    """Render pool that writes each command's output file instead of running ffmpeg"""
+    concurrency = 2
+
+    def __init__(self):
+        self.commands: list[list[str]] = []
+
+    async def run(self, cmd):
+        self.commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"media")
+
+
+class FakeIndex:
+    async def probe_many(self, paths):
+        return {path: None for path in paths}
+
+    async def duration(self, path):
+        return 5.0
+
+
+@pytest.fixture
+def overlay(tmp_path, monkeypatch) -> AudioOverlayService:
+    toolchain = FFmpegToolchain("ffmpeg", "ffprobe", "test", frozenset({"libx264"}), frozenset())
+    monkeypatch.setattr(audio_overlay, "get_toolchain", lambda: toolchain)
+    monkeypatch.setattr(AudioOverlayService, "BASE_TEMP_DIR", tmp_path)
+    for name in ("audio/bg/one.mp3", "voice/v1/line.mp3", "combined_movies_raw/.keep"):
+        (tmp_path / "task" / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / "task" / name).write_bytes(b"source")
+    return AudioOverlayService("task", render_pool=FakePool(), media_index=FakeIndex())
+
+
+def test_streamed_overlay_deletes_each_raw_video_once_overlaid(tmp_path, overlay):
+    raw_dir = tmp_path / "task" / "combined_movies_raw"
+    on_disk = []
+
+    async def run():
+        raw_queue, done_queue = asyncio.Queue(maxsize=1), asyncio.Queue()
+        consumer = asyncio.create_task(overlay.overlay_from_queue(raw_queue, done_queue, bed_duration=lambda: 12.0))
+        for i in range(6):
+            raw = raw_dir / f"video_{i}.mp4"
+            raw.write_bytes(b"video")
+            await raw_queue.put(raw)
+            on_disk.append(len(list(raw_dir.glob("*.mp4"))))
+        await raw_queue.put(None)
+        statuses = await consumer
+        return statuses, [done_queue.get_nowait() for _ in range(done_queue.qsize())]
+
+    statuses, done = asyncio.run(run())
+
+    assert [st["status"] for st in statuses] == ["done"] * 6
+    assert sorted(path.name for path in done) == [f"video_{i}.mp4" for i in range(6)]
+    assert all(path.exists() for path in done)
+    assert not list(raw_dir.glob("*.mp4"))
+    # The bounded queue keeps the raw videos waiting for their overlay at a handful
+    assert max(on_disk) <= 4
+    # Two recodes, one bed for the single pair, then a mux per video
+    beds = [cmd for cmd in overlay.render_pool.commands if "beds" in cmd[-1]]
+    assert len(beds) == 1 and beds[0][beds[0].index("-t") + 1] == "12.000"
@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.combination import CombinationService
+
+
+@pytest.mark.parametrize("total", [1, 7, 300, 1000, 4097])
+def test_permutation_is_a_bijection(total):
+    permute = CombinationService.permutation(total, seed=3)
+    assert sorted(permute(i) for i in range(total)) == list(range(total))
+
+
+@pytest.mark.parametrize("total,page", [(300, 50), (1000, 64), (1000, 333), (97, 10)])
+@pytest.mark.parametrize("seed", range(6))
+def test_sample_pages_are_disjoint_and_cover_the_single_page_sample(total, page, seed):
+    pages_count = 4
+    pages = [
+        set(CombinationService.iter_indices(total, page, sample=True, seed=seed, offset=i * page))
+        for i in range(pages_count)
+    ]
+    whole = set(CombinationService.iter_indices(total, page * pages_count, sample=True, seed=seed))
+
+    for i, first in enumerate(pages):
+        for second in pages[i + 1:]:
+            assert not first & second
+    assert set().union(*pages) == whole
+    assert len(whole) == min(total, page * pages_count)
+
+
+def test_sample_is_reproducible_and_seed_dependent():
+    first = list(CombinationService.iter_indices(1000, 20, sample=True, seed=1))
+    assert first == list(CombinationService.iter_indices(1000, 20, sample=True, seed=1))
+    assert first != list(CombinationService.iter_indices(1000, 20, sample=True, seed=2))
+    assert first == sorted(first)
+
+
+def test_sequential_pages():
+    assert list(CombinationService.iter_indices(10, 3, offset=8)) == [8, 9]
+    assert list(CombinationService.iter_indices(10, 3, offset=10)) == []
+
+
+def test_combination_at_matches_product_order():
+    blocks = [["a", "b"], ["x", "y", "z"]]
+    expected = [(b1, b2) for b1 in blocks[0] for b2 in blocks[1]]
+    assert [CombinationService.combination_at(blocks, i) for i in range(6)] == expected
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.download_cache import DownloadCacheService
+from app.services.file_downloader import AsyncDownloaderService
+
+
+def make_app(path, requests: list) -> web.Application:
+    async def handler(request: web.Request) -> web.StreamResponse:
+        requests.append(request.method)
+        return web.FileResponse(path)
+
+    app = web.Application()
+    app.router.add_get("/clip.mp4", handler)
+    return app
+
+
+def download_twice(tmp_path, monkeypatch, cache, source, requests, between=None):
+    """Two tasks download the same URL from one server; `between` runs in between"""
+    monkeypatch.setattr(AsyncDownloaderService, "BASE_TEMP_DIR", tmp_path / "temp_files")
+
+    async def run():
+        results = []
+        async with TestServer(make_app(source, requests)) as server:
+            url = str(server.make_url("/clip.mp4"))
+            for task_name in ("task1", "task2"):
+                downloader = AsyncDownloaderService(task_name, cache=cache)
+                results.append((await downloader.download_blocks({"block1": [url]}, "videos"))["block1"][0])
+                if between and task_name == "task1":
+                    between()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_unchanged_url_is_revalidated_and_served_from_cache(tmp_path, monkeypatch):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(os.urandom(4096))
+    requests = []
+    cache = DownloadCacheService(tmp_path / "cache", max_bytes=1024 ** 2)
+
+    first, second = download_twice(tmp_path, monkeypatch, cache, source, requests)
+
+    assert first.read_bytes() == second.read_bytes() == source.read_bytes()
+    assert first != second
+    # The second task only sends a conditional HEAD and gets 304
+    assert requests == ["HEAD", "GET", "HEAD"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "bytes_saved": 4096}
+
+
+def test_changed_url_is_downloaded_again(tmp_path, monkeypatch):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(os.urandom(4096))
+    requests = []
+    cache = DownloadCacheService(tmp_path / "cache", max_bytes=1024 ** 2)
+
+    _, second = download_twice(
+        tmp_path, monkeypatch, cache, source, requests, between=lambda: source.write_bytes(os.urandom(8192))
+    )
+
+    assert second.read_bytes() == source.read_bytes()
+    assert requests == ["HEAD", "GET", "HEAD", "GET"]
+    assert cache.stats() == {"hits": 0, "misses": 2, "hit_ratio": 0.0, "bytes_saved": 0}
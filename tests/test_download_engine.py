@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import hashlib
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.download_engine import DownloadEngine, DownloadError
+
+CONTENT = os.urandom(10_000)
+
+
+def file_app(path, ranges: list, fail_ranges: set = frozenset()) -> web.Application:
+    """Serves `path` with Range / If-Range support; ranges in `fail_ranges` answer 500 once"""
+    failed = set()
+
+    async def handler(request: web.Request) -> web.StreamResponse:
+        if request.method == "GET":
+            ranges.append(request.headers.get("Range"))
+            if request.headers.get("Range") in fail_ranges - failed:
+                failed.add(request.headers["Range"])
+                raise web.HTTPInternalServerError()
+        return web.FileResponse(path)
+
+    app = web.Application()
+    app.router.add_get("/clip.mp4", handler)
+    return app
+
+
+def fetch(app, dest, engine, attempts=1):
+    """Runs `attempts` fetches against one server; returns the last result or error"""
+    async def run():
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            url = str(server.make_url("/clip.mp4"))
+            outcome = None
+            for _ in range(attempts):
+                try:
+                    outcome = await engine.fetch(session, url, dest)
+                except DownloadError as e:
+                    outcome = e
+                except aiohttp.ClientResponseError as e:
+                    outcome = e
+            return outcome
+
+    return asyncio.run(run())
+
+
+def test_segmented_download_resumes_only_missing_segments(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(CONTENT)
+    ranges = []
+    app = file_app(source, ranges, fail_ranges={"bytes=6000-7999"})
+    engine = DownloadEngine(segment_size=2000, ranged_min_bytes=1, segments_per_file=1, max_retries=0)
+    dest = tmp_path / "clip.mp4"
+
+    result = fetch(app, dest, engine, attempts=2)
+
+    assert result.path == dest and result.size == len(CONTENT)
+    assert dest.read_bytes() == CONTENT
+    assert ranges[:4] == ["bytes=0-1999", "bytes=2000-3999", "bytes=4000-5999", "bytes=6000-7999"]
+    # Finished segments are never fetched again; the rest is cancelled and fetched by the second attempt
+    assert ranges[-2:] == ["bytes=6000-7999", "bytes=8000-9999"]
+    assert all(ranges.count(r) == 1 for r in ranges[:3])
+    assert not list(tmp_path.glob("clip.mp4.part*"))
+
+
+def test_stream_download_continues_existing_part(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(CONTENT)
+    ranges = []
+    engine = DownloadEngine(ranged_min_bytes=len(CONTENT) + 1, max_retries=0)
+    dest = tmp_path / "clip.mp4"
+    (tmp_path / "clip.mp4.part").write_bytes(CONTENT[:4000])
+
+    result = fetch(file_app(source, ranges), dest, engine)
+
+    assert ranges == ["bytes=4000-"]
+    assert result.size == len(CONTENT)
+    assert dest.read_bytes() == CONTENT
+
+
+def md5_app(md5_header: dict) -> web.Application:
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=CONTENT, headers=md5_header)
+
+    app = web.Application()
+    app.router.add_get("/clip.mp4", handler)
+    return app
+
+
+def test_md5_from_x_goog_hash_is_verified(tmp_path):
+    md5 = base64.b64encode(hashlib.md5(CONTENT).digest()).decode()
+    dest = tmp_path / "clip.mp4"
+
+    result = fetch(md5_app({"x-goog-hash": f"crc32c=AAAAAA==,md5={md5}"}), dest, DownloadEngine(max_retries=0))
+
+    assert result.path == dest and dest.read_bytes() == CONTENT
+
+
+@pytest.mark.parametrize("header", ["x-goog-hash", "Content-MD5"])
+def test_md5_mismatch_fails_without_leftovers(tmp_path, header):
+    wrong = base64.b64encode(hashlib.md5(b"other").digest()).decode()
+    value = f"md5={wrong}" if header == "x-goog-hash" else wrong
+    dest = tmp_path / "clip.mp4"
+
+    error = fetch(md5_app({header: value}), dest, DownloadEngine(max_retries=0))
+
+    assert isinstance(error, DownloadError) and not error.retryable
+    assert "MD5 mismatch" in str(error)
+    assert not list(tmp_path.iterdir())
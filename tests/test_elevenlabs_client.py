@@ -0,0 +1,152 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.disk_cache import DiskCacheService
+from app.services.elevenlabs_client import AdaptiveLimiter, ElevenLabsAsyncClient, TTSError, TTSQuotaError
+from app.services.text_to_speach import TextToSpeechService
+from benchmarks.elevenlabs_stub import make_app
+
+
+def test_throttle_halves_limit_down_to_one():
+    limiter = AdaptiveLimiter(initial=8, maximum=16)
+
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(5):
+        limiter.on_throttle()
+    assert limiter.limit == 1
+    assert limiter.throttled == 6
+
+
+def test_success_grows_limit_up_to_provider_maximum():
+    limiter = AdaptiveLimiter(initial=2, maximum=16)
+
+    limiter.on_success({})
+    assert limiter.limit == 2.5
+    for _ in range(100):
+        limiter.on_success({"maximum-concurrent-requests": "5"})
+    assert limiter.maximum == 5
+    assert limiter.limit == 5
+
+
+def test_limiter_bounds_requests_in_flight():
+    limiter = AdaptiveLimiter(initial=3, maximum=3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(12)))
+
+    asyncio.run(run())
+    assert peak == 3
+    assert limiter.in_flight == 0
+
+
+def synthesize(app, tmp_path, count, limiter, max_retries=3):
+    """Sends `count` concurrent requests; returns the client and one result or error per request"""
+    async def run():
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            client = ElevenLabsAsyncClient(
+                session, api_key="stub", base_url=str(server.make_url("")), limiter=limiter, max_retries=max_retries,
+            )
+            results = await asyncio.gather(
+                *(
+                    client.synthesize("Hello there, this is a test line.", "stub-sarah",
+                                      tmp_path / f"{i}.mp3", "model", "mp3_44100_128")
+                    for i in range(count)
+                ),
+                return_exceptions=True,
+            )
+            return client, results
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ElevenLabsAsyncClient, "BACKOFF_BASE", 0.01)
+
+
+def test_throttled_requests_are_retried_and_limit_follows_provider(tmp_path):
+    limiter = AdaptiveLimiter(initial=4, maximum=8)
+
+    client, results = synthesize(make_app(max_concurrent=1, latency=0.05, error_rate=0.0), tmp_path, 4, limiter)
+
+    assert results == [tmp_path / f"{i}.mp3" for i in range(4)]
+    assert all(path.stat().st_size > 0 for path in results)
+    assert limiter.throttled > 0 and client.retries >= limiter.throttled
+    assert limiter.maximum == 1 and limiter.limit == 1
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_server_errors_are_retried_until_max_retries(tmp_path):
+    app = make_app(max_concurrent=4, latency=0.0, error_rate=1.0)
+
+    client, results = synthesize(app, tmp_path, 1, AdaptiveLimiter(initial=1, maximum=1), max_retries=2)
+
+    assert isinstance(results[0], TTSError) and results[0].retryable
+    assert client.retries == 2
+    assert app["state"]["errors"] == 3
+    assert not list(tmp_path.iterdir())
+
+
+def test_quota_error_is_not_retried_and_short_circuits(tmp_path):
+    calls = []
+
+    async def quota(_: web.Request) -> web.Response:
+        calls.append(1)
+        return web.json_response({"detail": {"status": "quota_exceeded"}}, status=401)
+
+    app = web.Application()
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", quota)
+
+    client, results = synthesize(app, tmp_path, 3, AdaptiveLimiter(initial=1, maximum=1))
+
+    assert all(isinstance(result, TTSQuotaError) for result in results)
+    assert client.quota_exhausted
+    assert client.retries == 0
+    # The limiter serializes requests: once the first one hits the quota, the others never reach the server
+    assert len(calls) == 1
+
+
+def test_quota_hit_does_not_block_the_next_job_on_the_same_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(TextToSpeechService, "BASE_TEMP_DIR", tmp_path / "temp_files")
+    quota = {"exceeded": True}
+
+    async def text_to_speech(_: web.Request) -> web.Response:
+        if quota["exceeded"]:
+            return web.json_response({"detail": {"status": "quota_exceeded"}}, status=401)
+        return web.Response(body=b"\xff\xfb" + bytes(1024), content_type="audio/mpeg")
+
+    app = web.Application()
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", text_to_speech)
+    voice_blocks = {"voice1": [{"text": f"Line {i}", "voice_id": "stub-sarah"} for i in range(3)]}
+
+    async def run():
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            # One client for the worker's lifetime, one TextToSpeechService per job
+            api = ElevenLabsAsyncClient(session, api_key="stub", base_url=str(server.make_url("")))
+            jobs = []
+            for job in ("job1", "job2"):
+                tts = TextToSpeechService(
+                    job, api_key="stub", api=api, tts_cache=DiskCacheService(tmp_path / "cache", 1024 ** 2),
+                )
+                jobs.append((tts, await tts.generate_blocks(voice_blocks)))
+                # The account is topped up between the jobs
+                quota["exceeded"] = False
+            return api, jobs
+
+    api, [(first, first_result), (second, second_result)] = asyncio.run(run())
+
+    assert first_result == {} and len(first.failures) == 3
+    assert len(second_result["voice1"]) == 3 and not second.failures
+    assert not api.quota_exhausted
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services import audio_overlay, media_processing, text_to_speach, video_combiner
+from app.services.audio_overlay import AudioOverlayService
+from app.services.download_cache import DownloadCacheService
+from app.services.ffmpeg_toolchain import FFmpegToolchain
+from app.services.file_downloader import AsyncDownloaderService
+from app.services.media_processing import MediaProcessingService
+from app.services.storage_backends import LocalStorageBackend
+from app.services.text_to_speach import TextToSpeechService
+from app.services.video_combiner import VideoCombinerService
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch) -> MediaProcessingService:
+    """A service whose temp folders, caches and storage all live under tmp_path"""
+    for cls in (MediaProcessingService, AudioOverlayService, AsyncDownloaderService,
+                TextToSpeechService, VideoCombinerService):
+        monkeypatch.setattr(cls, "BASE_TEMP_DIR", tmp_path / "temp_files")
+    for module in (text_to_speach, video_combiner):
+        monkeypatch.setattr(module, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(media_processing, "DownloadCacheService",
+                        lambda: DownloadCacheService(tmp_path / "cache" / "downloads"))
+    monkeypatch.setattr(
+        media_processing, "create_storage_backend",
+        lambda project_name, drive=None: LocalStorageBackend(root=tmp_path / "storage", prefix=project_name),
+    )
+    return MediaProcessingService({"task_name": "project"}, workspace="project__job_finalize")
+
+
+def test_finalize_reports_failed_render_task_and_clears_store(tmp_path, service):
+    store = LocalStorageBackend(root=tmp_path / "shared", prefix="job")
+    (tmp_path / "shared" / "job" / "clips").mkdir(parents=True)
+    manifest = {
+        "started_at": time.time() - 10,
+        "prepare": {"videos": 4, "audios": 1, "voices": 0, "download_cache": {"hits": 1}, "tts": {"generated": 0},
+                    "normalization": {"fast_path": 4}, "seconds": 3.0},
+    }
+    rendered = {
+        "combinations": 2, "rendered": 2, "uploaded_files": ["a.mp4", "b.mp4"], "stashed": [], "overlay": [],
+        "render_plan": {"outputs": 2, "copied_bytes": 100}, "render_failures": [],
+        "upload": {"backend": "local", "uploaded": 2, "bytes": 100, "failures": []},
+        "timings": {"upload_after_render_seconds": 0.5}, "seconds": 4.0,
+    }
+    failed = MediaProcessingService.failed_render_summary([2, 3], "RuntimeError('boom')", 1.0)
+
+    result = asyncio.run(service.finalize_shared(store, manifest, [rendered, failed]))
+
+    assert result["combinations"] == 4 and result["rendered"] == 2
+    assert result["failed_render_tasks"] == ["RuntimeError('boom')"]
+    assert result["render_failures"] == failed["render_failures"]
+    assert result["render_plan"] == {"outputs": 2, "copied_bytes": 100}
+    assert result["uploaded_files"] == ["a.mp4", "b.mp4"]
+    assert result["render_profile"] == service.render_profile.name
+    assert result["download_cache"] == {"hits": 1} and result["tts"] == {"generated": 0}
+    assert result["normalization"] == {"fast_path": 4}
+    timings = result["timings"]
+    assert timings["mode"] == "fan_out" and timings["ready_to_render_seconds"] == 3.0
+    assert timings["upload_after_render_seconds"] == 0.5 and timings["render_task_seconds"] == [4.0, 1.0]
+    assert timings["end_to_end_seconds"] >= 10
+    # Nothing is left to upload, so the shared store is removed despite the failed render task
+    assert not (tmp_path / "shared" / "job").exists()
+
+
+class FakePool:
+    """Render pool that writes each command's output file instead of running ffmpeg"""
+    concurrency = 2
+
+    def __init__(self):
+        self.commands: list[list[str]] = []
+
+    async def run(self, cmd):
+        self.commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"audio")
+
+
+def test_render_tasks_reuse_audio_prepared_once(tmp_path, monkeypatch, service):
+    toolchain = FFmpegToolchain("ffmpeg", "ffprobe", "test", frozenset({"libx264"}), frozenset())
+    monkeypatch.setattr(audio_overlay, "get_toolchain", lambda: toolchain)
+    base = tmp_path / "temp_files"
+    for name in ("audio/bg/one.mp3", "audio/bg/two.wav", "voice/v1/line.mp3"):
+        (base / "prepare" / name).parent.mkdir(parents=True, exist_ok=True)
+        (base / "prepare" / name).write_bytes(b"source")
+
+    prepare_pool = FakePool()
+    prepare = AudioOverlayService("prepare", render_pool=prepare_pool)
+    asyncio.run(prepare.prepare_audio())
+    asyncio.run(prepare.prepare_beds(12.345))
+    prepared = prepare.export_prepared()
+    assert len(prepare_pool.commands) == 3 + 2  # three recodes, a bed per (background, voice) pair
+
+    # A render task on another worker downloads just the prepared files
+    (base / "render").mkdir()
+    for path in prepare.prepared_files():
+        target = base / "render" / path.relative_to(base / "prepare")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(path.read_bytes())
+    render_pool = FakePool()
+    render = AudioOverlayService("render", render_pool=render_pool, prepared=prepared)
+
+    async def mix():
+        await render.prepare_audio()
+        return [await render.get_audio_bed(*render.pick_audio_pair(), render.bed_duration) for _ in range(5)]
+
+    beds = asyncio.run(mix())
+
+    assert not render_pool.commands
+    assert render.bed_duration == 12.35
+    assert all(bed.exists() and bed.is_relative_to(base / "render") for bed in beds)
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from app.services.render_planner import RenderPlannerService
+
+A1, A2, B1, B2, C1 = (Path(f"/clips/{name}.mp4") for name in ("a1", "a2", "b1", "b2", "c1"))
+SIZES = {A1: 100, A2: 200, B1: 10, B2: 20, C1: 1}
+COMBINATIONS = [(A1, B1, C1), (A1, B2, C1), (A2, B1, C1), (A2, B2, C1)]
+
+
+def test_stream_copy_plan_has_no_prefixes_and_counts_output_bytes():
+    plan = RenderPlannerService(Path("/prefixes"), SIZES).plan(COMBINATIONS, Path("/out"))
+    steps = list(plan.output_steps)
+
+    assert plan.summary() == {
+        "outputs": 4,
+        "shared_prefixes": 0,
+        "output_bytes": 111 + 121 + 211 + 221,
+        "prefix_bytes": 0,
+        "copied_bytes": 111 + 121 + 211 + 221,
+    }
+    assert all(step.inputs == step.clips and step.parent is None for step in steps)
+
+
+def test_stream_copy_plan_is_built_lazily():
+    def combinations():
+        yield from COMBINATIONS
+        raise AssertionError("the plan read past the steps consumed so far")
+
+    plan = RenderPlannerService(Path("/prefixes"), SIZES).plan(combinations(), Path("/out"))
+    steps = iter(plan.output_steps)
+
+    assert plan.summary()["outputs"] == 0
+    assert [next(steps).clips for _ in range(2)] == [(A1, B1, C1), (A1, B2, C1)]
+    assert plan.summary()["outputs"] == 2 and plan.output_bytes == 111 + 121
+
+
+def test_shared_prefixes_only_for_materialized_nodes():
+    plan = RenderPlannerService(Path("/prefixes"), SIZES, share_prefixes=True).plan(COMBINATIONS, Path("/out"))
+
+    # (a, b) pairs each lead to one output: only the single-clip level is shared, and that is a file already
+    assert plan.summary()["shared_prefixes"] == 0
+    assert plan.summary()["prefix_bytes"] == 0
+
+    plan = RenderPlannerService(Path("/prefixes"), SIZES, share_prefixes=True).plan(
+        [(A1, B1, C1), (A1, B1, A2)], Path("/out")
+    )
+    assert [step.clips for step in plan.prefix_steps] == [(A1, B1)]
+    assert plan.prefix_bytes == 110
+    assert all(step.parent == plan.prefix_steps[0].out_path for step in plan.output_steps)
+
+
+def test_outputs_sharing_clips_are_planned_together():
+    plan = RenderPlannerService(Path("/prefixes"), SIZES, share_prefixes=True).plan(
+        [(A1, B1), (A2, B1), (A1, B2)], Path("/out")
+    )
+    assert [step.clips for step in plan.output_steps] == [(A1, B1), (A1, B2), (A2, B1)]
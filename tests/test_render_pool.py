@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.render_pool import HostSlots, RenderPoolService
+
+
+class FakeRunner:
+    """Counts the ffmpeg commands running at the same time, over every pool that shares it"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def run(self, cmd, timeout=None, on_progress=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+
+
+def test_host_slots_cap_ffmpeg_jobs_over_all_pools(tmp_path, monkeypatch):
+    monkeypatch.setattr(HostSlots, "POLL_INTERVAL", 0.005)
+    runner = FakeRunner()
+    # Four tasks' pools, as on a worker with four pool processes, each allowed two jobs
+    pools = [RenderPoolService(concurrency=2, threads_per_job=1, runner=runner, host_slots=None) for _ in range(4)]
+    for pool in pools:
+        pool.host_slots = HostSlots(3, lock_dir=tmp_path)
+
+    async def run():
+        await asyncio.gather(*(pool.run_all([["ffmpeg"]] * 5) for pool in pools))
+
+    asyncio.run(run())
+
+    assert runner.peak == 3
+    assert runner.running == 0
+
+
+def test_without_host_slots_each_pool_uses_its_own_concurrency():
+    runner = FakeRunner()
+    pools = [RenderPoolService(concurrency=2, threads_per_job=1, runner=runner, host_slots=None) for _ in range(3)]
+
+    async def run():
+        await asyncio.gather(*(pool.run_all([["ffmpeg"]] * 4) for pool in pools))
+
+    asyncio.run(run())
+
+    assert runner.peak == 6
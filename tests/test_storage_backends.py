@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services import storage_backends
+from app.services.storage_backends import (
+    ChecksumError,
+    DriveStorageBackend,
+    LocalStorageBackend,
+    S3StorageBackend,
+    sweep_shared_stores,
+)
+
+MiB = 1024 ** 2
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 calls the backend makes"""
+
+    def __init__(self):
+        self.objects: dict[str, dict] = {}
+        self.uploads: dict[str, dict] = {}
+        self.uploaded_parts: list[int] = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        obj = self.objects[Key]
+        return {"ETag": f'"{obj["etag"]}"', "ContentLength": len(obj["body"])}
+
+    def put_object(self, Bucket, Key, Body, ContentMD5):
+        body = Body.read()
+        self.objects[Key] = {"body": body, "etag": hashlib.md5(body).hexdigest()}
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"Key": Key, "Initiated": datetime.now(), "parts": {}}
+        return {"UploadId": upload_id}
+
+    def list_multipart_uploads(self, Bucket, Prefix):
+        return {"Uploads": [
+            {"Key": u["Key"], "UploadId": upload_id, "Initiated": u["Initiated"]}
+            for upload_id, u in self.uploads.items() if u["Key"].startswith(Prefix)
+        ]}
+
+    def get_paginator(self, operation):
+        assert operation == "list_parts"
+        return self
+
+    def paginate(self, Bucket, Key, UploadId):
+        parts = self.uploads[UploadId]["parts"]
+        yield {"Parts": [{"PartNumber": n, "ETag": f'"{hashlib.md5(body).hexdigest()}"'} for n, body in parts.items()]}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        self.uploaded_parts.append(PartNumber)
+        self.uploads[UploadId]["parts"][PartNumber] = Body
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)["parts"]
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        digests = b"".join(hashlib.md5(parts[n]).digest() for n in numbers)
+        self.objects[Key] = {
+            "body": b"".join(parts[n] for n in numbers),
+            "etag": f"{hashlib.md5(digests).hexdigest()}-{len(numbers)}",
+        }
+
+
+@pytest.fixture
+def s3():
+    backend = S3StorageBackend(bucket="bucket", prefix="project", region="us-east-1", chunk_size=5 * MiB, max_retries=0)
+    backend.client = FakeS3()
+    return backend
+
+
+def upload(backend, path):
+    return asyncio.run(backend.upload(path))
+
+
+def test_s3_multipart_resumes_pending_upload(tmp_path, s3):
+    path = tmp_path / "video.mp4"
+    content = os.urandom(12 * MiB)
+    path.write_bytes(content)
+    # An earlier attempt stored part 1, and a part 2 of some other file
+    upload_id = s3.client.create_multipart_upload(Bucket="bucket", Key="project/video.mp4")["UploadId"]
+    s3.client.uploads[upload_id]["parts"] = {1: content[:5 * MiB], 2: os.urandom(5 * MiB)}
+
+    result = upload(s3, path)
+
+    assert result.status == "uploaded"
+    assert s3.client.uploaded_parts == [2, 3]
+    assert s3.client.objects["project/video.mp4"]["body"] == content
+    assert not s3.client.uploads
+
+
+def test_s3_skips_objects_with_matching_etag(tmp_path, s3):
+    small, large = tmp_path / "small.mp4", tmp_path / "large.mp4"
+    small.write_bytes(os.urandom(MiB))
+    large.write_bytes(os.urandom(11 * MiB))
+
+    assert [upload(s3, small).status, upload(s3, large).status] == ["uploaded", "uploaded"]
+    assert s3.client.uploaded_parts == [1, 2, 3]
+    assert [upload(s3, small).status, upload(s3, large).status] == ["skipped", "skipped"]
+    assert s3.client.uploaded_parts == [1, 2, 3]
+
+
+def test_local_upload_continues_part_and_then_skips(tmp_path):
+    backend = LocalStorageBackend(root=tmp_path / "store", prefix="project", max_retries=0)
+    path = tmp_path / "video.mp4"
+    content = os.urandom(3 * MiB)
+    path.write_bytes(content)
+    (tmp_path / "store" / "project" / "video.mp4.part").write_bytes(content[:MiB])
+
+    assert upload(backend, path).status == "uploaded"
+    assert (tmp_path / "store" / "project" / "video.mp4").read_bytes() == content
+    assert not (tmp_path / "store" / "project" / "video.mp4.part").exists()
+    assert upload(backend, path).status == "skipped"
+
+
+def test_local_upload_discards_foreign_part_and_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(LocalStorageBackend, "BACKOFF_BASE", 0.01)
+    backend = LocalStorageBackend(root=tmp_path / "store", max_retries=1)
+    path = tmp_path / "video.mp4"
+    path.write_bytes(os.urandom(2 * MiB))
+    (tmp_path / "store" / "video.mp4.part").write_bytes(os.urandom(MiB))
+
+    result = upload(backend, path)
+
+    assert result.status == "uploaded"
+    assert (tmp_path / "store" / "video.mp4").read_bytes() == path.read_bytes()
+
+
+class FakeDriveFiles:
+    """files() of the Drive v2 API: a few pages of items in one folder"""
+
+    def __init__(self, items: list[dict], page_size: int = 2):
+        self.items = items
+        self.page_size = page_size
+        self.trashed: list[str] = []
+
+    def _call(self, result):
+        return type("Request", (), {"execute": lambda _, http=None: result})()
+
+    def list(self, q, pageToken=None):
+        live = [item for item in self.items if item["id"] not in self.trashed]
+        if "title=" in q:
+            live = [item for item in live if f"title='{item['title']}'" in q]
+        start = int(pageToken or 0)
+        page = {"items": live[start:start + self.page_size]}
+        if start + self.page_size < len(live):
+            page["nextPageToken"] = str(start + self.page_size)
+        return self._call(page)
+
+    def trash(self, fileId):
+        self.trashed.append(fileId)
+        return self._call({})
+
+    def get_media(self, fileId):
+        return type("MediaRequest", (), {"file_id": fileId})()
+
+
+class FakeMediaDownload:
+    contents: dict[str, bytes] = {}
+
+    def __init__(self, fh, request, chunksize):
+        self.fh, self.request = fh, request
+
+    def next_chunk(self, num_retries=0):
+        self.fh.write(self.contents[self.request.file_id])
+        return None, True
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    files = FakeDriveFiles([
+        {"id": f"id{i}", "title": f"video_{i}.mp4", "md5Checksum": hashlib.md5(f"video {i}".encode()).hexdigest()}
+        for i in range(5)
+    ])
+    service = type("Service", (), {"files": lambda _: files})()
+    gauth = type("Auth", (), {"service": service, "Get_Http_Object": lambda _: None})()
+    drive = type("Drive", (), {
+        "gauth": gauth, "project_folder_id": "folder", "project_name": "project",
+        "ensure_authorized": lambda _: None,
+    })()
+    FakeMediaDownload.contents = {f"id{i}": f"video {i}".encode() for i in range(5)}
+    monkeypatch.setattr(storage_backends, "MediaIoBaseDownload", FakeMediaDownload)
+    backend = DriveStorageBackend(drive, max_retries=0)
+    return backend, files
+
+
+def test_drive_download_verifies_md5(tmp_path, drive):
+    backend, _ = drive
+
+    asyncio.run(backend.download("video_3.mp4", tmp_path / "video_3.mp4"))
+    assert (tmp_path / "video_3.mp4").read_bytes() == b"video 3"
+
+    FakeMediaDownload.contents["id1"] = b"corrupted"
+    with pytest.raises(ChecksumError):
+        asyncio.run(backend.download("video_1.mp4", tmp_path / "video_1.mp4"))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(backend.download("missing.mp4", tmp_path / "missing.mp4"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["video_3.mp4"]
+
+
+def test_drive_clear_trashes_every_page(drive):
+    backend, files = drive
+
+    asyncio.run(backend.clear())
+
+    assert sorted(files.trashed) == [f"id{i}" for i in range(5)]
+
+
+def test_sweep_removes_only_shared_stores_past_their_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_backends, "SHARED_STORE_DIR", tmp_path / "shared")
+    kept_long_ago = tmp_path / "shared" / "old-job" / "outputs" / "video.mp4"
+    recent = tmp_path / "shared" / "new-job" / "clips" / "b1" / "clip.mp4"
+    for path in (kept_long_ago, recent):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"video")
+    day_ago = time.time() - 24 * 3600
+    for path in (kept_long_ago, *kept_long_ago.parents[:3]):
+        os.utime(path, (day_ago, day_ago))
+    # A late write anywhere in a store keeps it alive
+    os.utime(recent.parent.parent, (day_ago, day_ago))
+
+    removed = asyncio.run(sweep_shared_stores(ttl_hours=12, kind="local"))
+
+    assert removed == ["old-job"]
+    assert sorted(path.name for path in (tmp_path / "shared").iterdir()) == ["new-job"]
@@ -0,0 +1,58 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.services import video_combiner
+from app.services.ffmpeg_toolchain import FFmpegToolchain
+from app.services.media_probe import MediaInfo
+from app.services.video_combiner import VideoCombinerService
+
+TARGET = {"codec_name": "h264", "width": 270, "height": 480, "r_frame_rate": "10/1", "sample_aspect_ratio": "1:1",
+          "pix_fmt": "yuv420p", "profile": "High", "level": 21, "has_b_frames": 2}
+
+
+@pytest.fixture
+def combiner(tmp_path, monkeypatch) -> VideoCombinerService:
+    toolchain = FFmpegToolchain("ffmpeg", "ffprobe", "test", frozenset({"libx264"}), frozenset())
+    monkeypatch.setattr(video_combiner, "get_toolchain", lambda: toolchain)
+    monkeypatch.setattr(video_combiner, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(VideoCombinerService, "BASE_TEMP_DIR", tmp_path / "temp_files")
+    monkeypatch.setattr(VideoCombinerService, "_target_streams", {})
+    return VideoCombinerService("task")
+
+
+def clip(**overrides) -> MediaInfo:
+    return MediaInfo(Path("clip.mp4"), streams=[{"codec_type": "video", **TARGET, **overrides}])
+
+
+def test_fast_path_requires_matching_parameter_sets(combiner):
+    assert combiner._matches_target(clip(), TARGET)
+    assert not combiner._matches_target(clip(profile="Main"), TARGET)
+    assert not combiner._matches_target(clip(level=30), TARGET)
+    assert not combiner._matches_target(clip(has_b_frames=0), TARGET)
+    assert not combiner._matches_target(clip(width=720), TARGET)
+    # Without a reference encode nothing is stream-copied
+    assert not combiner._matches_target(clip(), None)
+
+
+def test_reference_is_encoded_once_and_failures_are_not_remembered(combiner, monkeypatch):
+    results = [None, TARGET]
+    calls = []
+
+    async def encode_reference():
+        calls.append(1)
+        return results[len(calls) - 1]
+
+    monkeypatch.setattr(combiner, "_encode_reference", encode_reference)
+
+    async def run():
+        first = await combiner._target_stream()
+        combiner._target_task = None  # a new task of the same worker
+        return first, await asyncio.gather(*(combiner._target_stream() for _ in range(5)))
+
+    first, later = asyncio.run(run())
+
+    assert first is None
+    assert later == [TARGET] * 5
+    assert len(calls) == 2
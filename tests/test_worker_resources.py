@@ -0,0 +1,35 @@
+import pytest
+
+from app.services import worker_resources
+from app.services.google_driver_uploadaer import GoogleDriveService
+from app.services.worker_resources import WorkerResources
+
+
+def test_worker_never_starts_interactive_oauth(tmp_path, monkeypatch):
+    monkeypatch.setattr(GoogleDriveService, "CREDENTIALS_FILE", tmp_path / "missing.json")
+    monkeypatch.setattr("pydrive.auth.GoogleAuth.LocalWebserverAuth", lambda self: pytest.fail("OAuth flow started"))
+
+    with pytest.raises(RuntimeError, match="No saved Drive credentials"):
+        GoogleDriveService.authorize(interactive=False)
+
+    resources = WorkerResources()
+    try:
+        with pytest.raises(RuntimeError):
+            resources.drive_auth()
+    finally:
+        resources.close()
+
+
+@pytest.mark.parametrize(("backend", "expected"), [("drive", ["ffmpeg", "drive"]), ("s3", ["ffmpeg"])])
+def test_warm_up_authorizes_drive_only_for_drive_storage(monkeypatch, backend, expected):
+    calls = []
+    monkeypatch.setattr(worker_resources, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(worker_resources, "get_toolchain", lambda: calls.append("ffmpeg"))
+    monkeypatch.setattr(WorkerResources, "drive_auth", lambda self: calls.append("drive"))
+
+    resources = WorkerResources()
+    try:
+        resources.warm_up()
+    finally:
+        resources.close()
+    assert calls == expected